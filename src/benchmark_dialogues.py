@@ -0,0 +1,225 @@
+"""
+Dialogue benchmark - Timed DialogueManager scenarios on synthetic trees.
+
+For each tree size a seeded synthetic dialogue file is generated (see
+dialogue_generator.py) and every scenario runs in a fresh Python process,
+so its peak resident set size is measured on its own:
+
+    load_dialogue_file          parse and compile the file (cache disabled)
+    load_dialogue_from_string   parse and compile the same JSON from a string
+    choose_response             one random available response per call
+    get_current_dialogue        on the nodes of a random walk
+    validate_dialogue_tree      full validation including warnings
+
+Each scenario prints one JSON object per line with its throughput,
+latency percentiles and peak memory, so results can be stored with
+--output and compared between releases.
+
+Usage:
+    python benchmark_dialogues.py [--sizes 1000,100000,1000000] [--output results.jsonl]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmark_loader import peak_rss_bytes
+
+SCENARIOS = (
+    "load_dialogue_file",
+    "load_dialogue_from_string",
+    "choose_response",
+    "get_current_dialogue",
+    "validate_dialogue_tree",
+)
+
+DEFAULT_SIZES = "1000,100000,1000000"
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def repeat(call, min_time: float, max_repeats: int, min_repeats: int = 3) -> List[float]:
+    """Time a call at least min_repeats times and until min_time has passed"""
+    latencies = []
+    started = time.perf_counter()
+    while len(latencies) < max_repeats:
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+        if len(latencies) >= min_repeats and time.perf_counter() - started >= min_time:
+            break
+    return latencies
+
+
+def walk(manager, ops: int, seed: int, timed: str) -> List[float]:
+    """
+    Take random responses through a loaded dialogue, timing one call per step.
+
+    Args:
+        manager: DialogueManager with a dialogue loaded
+        ops: Number of timed calls
+        seed: Seed for the choices
+        timed: "choose_response" or "get_current_dialogue"
+
+    Returns:
+        Latencies in seconds
+    """
+    rng = random.Random(seed)
+    dialogues = manager.dialogues
+    clock = time.perf_counter
+    latencies = []
+
+    while len(latencies) < ops:
+        dialogue_id = manager.current_dialogue_id
+        responses = dialogues[dialogue_id].get("responses") if dialogue_id else None
+        if not responses:
+            manager.reset_dialogue()
+            continue
+
+        if timed == "get_current_dialogue":
+            start = clock()
+            manager.get_current_dialogue()
+            latencies.append(clock() - start)
+            manager.choose_response(rng.choice(responses)["id"])
+        else:
+            response_id = rng.choice(responses)["id"]
+            start = clock()
+            manager.choose_response(response_id)
+            latencies.append(clock() - start)
+
+    return latencies
+
+
+def measure(scenario: str, file_path: str, ops: int, min_time: float, seed: int) -> Dict:
+    """Run one scenario in this process and return its measurements"""
+    from dialogue_lib import DialogueManager
+
+    baseline = peak_rss_bytes()
+    manager = DialogueManager()
+
+    if scenario == "load_dialogue_file":
+        latencies = repeat(lambda: manager.load_dialogue_file(file_path, use_cache=False),
+                           min_time, ops)
+    elif scenario == "load_dialogue_from_string":
+        with open(file_path, 'r', encoding='utf-8') as f:
+            json_string = f.read()
+        latencies = repeat(lambda: manager.load_dialogue_from_string(json_string, use_cache=False),
+                           min_time, ops)
+    else:
+        if not manager.load_dialogue_file(file_path, use_cache=False):
+            raise ValueError(f"Could not load {file_path}")
+        if scenario == "validate_dialogue_tree":
+            latencies = repeat(lambda: manager.validate_dialogue_tree(include_warnings=True),
+                               min_time, ops)
+        elif scenario in ("choose_response", "get_current_dialogue"):
+            latencies = walk(manager, ops, seed, scenario)
+        else:
+            raise ValueError(f"Unknown scenario {scenario!r}")
+
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        "scenario": scenario,
+        "ops": len(latencies),
+        "seconds": round(total, 6),
+        "ops_per_sec": round(len(latencies) / total, 1) if total else None,
+        "p50_us": round(percentile(latencies, 0.50) * 1e6, 2),
+        "p90_us": round(percentile(latencies, 0.90) * 1e6, 2),
+        "p99_us": round(percentile(latencies, 0.99) * 1e6, 2),
+        "max_us": round(latencies[-1] * 1e6, 2),
+        "peak_rss_mb": round(peak_rss_bytes() / 2**20, 1),
+        "scenario_rss_mb": round((peak_rss_bytes() - baseline) / 2**20, 1),
+    }
+
+
+def run_scenario(scenario: str, file_path: str, ops: int, min_time: float, seed: int) -> Dict:
+    """Run a scenario in a fresh process and return its measurements"""
+    script = os.path.abspath(__file__)
+    result = subprocess.run(
+        [sys.executable, script, "--measure", scenario, file_path,
+         "--ops", str(ops), "--min-time", str(min_time), "--seed", str(seed)],
+        capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(script)
+    )
+    # The last line is the result; anything before it is output of the library
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    """Generate trees, run every scenario on each and print the results as JSON lines"""
+    parser = argparse.ArgumentParser(description="Benchmark DialogueManager on synthetic trees")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated node counts")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help="comma-separated scenarios to run")
+    parser.add_argument("--ops", type=int, default=100000,
+                        help="calls per walk scenario, and most repeats of the others")
+    parser.add_argument("--min-time", type=float, default=2.0,
+                        help="seconds to keep repeating load and validation scenarios")
+    parser.add_argument("--fan-out", type=int, default=3)
+    parser.add_argument("--cycle-density", type=float, default=0.05)
+    parser.add_argument("--text-length", type=int, default=80)
+    parser.add_argument("--quests", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="append the results to this JSON lines file")
+    parser.add_argument("--measure", nargs=2, metavar=("SCENARIO", "FILE"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        scenario, file_path = args.measure
+        print(json.dumps(measure(scenario, file_path, args.ops, args.min_time, args.seed)))
+        return 0
+
+    from dialogue_generator import write_dialogue_file
+
+    environment = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+    output = open(args.output, 'a', encoding='utf-8') if args.output else None
+
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for size in (int(size) for size in args.sizes.split(",")):
+                file_path = os.path.join(temp_dir, f"dialogue_{size}.json")
+                write_dialogue_file(file_path, size, args.fan_out, args.cycle_density,
+                                    args.text_length, args.quests, args.seed)
+                generator = {
+                    "nodes": size,
+                    "fan_out": args.fan_out,
+                    "cycle_density": args.cycle_density,
+                    "text_length": args.text_length,
+                    "quests": args.quests,
+                    "seed": args.seed,
+                    "file_mb": round(os.path.getsize(file_path) / 2**20, 2),
+                }
+
+                for scenario in args.scenarios.split(","):
+                    result = run_scenario(scenario, file_path, args.ops, args.min_time,
+                                          args.seed)
+                    line = json.dumps({**result, **generator, **environment})
+                    print(line, flush=True)
+                    if output is not None:
+                        output.write(line + "\n")
+                        output.flush()
+
+                os.remove(file_path)
+    finally:
+        if output is not None:
+            output.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+Loader benchmark - Compare json.load, the streaming and the binary loader.
+
+Each loader runs in a fresh Python process so its peak resident set size
+can be measured on its own.
+
+Usage:
+    python benchmark_loader.py [dialogue_file]
+
+Without a file, a synthetic dialogue file is generated in a temporary
+directory. The binary loader reads a compiled copy that is also written
+there.
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from dialogue_generator import write_dialogue_file
+
+LOADERS = ("json", "streaming", "binary")
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process in bytes"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def measure(loader, file_path):
+    """Load a file with one loader and print the measurements as JSON"""
+    from dialogue_graph import DialogueGraph
+    from dialogue_stream import load_graph_streaming
+    from dialogue_binary import BinaryDialogueGraph
+
+    baseline = peak_rss_bytes()
+    start = time.perf_counter()
+
+    if loader == "json":
+        with open(file_path, 'r', encoding='utf-8') as f:
+            graph = DialogueGraph.from_data(json.load(f))
+    elif loader == "streaming":
+        graph = load_graph_streaming(file_path)
+    else:
+        graph = BinaryDialogueGraph(file_path)
+
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "loader": loader,
+        "nodes": len(graph),
+        "seconds": round(elapsed, 3),
+        "peak_rss_mb": round(peak_rss_bytes() / 2**20, 1),
+        "load_rss_mb": round((peak_rss_bytes() - baseline) / 2**20, 1),
+    }))
+
+
+def run_script(*args):
+    """Run this script in a fresh process and return its output"""
+    script = os.path.abspath(__file__)
+    result = subprocess.run(
+        [sys.executable, script] + list(args),
+        capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(script)
+    )
+    return result.stdout
+
+
+def main():
+    """Run every loader in its own process and print a comparison"""
+    if len(sys.argv) == 4 and sys.argv[1] == "--measure":
+        measure(sys.argv[2], sys.argv[3])
+        return
+    if len(sys.argv) == 3 and sys.argv[1] == "--generate":
+        write_dialogue_file(sys.argv[2], num_nodes=50000, fan_out=4, text_length=400)
+        return
+    if len(sys.argv) == 4 and sys.argv[1] == "--compile":
+        from dialogue_binary import compile_dialogue_data
+        with open(sys.argv[2], 'r', encoding='utf-8') as f:
+            compiled = compile_dialogue_data(json.load(f))
+        with open(sys.argv[3], 'wb') as f:
+            f.write(compiled)
+        return
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if len(sys.argv) > 1:
+            file_path = sys.argv[1]
+        else:
+            file_path = os.path.join(temp_dir, "synthetic_dialogue.json")
+            print("Generating synthetic dialogue file...")
+            # Generate in a child process: peak RSS survives fork and exec,
+            # so doing it here would inflate the measurements
+            run_script("--generate", file_path)
+
+        size_mb = os.path.getsize(file_path) / 2**20
+        print(f"File: {file_path} ({size_mb:.1f} MB)")
+
+        # The binary loader reads a compiled copy in the temporary directory
+        binary_path = os.path.join(temp_dir, "dialogue.dlgb")
+        run_script("--compile", file_path, binary_path)
+
+        for loader in LOADERS:
+            path = binary_path if loader == "binary" else file_path
+            print(run_script("--measure", loader, path).strip())
+
+
+if __name__ == "__main__":
+    main()
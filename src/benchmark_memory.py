@@ -0,0 +1,89 @@
+"""
+Memory benchmark - Memory held by a compiled graph with dict and compact nodes.
+
+A synthetic tree is generated (see dialogue_generator.py) and compiled once
+with the parsed node dicts and once with compact records (dialogue_records),
+each in a fresh Python process. The memory still allocated after the parsed
+document is dropped is measured with tracemalloc, so it is what a server
+keeps for as long as the graph is loaded.
+
+Usage:
+    python benchmark_memory.py [--nodes 100000] [--text-length 80]
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+MODES = ("dict", "compact")
+
+
+def measure(mode, file_path):
+    """Compile a file in one mode and print the memory it holds as JSON"""
+    from dialogue_graph import DialogueGraph
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        text = f.read()
+
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    graph = DialogueGraph.from_data(json.loads(text), compact=(mode == "compact"))
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(json.dumps({
+        "mode": mode,
+        "nodes": len(graph),
+        "seconds": round(elapsed, 3),
+        "retained_mb": round(retained / 2**20, 1),
+        "peak_mb": round(peak / 2**20, 1),
+        "bytes_per_node": round(retained / max(len(graph), 1)),
+    }))
+
+
+def main(argv=None):
+    """Measure both modes in their own processes and print a comparison"""
+    parser = argparse.ArgumentParser(description="Compare the memory of dict and compact graphs")
+    parser.add_argument("--nodes", type=int, default=100000)
+    parser.add_argument("--fan-out", type=int, default=3)
+    parser.add_argument("--text-length", type=int, default=80)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--measure", nargs=2, metavar=("MODE", "FILE"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        measure(*args.measure)
+        return 0
+
+    from dialogue_generator import write_dialogue_file
+
+    script = os.path.abspath(__file__)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file_path = os.path.join(temp_dir, "dialogue.json")
+        write_dialogue_file(file_path, args.nodes, args.fan_out, text_length=args.text_length,
+                            seed=args.seed)
+
+        results = {}
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, script, "--measure", mode, file_path],
+                capture_output=True, text=True, check=True, cwd=os.path.dirname(script)
+            ).stdout
+            results[mode] = json.loads(output)
+            print(output.strip())
+
+    saved = 1 - results["compact"]["retained_mb"] / results["dict"]["retained_mb"]
+    print(f"Compact records hold {saved:.0%} less memory than dicts")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
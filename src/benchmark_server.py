@@ -0,0 +1,121 @@
+"""
+Server benchmark - Throughput of the pre-fork dialogue server by worker count.
+
+For each worker count a PreforkServer is started on a free port and load
+generator processes open many connections, each playing a named session
+(hello, then random choose/reset requests) for a fixed time. Requests per
+second are printed next to the speedup over the first worker count.
+
+Load generators compete with the workers for CPU, so run it on a machine
+with more cores than the largest worker count, or use --clients to match.
+
+Usage:
+    python benchmark_server.py [dialogue_file] [--workers 1,2,4] [--seconds 5]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import threading
+import time
+
+from dialogue_prefork import PreforkServer
+from dialogue_server import load_graph
+
+DEFAULT_DIALOGUE = "../json/older/dialogue_tutorial.json"
+
+
+async def play(address, session_id, deadline, rng):
+    """Play one session until the deadline and return the number of requests"""
+    reader, writer = await asyncio.open_connection(*address)
+    writer.write(json.dumps({"op": "hello", "session": session_id}).encode("utf-8") + b"\n")
+    await writer.drain()
+    dialogue = json.loads(await reader.readline())["dialogue"]
+    requests = 1
+
+    while time.monotonic() < deadline:
+        if dialogue and dialogue["responses"]:
+            response = rng.choice(dialogue["responses"])["id"]
+            request = {"op": "choose", "response": response}
+        else:
+            request = {"op": "reset"}
+        writer.write(json.dumps(request).encode("utf-8") + b"\n")
+        await writer.drain()
+        dialogue = json.loads(await reader.readline())["dialogue"]
+        requests += 1
+
+    writer.close()
+    await writer.wait_closed()
+    return requests
+
+
+def run_clients(address, client, connections, seconds, results):
+    """Load generator process: many concurrent sessions for a fixed time"""
+    async def run():
+        rng = random.Random(client)
+        deadline = time.monotonic() + seconds
+        counts = await asyncio.gather(*[
+            play(address, f"bench-{client}-{i}", deadline, rng) for i in range(connections)
+        ])
+        return sum(counts)
+
+    results.put(asyncio.run(run()))
+
+
+def measure(graph, workers, clients, connections, seconds):
+    """Requests per second of a pre-fork server with a number of workers"""
+    server = PreforkServer(graph, workers, port=0)
+    server.start()
+    router = threading.Thread(target=server.serve_forever)
+    router.start()
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [
+        context.Process(target=run_clients,
+                        args=(server.address, client, connections, seconds, results))
+        for client in range(clients)
+    ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    total = sum(results.get() for _ in processes)
+    elapsed = time.perf_counter() - start
+    for process in processes:
+        process.join()
+
+    server.shutdown()
+    router.join()
+    server.close()
+    return total / elapsed
+
+
+def main():
+    """Run the benchmark for each worker count and print a comparison"""
+    parser = argparse.ArgumentParser(description="Benchmark the pre-fork dialogue server")
+    parser.add_argument("dialogue", nargs="?", default=DEFAULT_DIALOGUE)
+    parser.add_argument("--workers", default="1,2,4",
+                        help="comma-separated worker counts")
+    parser.add_argument("--clients", type=int, default=os.cpu_count(),
+                        help="load generator processes")
+    parser.add_argument("--connections", type=int, default=200,
+                        help="connections per load generator")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    graph = load_graph(args.dialogue)
+    print(f"Dialogue: {args.dialogue} ({len(graph)} nodes), "
+          f"{args.clients} load generators x {args.connections} connections, "
+          f"{os.cpu_count()} CPUs")
+
+    baseline = None
+    for workers in (int(count) for count in args.workers.split(",")):
+        rate = measure(graph, workers, args.clients, args.connections, args.seconds)
+        baseline = baseline or rate
+        print(f"{workers:3d} workers: {rate:10.0f} requests/s  ({rate / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Dialogue Batch - Advance many sessions in one call.
+
+Bots and load tests that move thousands of sessions per tick keep only the
+sessions' node indexes (the same cursors a DialogueManager uses) in an
+integer array and step them all at once against a dense transition table:
+row = node, column = response position, value = next node.
+
+With NumPy installed a step is a handful of vectorized array operations, so
+advancing 100k sessions costs a few milliseconds. Without it the same API
+works on array('l') cursors with a plain loop.
+
+Batch stepping follows transitions only: response conditions and scripts
+are not evaluated. Use DialogueManager where sessions need variables or
+quest state.
+"""
+import weakref
+from array import array
+from typing import Any, Optional, Sequence
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Table value of a response position the node does not have
+NO_RESPONSE = -2
+
+# Cursor of a session whose conversation has ended
+ENDED = -1
+
+_tables: "weakref.WeakKeyDictionary[Any, TransitionTable]" = weakref.WeakKeyDictionary()
+
+
+class TransitionTable:
+    """Dense node x response position table of a dialogue graph."""
+
+    def __init__(self, graph, use_numpy: bool = True):
+        """
+        Build the table of a graph.
+
+        Args:
+            graph: A DialogueGraph, LazyDialogueGraph or BinaryDialogueGraph;
+                lazily loaded graphs decode every node once
+            use_numpy: Use NumPy arrays when NumPy is installed
+        """
+        self.graph = graph
+        # NumPy module, or None for the array fallback
+        self._np = numpy if use_numpy else None
+
+        node_count = len(graph.node_ids)
+        counts, targets = _response_targets(graph)
+
+        # At least one column, so an empty graph still has a valid shape
+        self.width = max(max(counts, default=0), 1)
+        # Row for cursors of ended sessions, which never move
+        self.ended_row = node_count
+
+        # Number of responses of each node
+        self.response_counts = array('l', counts)
+
+        # Row-major, entry node * width + position
+        table = array('l', [NO_RESPONSE]) * ((node_count + 1) * self.width)
+        slot = 0
+        for node_index, count in enumerate(counts):
+            row = node_index * self.width
+            table[row:row + count] = targets[slot:slot + count]
+            slot += count
+
+        if self._np is not None:
+            self.table = self._np.array(table, dtype=self._np.int64)
+            self.response_counts = self._np.array(counts, dtype=self._np.int64)
+        else:
+            self.table = table
+
+    def cursors(self, count: int, node_index: Optional[int] = None):
+        """
+        Make a cursor array for new sessions.
+
+        Args:
+            count: Number of sessions
+            node_index: Node to start at, defaults to the starting dialogue
+
+        Returns:
+            Integer array of cursors (NumPy array or array('l'))
+        """
+        if node_index is None:
+            node_index = self.graph.starting_index
+        if self._np is not None:
+            return self._np.full(count, node_index, dtype=self._np.int64)
+        return array('l', [node_index]) * count
+
+    def step_many(self, cursors: Sequence[int], choices: Sequence[int]):
+        """
+        Advance many sessions by one response each.
+
+        Args:
+            cursors: Node index of each session, -1 for ended sessions
+            choices: Position of the chosen response within each session's
+                node, in the order of the node's responses
+
+        Returns:
+            New cursors, in a new array of the same kind. Sessions whose
+            choice does not exist stay where they are; a response without
+            a next_dialogue (or to a missing node) ends the session (-1).
+        """
+        np = self._np
+        if np is not None:
+            cursors = np.asarray(cursors, dtype=np.int64)
+            choices = np.asarray(choices, dtype=np.int64)
+
+            rows = np.where(cursors < 0, self.ended_row, cursors)
+            # Out-of-range choices read some clipped entry and are masked out
+            targets = self.table.take(rows * self.width + choices, mode="clip")
+            valid = (choices >= 0) & (choices < self.width) & (targets != NO_RESPONSE)
+            return np.where(valid, targets, cursors)
+
+        table = self.table
+        width = self.width
+        ended_row = self.ended_row
+        stepped = array('l', cursors)
+        for i, choice in enumerate(choices):
+            if 0 <= choice < width:
+                cursor = stepped[i]
+                target = table[(cursor if cursor >= 0 else ended_row) * width + choice]
+                if target != NO_RESPONSE:
+                    stepped[i] = target
+        return stepped
+
+
+def transition_table(graph) -> TransitionTable:
+    """
+    Get the transition table of a graph, building it on first use.
+
+    Args:
+        graph: The dialogue graph
+
+    Returns:
+        The shared TransitionTable
+    """
+    table = _tables.get(graph)
+    if table is None:
+        table = _tables[graph] = TransitionTable(graph)
+    return table
+
+
+def step_many(graph, cursors: Sequence[int], choices: Sequence[int]):
+    """
+    Advance many sessions on a graph by one response each.
+
+    See TransitionTable.step_many().
+
+    Args:
+        graph: The dialogue graph the sessions run on
+        cursors: Node index of each session, -1 for ended sessions
+        choices: Position of the chosen response within each session's node
+
+    Returns:
+        The new cursors
+    """
+    return transition_table(graph).step_many(cursors, choices)
+
+
+def _response_targets(graph):
+    """Response count of each node and the target of every response, in order."""
+    if hasattr(graph, "response_start"):
+        # DialogueGraph already stores its responses as flat arrays
+        starts = graph.response_start
+        counts = [starts[i + 1] - starts[i] for i in range(len(starts) - 1)]
+        return counts, array('l', graph.response_targets)
+
+    node_index = graph.node_index
+    counts = []
+    targets = array('l')
+    for index in range(len(graph.node_ids)):
+        responses = graph.node(index).get("responses", [])
+        counts.append(len(responses))
+        targets.extend(
+            node_index.get(response.get("next_dialogue") or "", ENDED) for response in responses
+        )
+    return counts, targets
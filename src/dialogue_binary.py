@@ -0,0 +1,305 @@
+"""
+Dialogue Binary - Compact compiled format for dialogue trees.
+
+Layout (all integers little-endian, unsigned 32-bit unless noted):
+
+    header      magic "DLGB", version (u16), flags (u16), string count,
+                node count, response count, starting dialogue string,
+                top-level extras string, node table offset, response
+                table offset, string offsets offset, string data offset
+    nodes       fixed-width records: id, npc_name, text, extras,
+                first response, response count, flags
+    responses   fixed-width records: id, text, next_dialogue, extras
+    strings     string count + 1 offsets into the UTF-8 string data
+
+Fields refer to strings by index, with NO_VALUE for a missing field. Any
+field that is not a string, and any key outside the fixed schema (quests,
+metadata, script, condition, ...), is kept as JSON in the record's extras
+string so that decompiling returns exactly the original document.
+
+A BinaryDialogueGraph reads the tables straight from a memory map and only
+decodes the strings of a node when the node is first reached.
+"""
+import json
+import mmap
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+from dialogue_lazy import OnDemandDialogueGraph, DEFAULT_MAX_CACHED_NODES
+
+MAGIC = b"DLGB"
+VERSION = 1
+
+# Marks a missing string field
+NO_VALUE = 0xFFFFFFFF
+
+# Node flag: the node has a "responses" list
+NODE_HAS_RESPONSES = 1
+
+HEADER = struct.Struct("<4sHHIIIIIIIII")
+NODE_RECORD = struct.Struct("<IIIIIII")
+RESPONSE_RECORD = struct.Struct("<IIII")
+STRING_OFFSET = struct.Struct("<I")
+
+_NODE_FIELDS = ("id", "npc_name", "text")
+_RESPONSE_FIELDS = ("id", "text", "next_dialogue")
+_TOP_LEVEL_FIELDS = ("starting_dialogue",)
+
+
+class _StringTable:
+    """Deduplicating string table used while compiling."""
+
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.strings: List[str] = []
+
+    def add(self, value: Any) -> int:
+        """Add a string and return its index, or NO_VALUE for non-strings."""
+        if not isinstance(value, str):
+            return NO_VALUE
+
+        index = self.index.get(value)
+        if index is None:
+            index = len(self.strings)
+            self.index[value] = index
+            self.strings.append(value)
+        return index
+
+    def add_extras(self, record: Dict, fields: Tuple[str, ...]) -> int:
+        """Store the keys a fixed record cannot hold as a JSON string."""
+        extras = {
+            key: value for key, value in record.items()
+            if key not in fields or not isinstance(value, str)
+        }
+        if not extras:
+            return NO_VALUE
+
+        return self.add(json.dumps(extras, ensure_ascii=False, separators=(",", ":")))
+
+
+def compile_dialogue_data(data: Dict) -> bytes:
+    """
+    Compile a parsed dialogue document into the binary format.
+
+    Args:
+        data: Parsed dialogue JSON with starting_dialogue and dialogues
+
+    Returns:
+        The compiled bytes
+
+    Raises:
+        ValueError: If the document is missing required fields
+    """
+    if "starting_dialogue" not in data or not isinstance(data.get("dialogues"), list):
+        raise ValueError("Invalid dialogue file structure")
+
+    strings = _StringTable()
+    node_records = bytearray()
+    response_records = bytearray()
+    response_count = 0
+
+    for node in data["dialogues"]:
+        responses = node.get("responses")
+        has_responses = isinstance(responses, list)
+
+        first_response = response_count
+        for response in responses if has_responses else []:
+            response_records += RESPONSE_RECORD.pack(
+                strings.add(response.get("id")),
+                strings.add(response.get("text")),
+                strings.add(response.get("next_dialogue")),
+                strings.add_extras(response, _RESPONSE_FIELDS)
+            )
+            response_count += 1
+
+        node_records += NODE_RECORD.pack(
+            strings.add(node.get("id")),
+            strings.add(node.get("npc_name")),
+            strings.add(node.get("text")),
+            strings.add_extras(_without(node, "responses") if has_responses else node,
+                               _NODE_FIELDS),
+            first_response,
+            response_count - first_response,
+            NODE_HAS_RESPONSES if has_responses else 0
+        )
+
+    starting = strings.add(data["starting_dialogue"])
+    top_extras = strings.add_extras(_without(data, "dialogues"), _TOP_LEVEL_FIELDS)
+
+    encoded = [s.encode("utf-8") for s in strings.strings]
+    string_offsets = bytearray()
+    position = 0
+    for value in encoded:
+        string_offsets += STRING_OFFSET.pack(position)
+        position += len(value)
+    string_offsets += STRING_OFFSET.pack(position)
+
+    node_offset = HEADER.size
+    response_offset = node_offset + len(node_records)
+    offsets_offset = response_offset + len(response_records)
+    data_offset = offsets_offset + len(string_offsets)
+
+    header = HEADER.pack(
+        MAGIC, VERSION, 0,
+        len(encoded), len(data["dialogues"]), response_count,
+        starting, top_extras,
+        node_offset, response_offset, offsets_offset, data_offset
+    )
+
+    return b"".join([header, node_records, response_records, string_offsets] + encoded)
+
+
+def _without(record: Dict, skipped: str) -> Dict:
+    """Copy of a record without a key that is stored as records instead."""
+    return {key: value for key, value in record.items() if key != skipped}
+
+
+class _BinaryReader:
+    """Random access to the tables of a compiled dialogue buffer."""
+
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer)
+        if len(self.buffer) < HEADER.size:
+            raise ValueError("Not a compiled dialogue file")
+
+        (magic, version, _flags, self.string_count, self.node_count,
+         self.response_count, self.starting, self.top_extras, self.node_offset,
+         self.response_offset, self.offsets_offset,
+         self.data_offset) = HEADER.unpack_from(self.buffer, 0)
+
+        if magic != MAGIC:
+            raise ValueError("Not a compiled dialogue file")
+        if version != VERSION:
+            raise ValueError(f"Unsupported compiled dialogue version {version}")
+
+    def string(self, index: int) -> Optional[str]:
+        """Decode a string by index."""
+        if index == NO_VALUE:
+            return None
+
+        position = self.offsets_offset + index * STRING_OFFSET.size
+        start, = STRING_OFFSET.unpack_from(self.buffer, position)
+        end, = STRING_OFFSET.unpack_from(self.buffer, position + STRING_OFFSET.size)
+        return str(self.buffer[self.data_offset + start:self.data_offset + end], "utf-8")
+
+    def extras(self, index: int) -> Dict:
+        """Decode an extras string."""
+        if index == NO_VALUE:
+            return {}
+        return json.loads(self.string(index))
+
+    def node_record(self, record: int) -> Tuple[int, ...]:
+        """Read a node record."""
+        return NODE_RECORD.unpack_from(self.buffer, self.node_offset + record * NODE_RECORD.size)
+
+    def response_record(self, record: int) -> Tuple[int, ...]:
+        """Read a response record."""
+        return RESPONSE_RECORD.unpack_from(
+            self.buffer, self.response_offset + record * RESPONSE_RECORD.size
+        )
+
+    def node(self, record: int) -> Dict:
+        """Rebuild a node dict from its record."""
+        id_, npc_name, text, extras, first, count, flags = self.node_record(record)
+
+        node = self._fields(_NODE_FIELDS, (id_, npc_name, text))
+        if flags & NODE_HAS_RESPONSES:
+            node["responses"] = [self.response(first + i) for i in range(count)]
+        node.update(self.extras(extras))
+        return node
+
+    def response(self, record: int) -> Dict:
+        """Rebuild a response dict from its record."""
+        id_, text, next_dialogue, extras = self.response_record(record)
+
+        response = self._fields(_RESPONSE_FIELDS, (id_, text, next_dialogue))
+        response.update(self.extras(extras))
+        return response
+
+    def _fields(self, names: Tuple[str, ...], indexes: Tuple[int, ...]) -> Dict:
+        """Decode the present string fields of a record."""
+        return {
+            name: self.string(index)
+            for name, index in zip(names, indexes) if index != NO_VALUE
+        }
+
+
+def decompile_dialogue_data(buffer) -> Dict:
+    """
+    Rebuild the original dialogue document from compiled bytes.
+
+    Args:
+        buffer: Compiled dialogue bytes, memoryview or memory map
+
+    Returns:
+        The parsed dialogue document
+
+    Raises:
+        ValueError: If the buffer is not a compiled dialogue
+    """
+    reader = _BinaryReader(buffer)
+
+    data: Dict[str, Any] = {}
+    if reader.starting != NO_VALUE:
+        data["starting_dialogue"] = reader.string(reader.starting)
+    data["dialogues"] = [reader.node(record) for record in range(reader.node_count)]
+    data.update(reader.extras(reader.top_extras))
+    return data
+
+
+class BinaryDialogueGraph(OnDemandDialogueGraph):
+    """Dialogue graph read directly from a compiled dialogue file."""
+
+    def __init__(self, file_path: str, max_cached_nodes: int = DEFAULT_MAX_CACHED_NODES):
+        """
+        Map a compiled dialogue file.
+
+        Only the node IDs are decoded up front; everything else is read from
+        the memory map when a node is first reached.
+
+        Args:
+            file_path: Path to the compiled dialogue file
+            max_cached_nodes: Maximum number of decoded nodes kept in memory
+
+        Raises:
+            OSError: If the file cannot be read
+            ValueError: If the file is not a compiled dialogue
+        """
+        self.file_path = file_path
+
+        self._file = open(file_path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._reader = _BinaryReader(self._map)
+        except ValueError:
+            self._file.close()
+            raise ValueError("Not a compiled dialogue file")
+
+        reader = self._reader
+
+        # Later nodes with a duplicate ID replace earlier ones, as with JSON loading
+        records: Dict[str, int] = {}
+        duplicates: List[str] = []
+        for record in range(reader.node_count):
+            node_id = reader.string(reader.node_record(record)[0])
+            if node_id in records:
+                duplicates.append(node_id)
+            records[node_id] = record
+        self._records: List[int] = list(records.values())
+
+        top_extras = reader.extras(reader.top_extras)
+        starting = reader.string(reader.starting) if reader.starting != NO_VALUE else None
+
+        self._init_nodes(list(records), starting, top_extras.get("quests") or [],
+                         max_cached_nodes, tuple(duplicates), top_extras.get("variables"))
+
+    def close(self) -> None:
+        """Release the memory map and the file."""
+        self._decoded.clear()
+        self._reader.buffer.release()
+        self._map.close()
+        self._file.close()
+
+    def _load_node(self, node_index: int) -> Dict:
+        """Decode a node from its fixed-width record."""
+        return self._reader.node(self._records[node_index])
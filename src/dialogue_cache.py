@@ -0,0 +1,254 @@
+"""
+Dialogue Cache - Process-wide cache of compiled dialogue graphs.
+
+Parsing and compiling a dialogue file is by far the most expensive part of
+starting a session. Since a DialogueGraph is read-only, every caller that
+loads the same file (or the same JSON string) can share one compiled graph
+until the file changes on disk.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from dialogue_graph import DialogueGraph
+from dialogue_stream import load_graph_streaming
+from dialogue_lazy import LazyDialogueGraph
+from dialogue_binary import BinaryDialogueGraph
+from dialogue_locale import attach_locales
+
+# Approximate resident cost of a lazily loaded node (ID and offsets)
+LAZY_BYTES_PER_NODE = 128
+
+
+class DialogueCache:
+    """LRU cache of compiled dialogue graphs with a memory ceiling."""
+
+    def __init__(self, max_entries: int = 32, max_bytes: int = 256 * 1024 * 1024,
+                 stream_threshold: int = 16 * 1024 * 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of graphs to keep
+            max_bytes: Approximate memory ceiling, measured as the total size
+                of the JSON sources of the cached graphs
+            stream_threshold: Files of at least this many bytes are loaded
+                with the streaming loader to reduce peak memory
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stream_threshold = stream_threshold
+
+        # Cache key -> (graph, source size), least recently used first
+        self._entries: "OrderedDict[Tuple, Tuple[DialogueGraph, int]]" = OrderedDict()
+
+        # (kind, path) -> key of the cached version of that file, to drop
+        # stale versions
+        self._file_keys: Dict[Tuple, Tuple] = {}
+
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        """Number of cached graphs."""
+        return len(self._entries)
+
+    @property
+    def total_bytes(self) -> int:
+        """Approximate size of all cached graphs."""
+        return self._total_bytes
+
+    def load_file(self, file_path: str, lazy: bool = False) -> DialogueGraph:
+        """
+        Get the compiled graph for a dialogue file, loading it if needed.
+
+        The file is only parsed again if its modification time or size
+        changed since it was cached.
+
+        Args:
+            file_path: Path to the JSON dialogue file
+            lazy: Return a LazyDialogueGraph that decodes nodes on demand
+
+        Returns:
+            The shared compiled graph
+
+        Raises:
+            OSError: If the file cannot be read
+            ValueError: If the file is not a valid dialogue file
+        """
+        return self._load_path(file_path, "lazy" if lazy else "file")
+
+    def load_binary(self, file_path: str) -> BinaryDialogueGraph:
+        """
+        Get the graph for a compiled binary dialogue file.
+
+        Args:
+            file_path: Path to the compiled dialogue file
+
+        Returns:
+            The shared graph
+
+        Raises:
+            OSError: If the file cannot be read
+            ValueError: If the file is not a compiled dialogue
+        """
+        return self._load_path(file_path, "binary")
+
+    def _load_path(self, file_path: str, kind: str):
+        """Load a file of the given kind, or return the cached version."""
+        path = os.path.realpath(file_path)
+        stat = os.stat(path)
+        key = (kind, path, stat.st_mtime_ns, stat.st_size)
+
+        graph = self._get(key)
+        if graph is not None:
+            return graph
+
+        if kind == "binary":
+            graph = BinaryDialogueGraph(path)
+            # The tables stay in the memory map; only node IDs are resident
+            size = len(graph) * LAZY_BYTES_PER_NODE
+        elif kind == "lazy":
+            graph = LazyDialogueGraph(path)
+            # Only the node offsets stay resident
+            size = len(graph) * LAZY_BYTES_PER_NODE
+        elif stat.st_size >= self.stream_threshold:
+            graph = load_graph_streaming(path)
+            size = stat.st_size
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                graph = DialogueGraph.from_data(json.load(f), compact=True)
+            size = stat.st_size
+
+        # Text tables next to the file are loaded when a session uses them
+        attach_locales(graph, path)
+
+        with self._lock:
+            # Forget the previous version of this file
+            stale_key = self._file_keys.get(key[:2])
+            if stale_key is not None and stale_key != key:
+                self._discard(stale_key)
+            self._file_keys[key[:2]] = key
+            self._put(key, graph, size)
+
+        return graph
+
+    def load_string(self, json_string: str) -> DialogueGraph:
+        """
+        Get the compiled graph for a JSON string, parsing it if needed.
+
+        Args:
+            json_string: JSON string containing dialogue data
+
+        Returns:
+            The shared compiled graph
+
+        Raises:
+            ValueError: If the string is not a valid dialogue document
+        """
+        encoded = json_string.encode('utf-8')
+        key = ("string", hashlib.sha1(encoded).hexdigest())
+
+        graph = self._get(key)
+        if graph is not None:
+            return graph
+
+        graph = DialogueGraph.from_data(json.loads(json_string), compact=True)
+
+        with self._lock:
+            self._put(key, graph, len(encoded))
+
+        return graph
+
+    def clear(self) -> None:
+        """Drop all cached graphs."""
+        with self._lock:
+            self._entries.clear()
+            self._file_keys.clear()
+            self._total_bytes = 0
+
+    def _get(self, key: Tuple) -> Optional[DialogueGraph]:
+        """Look up a key and mark it as recently used."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def _put(self, key: Tuple, graph: DialogueGraph, size: int) -> None:
+        """Insert an entry and evict old ones. Caller must hold the lock."""
+        self._discard(key)
+        self._entries[key] = (graph, size)
+        self._total_bytes += size
+
+        # Evict least recently used entries, but always keep the newest one
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes
+        ):
+            oldest_key = next(iter(self._entries))
+            self._discard(oldest_key)
+
+    def _discard(self, key: Tuple) -> None:
+        """Remove an entry if present. Caller must hold the lock."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+
+        self._total_bytes -= entry[1]
+        if key[0] != "string" and self._file_keys.get(key[:2]) == key:
+            del self._file_keys[key[:2]]
+
+
+# Cache shared by the whole process
+default_cache = DialogueCache()
+
+
+def load_graph_file(file_path: str, lazy: bool = False) -> DialogueGraph:
+    """
+    Load a dialogue file through the process-wide cache.
+
+    Args:
+        file_path: Path to the JSON dialogue file
+        lazy: Return a LazyDialogueGraph that decodes nodes on demand
+
+    Returns:
+        The shared compiled graph
+    """
+    return default_cache.load_file(file_path, lazy=lazy)
+
+
+def load_graph_from_string(json_string: str) -> DialogueGraph:
+    """
+    Load a JSON dialogue string through the process-wide cache.
+
+    Args:
+        json_string: JSON string containing dialogue data
+
+    Returns:
+        The shared compiled graph
+    """
+    return default_cache.load_string(json_string)
+
+
+def load_graph_binary(file_path: str) -> BinaryDialogueGraph:
+    """
+    Load a compiled dialogue file through the process-wide cache.
+
+    Args:
+        file_path: Path to the compiled dialogue file
+
+    Returns:
+        The shared graph
+    """
+    return default_cache.load_binary(file_path)
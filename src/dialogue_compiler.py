@@ -0,0 +1,128 @@
+"""
+Command-line compiler for the binary dialogue format.
+
+Usage:
+    python dialogue_compiler.py compile <input.json> [output.dlgb]
+    python dialogue_compiler.py decompile <input.dlgb> [output.json]
+    python dialogue_compiler.py verify <input.json> [...]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from dialogue_binary import compile_dialogue_data, decompile_dialogue_data, BinaryDialogueGraph
+
+
+def default_output(input_path, extension):
+    """Replace the extension of the input file"""
+    return os.path.splitext(input_path)[0] + extension
+
+
+def compile_file(args):
+    """Compile a JSON dialogue file to the binary format"""
+    output_path = args.output or default_output(args.input, ".dlgb")
+
+    with open(args.input, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    compiled = compile_dialogue_data(data)
+    with open(output_path, 'wb') as f:
+        f.write(compiled)
+
+    print(f"Compiled {args.input} -> {output_path} "
+          f"({os.path.getsize(args.input)} -> {len(compiled)} bytes)")
+    return 0
+
+
+def decompile_file(args):
+    """Turn a binary dialogue file back into JSON"""
+    output_path = args.output or default_output(args.input, ".json")
+
+    with open(args.input, 'rb') as f:
+        data = decompile_dialogue_data(f.read())
+
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+    print(f"Decompiled {args.input} -> {output_path}")
+    return 0
+
+
+def verify_files(args):
+    """Check that JSON files survive a compile/decompile round trip"""
+    failures = 0
+
+    for input_path in args.inputs:
+        with open(input_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        compiled = compile_dialogue_data(data)
+        if decompile_dialogue_data(compiled) == data:
+            print(f"OK       {input_path}")
+        else:
+            print(f"MISMATCH {input_path}")
+            failures += 1
+
+    return 1 if failures else 0
+
+
+def benchmark_file(args):
+    """Compare load time of a JSON file and its compiled form"""
+    with open(args.input, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    compiled_path = default_output(args.input, ".dlgb")
+    with open(compiled_path, 'wb') as f:
+        f.write(compile_dialogue_data(data))
+
+    start = time.perf_counter()
+    with open(args.input, 'r', encoding='utf-8') as f:
+        json.load(f)
+    json_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    graph = BinaryDialogueGraph(compiled_path)
+    binary_seconds = time.perf_counter() - start
+    graph.close()
+
+    print(f"json.load:           {json_seconds * 1000:.1f} ms")
+    print(f"BinaryDialogueGraph: {binary_seconds * 1000:.1f} ms")
+    return 0
+
+
+def main(argv=None):
+    """Parse arguments and run a command"""
+    parser = argparse.ArgumentParser(description="Compile dialogue trees to a binary format")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    compile_parser = commands.add_parser("compile", help="compile JSON to binary")
+    compile_parser.add_argument("input")
+    compile_parser.add_argument("output", nargs="?")
+    compile_parser.set_defaults(run=compile_file)
+
+    decompile_parser = commands.add_parser("decompile", help="decompile binary to JSON")
+    decompile_parser.add_argument("input")
+    decompile_parser.add_argument("output", nargs="?")
+    decompile_parser.set_defaults(run=decompile_file)
+
+    verify_parser = commands.add_parser("verify", help="check lossless round trips")
+    verify_parser.add_argument("inputs", nargs="+")
+    verify_parser.set_defaults(run=verify_files)
+
+    benchmark_parser = commands.add_parser(
+        "benchmark", help="compare load time with json.load (writes <input>.dlgb)"
+    )
+    benchmark_parser.add_argument("input")
+    benchmark_parser.set_defaults(run=benchmark_file)
+
+    args = parser.parse_args(argv)
+    try:
+        return args.run(args)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,413 @@
+"""
+Dialogue Conditions - Compiled condition expressions for response gating.
+
+A response may carry a "condition". Conditions are parsed once, when the
+dialogue is loaded, into a tree of Python closures; evaluating one is a few
+function calls and never goes through eval().
+
+Expression syntax:
+
+    likes_typewriter == true and not met_pixel
+    gold >= 10 or quest_stage(tutorial) > 1
+    quest_active(tutorial)
+
+Names are variables, true/false/null and numbers are literals and strings
+are quoted. Supported operators are == != < <= > >= and, or, not and
+parentheses. Quest functions are quest_active(id), quest_complete(id) and
+quest_stage(id). An ordering comparison of values that cannot be ordered,
+such as a string and a number or an unset variable, is false.
+
+The older schema's single-token conditions are translated to the same form:
+QuestActive_<quest>, QuestComplete_<quest>, VariableEquals_<name>_<value>
+and VariableNotEquals_<name>_<value>.
+
+Every compiled Condition knows the variables and quests it reads. A
+DialogueState remembers the result of each condition together with the
+state version it was computed at, and only re-evaluates a condition when
+one of its own dependencies has changed since.
+"""
+import operator
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+# Dependency key prefix for quest state
+QUEST_KEY = "quest:"
+
+# Number of compiled conditions kept by compile_condition()
+MAX_COMPILED_CONDITIONS = 4096
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<number>-?\d+(?:\.\d+)?)
+      | (?P<string>'[^']*'|"[^"]*")
+      | (?P<op>==|!=|<=|>=|<|>|\(|\)|,)
+      | (?P<name>[A-Za-z_][A-Za-z0-9_.]*)
+    )""", re.VERBOSE)
+
+_LEGACY = re.compile(r"^(QuestActive|QuestComplete|VariableEquals|VariableNotEquals)_(\S+)$")
+
+_KEYWORDS = {"and", "or", "not"}
+_QUEST_FUNCTIONS = {"quest_active", "quest_complete", "quest_stage"}
+_LITERALS = {"true": True, "false": False, "null": None, "none": None}
+
+
+def _ordering(compare: Callable[[Any, Any], bool]) -> Callable[[Any, Any], bool]:
+    """Wrap an ordering comparison so values that cannot be ordered compare false."""
+    def ordered(a: Any, b: Any) -> bool:
+        try:
+            return compare(a, b)
+        except TypeError:
+            return False
+    return ordered
+
+
+_COMPARISONS: Dict[str, Callable[[Any, Any], bool]] = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": _ordering(operator.lt),
+    "<=": _ordering(operator.le),
+    ">": _ordering(operator.gt),
+    ">=": _ordering(operator.ge),
+}
+
+# A compiled expression: state -> value
+Evaluator = Callable[["DialogueState"], Any]
+
+
+class Condition:
+    """A compiled condition expression."""
+
+    __slots__ = ("source", "dependencies", "_evaluate")
+
+    def __init__(self, source: str, evaluate: Evaluator, dependencies: FrozenSet[str]):
+        self.source = source
+        # Variable names and quest keys (QUEST_KEY + id) the condition reads
+        self.dependencies = dependencies
+        self._evaluate = evaluate
+
+    def __call__(self, state: "DialogueState") -> bool:
+        """Evaluate the condition against a state, without caching."""
+        return bool(self._evaluate(state))
+
+    def __repr__(self) -> str:
+        return f"Condition({self.source!r})"
+
+
+class DialogueState:
+    """
+    Variables and quest progress of one session, with change tracking.
+
+    Always change values through set_variable(), set_quest() or touch() so
+    cached condition results are invalidated.
+    """
+
+    __slots__ = ("variables", "quests", "version", "_versions", "_results")
+
+    def __init__(self, variables: Optional[Dict] = None, quests: Optional[Dict] = None):
+        """
+        Create a session state.
+
+        Args:
+            variables: Initial variable values, copied
+            quests: Initial quest progress, quest ID -> progress dict, copied
+        """
+        self.variables: Dict[str, Any] = dict(variables or {})
+        self.quests: Dict[str, Dict] = dict(quests or {})
+
+        # Bumped on every change; _versions records when each key last changed
+        self.version = 0
+        self._versions: Dict[str, int] = {}
+
+        # Condition -> (version the result was checked at, result)
+        self._results: Dict[Condition, Tuple[int, bool]] = {}
+
+    def get_variable(self, name: str, default: Any = None) -> Any:
+        """
+        Get a variable value.
+
+        Args:
+            name: Variable name
+            default: Value returned if the variable is not set
+
+        Returns:
+            The variable value
+        """
+        return self.variables.get(name, default)
+
+    def set_variable(self, name: str, value: Any) -> None:
+        """
+        Set a variable value.
+
+        Args:
+            name: Variable name
+            value: New value
+        """
+        if name in self.variables and self.variables[name] == value:
+            return
+
+        self.variables[name] = value
+        self.touch(name)
+
+    def set_quest(self, quest_id: str, progress: Optional[Dict]) -> None:
+        """
+        Replace the progress of a quest.
+
+        Args:
+            quest_id: ID of the quest
+            progress: Progress dict (current_stage, completed), or None to
+                forget the quest
+        """
+        if progress is None:
+            self.quests.pop(quest_id, None)
+        else:
+            self.quests[quest_id] = progress
+        self.touch(QUEST_KEY + quest_id)
+
+    def touch(self, key: str) -> None:
+        """
+        Record that a variable or quest (QUEST_KEY + id) has changed.
+
+        Args:
+            key: The dependency key that changed
+        """
+        self.version += 1
+        self._versions[key] = self.version
+
+    def check(self, condition: Optional[Condition]) -> bool:
+        """
+        Evaluate a condition, reusing the last result if nothing it reads
+        has changed since.
+
+        Args:
+            condition: The condition, or None for an unconditional response
+
+        Returns:
+            bool: Whether the condition holds
+        """
+        if condition is None:
+            return True
+
+        cached = self._results.get(condition)
+        if cached is not None:
+            checked_at, result = cached
+            if checked_at == self.version:
+                return result
+
+            versions = self._versions
+            if all(versions.get(key, 0) <= checked_at for key in condition.dependencies):
+                self._results[condition] = (self.version, result)
+                return result
+
+        result = condition(self)
+        self._results[condition] = (self.version, result)
+        return result
+
+
+@lru_cache(maxsize=MAX_COMPILED_CONDITIONS)
+def compile_condition(source: str) -> Condition:
+    """
+    Compile a condition expression.
+
+    Results are memoized, so the many responses sharing a condition share
+    one compiled Condition.
+
+    Args:
+        source: The condition text
+
+    Returns:
+        The compiled condition
+
+    Raises:
+        ValueError: If the condition is not valid
+    """
+    text = source.strip()
+
+    legacy = _LEGACY.match(text)
+    if legacy:
+        text = _translate_legacy(legacy.group(1), legacy.group(2))
+
+    parser = _Parser(_tokenize(text, source), source)
+    evaluate = parser.parse()
+    return Condition(source, evaluate, frozenset(parser.dependencies))
+
+
+def response_condition(response: Dict) -> Optional[Condition]:
+    """
+    Get the compiled condition of a response.
+
+    A condition that does not compile never holds, so the response stays
+    hidden; validate_graph() reports it.
+
+    Args:
+        response: The response record
+
+    Returns:
+        The compiled condition, or None if the response has none
+    """
+    source = response.get("condition")
+    if not source:
+        return None
+
+    try:
+        return compile_condition(source)
+    except (ValueError, TypeError):
+        return _never(str(source))
+
+
+@lru_cache(maxsize=MAX_COMPILED_CONDITIONS)
+def _never(source: str) -> Condition:
+    """Placeholder for a condition that failed to compile."""
+    return Condition(source, lambda state: False, frozenset())
+
+
+def _translate_legacy(kind: str, argument: str) -> str:
+    """Rewrite an older single-token condition as an expression."""
+    if kind == "QuestActive":
+        return f"quest_active('{argument}')"
+    if kind == "QuestComplete":
+        return f"quest_complete('{argument}')"
+
+    # VariableEquals_<name>_<value>: the value follows the last underscore
+    name, _, value = argument.rpartition("_")
+    if not name:
+        raise ValueError(f"Invalid condition '{kind}_{argument}'")
+    if value.lower() not in _LITERALS and not re.fullmatch(r"-?\d+(?:\.\d+)?", value):
+        value = f"'{value}'"
+
+    operator = "==" if kind == "VariableEquals" else "!="
+    return f"{name} {operator} {value}"
+
+
+def _tokenize(text: str, source: str) -> List[Tuple[str, str]]:
+    """Split an expression into (kind, text) tokens."""
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None or match.end() == position:
+            raise ValueError(
+                f"Invalid condition '{source}': unexpected {text[position:].strip()[:1]!r}"
+            )
+
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "name" and value.lower() in _KEYWORDS:
+            kind = value.lower()
+        tokens.append((kind, value))
+        position = match.end()
+
+    tokens.append(("end", ""))
+    return tokens
+
+
+class _Parser:
+    """Recursive descent parser that builds evaluator closures."""
+
+    def __init__(self, tokens: List[Tuple[str, str]], source: str):
+        self.tokens = tokens
+        self.position = 0
+        self.source = source
+        self.dependencies = set()
+
+    def parse(self) -> Evaluator:
+        evaluate = self._or()
+        if self._peek() != "end":
+            self._fail(f"unexpected '{self.tokens[self.position][1]}'")
+        return evaluate
+
+    def _peek(self) -> str:
+        return self.tokens[self.position][0]
+
+    def _next(self) -> Tuple[str, str]:
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def _expect(self, text: str) -> None:
+        kind, value = self._next()
+        if value != text:
+            self._fail(f"expected '{text}'")
+
+    def _fail(self, message: str) -> None:
+        raise ValueError(f"Invalid condition '{self.source}': {message}")
+
+    def _or(self) -> Evaluator:
+        left = self._and()
+        while self._peek() == "or":
+            self._next()
+            right = self._and()
+            left = (lambda a, b: lambda state: a(state) or b(state))(left, right)
+        return left
+
+    def _and(self) -> Evaluator:
+        left = self._not()
+        while self._peek() == "and":
+            self._next()
+            right = self._not()
+            left = (lambda a, b: lambda state: a(state) and b(state))(left, right)
+        return left
+
+    def _not(self) -> Evaluator:
+        if self._peek() == "not":
+            self._next()
+            operand = self._not()
+            return lambda state: not operand(state)
+        return self._comparison()
+
+    def _comparison(self) -> Evaluator:
+        left = self._value()
+        if self._peek() == "op" and self.tokens[self.position][1] in _COMPARISONS:
+            compare = _COMPARISONS[self._next()[1]]
+            right = self._value()
+            return lambda state: compare(left(state), right(state))
+        return left
+
+    def _value(self) -> Evaluator:
+        kind, value = self._next()
+
+        if kind == "number":
+            number = float(value) if "." in value else int(value)
+            return lambda state: number
+        if kind == "string":
+            text = value[1:-1]
+            return lambda state: text
+        if kind == "op" and value == "(":
+            inner = self._or()
+            self._expect(")")
+            return inner
+        if kind != "name":
+            self._fail(f"unexpected '{value}'" if value else "unexpected end")
+
+        if value.lower() in _LITERALS:
+            literal = _LITERALS[value.lower()]
+            return lambda state: literal
+
+        if self.tokens[self.position][1] == "(":
+            return self._call(value)
+
+        self.dependencies.add(value)
+        return lambda state: state.variables.get(value)
+
+    def _call(self, function: str) -> Evaluator:
+        if function not in _QUEST_FUNCTIONS:
+            self._fail(f"unknown function '{function}'")
+
+        self._expect("(")
+        kind, quest_id = self._next()
+        if kind not in ("name", "string"):
+            self._fail(f"{function}() expects a quest ID")
+        if kind == "string":
+            quest_id = quest_id[1:-1]
+        self._expect(")")
+
+        self.dependencies.add(QUEST_KEY + quest_id)
+
+        if function == "quest_active":
+            return lambda state: (
+                quest_id in state.quests and not state.quests[quest_id].get("completed", False)
+            )
+        if function == "quest_complete":
+            return lambda state: state.quests.get(quest_id, {}).get("completed", False)
+        return lambda state: state.quests.get(quest_id, {}).get("current_stage", 0)
@@ -0,0 +1,370 @@
+"""
+Dialogue Coverage - Monte Carlo exploration of the paths players take.
+
+explore() plays a large number of random walks from the starting dialogue
+and counts how often each node is visited and where the walks end. Walkers
+advance together over the dense transition table of dialogue_batch, one
+vectorized step for every walker still in a conversation, so millions of
+walks over a 100k-node tree take seconds. Walks are split into fixed-size
+chunks with their own random streams; chunks can run on a process pool, and
+the results for a seed do not depend on the number of processes.
+
+By default every available response is equally likely. A policy assigns
+weights to a node's responses instead, e.g. to model players who prefer
+the first option. Like batch stepping, exploration follows transitions
+only: conditions and scripts are not evaluated.
+
+A walk ends at a node without responses or when it takes a response
+without a next_dialogue. Walks still going after max_steps nodes (usually
+stuck in a loop) are counted as truncated.
+
+Usage:
+    python dialogue_coverage.py <dialogue.json|dialogue.dlgb> [--walks 1000000] [--seed 1]
+"""
+import argparse
+import multiprocessing
+import operator
+import random
+import sys
+from array import array
+from bisect import bisect_right
+from typing import Callable, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from dialogue_batch import ENDED, NO_RESPONSE, TransitionTable
+
+# Weights of the responses of a node, by response position
+Policy = Callable[[object, int], Sequence[float]]
+
+# Walks per chunk; each chunk has its own random stream
+DEFAULT_CHUNK_SIZE = 100000
+
+# State shared with pool workers, inherited when the pool forks
+_explorer: Optional["_Explorer"] = None
+
+
+class CoverageReport(NamedTuple):
+    """Results of a Monte Carlo exploration."""
+
+    node_ids: Tuple[str, ...]
+    # Dialogue ID -> node index
+    node_index: Mapping[str, int]
+    walks: int
+    # Walks that reached an ending within max_steps
+    completed: int
+    truncated: int
+    # Visits of each node, by node index; a walk can visit a node repeatedly
+    visits: Sequence[int]
+    # Walks that ended at each node, by node index
+    endings: Sequence[int]
+    # Node indexes where a walk can end
+    ending_nodes: Tuple[int, ...]
+    # Nodes in completed walks, including the start and the ending
+    total_length: int
+    longest: int
+
+    @property
+    def mean_length(self) -> float:
+        """Expected number of nodes on a completed walk."""
+        return self.total_length / self.completed if self.completed else 0.0
+
+    def visit_frequency(self, dialogue_id: str) -> float:
+        """
+        Get the expected number of visits to a node per walk.
+
+        Args:
+            dialogue_id: ID of the node
+
+        Returns:
+            Visits divided by the number of walks
+
+        Raises:
+            ValueError: If the graph has no such node
+        """
+        index = self.node_index.get(dialogue_id)
+        if index is None:
+            raise ValueError(f"Unknown dialogue '{dialogue_id}'")
+        return self.visits[index] / self.walks if self.walks else 0.0
+
+    def visit_frequencies(self) -> Dict[str, float]:
+        """Expected visits per walk of every node, by dialogue ID."""
+        walks = self.walks or 1
+        return {node_id: count / walks for node_id, count in zip(self.node_ids, self.visits)}
+
+    def ending_probabilities(self) -> Dict[str, float]:
+        """Probability of a walk ending at each ending node, by dialogue ID."""
+        walks = self.walks or 1
+        return {self.node_ids[index]: self.endings[index] / walks for index in self.ending_nodes}
+
+    def never_visited(self) -> List[str]:
+        """IDs of the nodes no walk visited."""
+        return [node_id for node_id, count in zip(self.node_ids, self.visits) if not count]
+
+
+def explore(graph, walks: int = 1000000, max_steps: int = 1000,
+            policy: Optional[Policy] = None, seed: Optional[int] = None,
+            processes: int = 1, chunk_size: int = DEFAULT_CHUNK_SIZE,
+            use_numpy: bool = True) -> CoverageReport:
+    """
+    Play random walks through a dialogue graph and collect coverage.
+
+    Args:
+        graph: A DialogueGraph, LazyDialogueGraph or BinaryDialogueGraph
+        walks: Number of walks from the starting dialogue
+        max_steps: Longest walk in nodes before it counts as truncated
+        policy: Function of (graph, node index) returning a weight for each
+            of the node's responses; None chooses uniformly
+        seed: Seed for reproducible results
+        processes: Worker processes to spread the chunks over (POSIX only)
+        chunk_size: Walks per chunk
+        use_numpy: Use NumPy when it is installed
+
+    Returns:
+        The CoverageReport
+    """
+    explorer = _Explorer(graph, policy, max_steps, use_numpy)
+    sizes = [min(chunk_size, walks - start) for start in range(0, walks, chunk_size)]
+    seeds = explorer.chunk_seeds(seed, len(sizes))
+
+    if processes > 1 and len(sizes) > 1:
+        global _explorer
+        _explorer = explorer
+        try:
+            # Forked workers share the tables instead of unpickling copies
+            with multiprocessing.get_context("fork").Pool(processes) as pool:
+                results = pool.starmap(_run_chunk, zip(sizes, seeds))
+        finally:
+            _explorer = None
+    else:
+        results = [explorer.run(size, chunk_seed) for size, chunk_seed in zip(sizes, seeds)]
+
+    return explorer.report(walks, results)
+
+
+def _run_chunk(size: int, seed) -> tuple:
+    """Pool worker entry point."""
+    return _explorer.run(size, seed)
+
+
+class _Explorer:
+    """Transition and choice tables of one exploration."""
+
+    def __init__(self, graph, policy: Optional[Policy], max_steps: int, use_numpy: bool):
+        self.graph = graph
+        self.max_steps = max_steps
+        self.table = TransitionTable(graph, use_numpy)
+        self._np = self.table._np
+
+        width = self.table.width
+        counts = self.table.response_counts
+        node_count = len(counts)
+
+        # Cumulative response probabilities, row-major like the table;
+        # None for uniform choice
+        self.cumulative = None
+        if policy is not None:
+            cumulative = array('d', [2.0]) * (node_count * width)
+            for node_index in range(node_count):
+                count = int(counts[node_index])
+                if count:
+                    row = node_index * width
+                    cumulative[row:row + count] = array('d', _cumulative(
+                        policy(graph, node_index), count, graph.node_ids[node_index]))
+            self.cumulative = cumulative
+            if self._np is not None:
+                self.cumulative = self._np.array(cumulative).reshape(node_count, width)
+
+        flat = self.table.table
+        self.ending_nodes = tuple(
+            node_index for node_index in range(node_count)
+            if not counts[node_index] or any(
+                flat[node_index * width + position] == ENDED
+                for position in range(int(counts[node_index])))
+        )
+
+    def chunk_seeds(self, seed: Optional[int], chunks: int) -> list:
+        """Independent random streams for the chunks."""
+        if self._np is not None:
+            return self._np.random.SeedSequence(seed).spawn(chunks)
+        rng = random.Random(seed)
+        return [rng.getrandbits(64) for _ in range(chunks)]
+
+    def run(self, size: int, seed) -> tuple:
+        """Play one chunk of walks."""
+        if self._np is not None:
+            return self._run_numpy(size, seed)
+        return self._run_python(size, seed)
+
+    def _run_numpy(self, size: int, seed) -> tuple:
+        np = self._np
+        rng = np.random.default_rng(seed)
+        table = self.table
+        flat = table.table
+        width = table.width
+        counts = table.response_counts
+        node_count = len(counts)
+
+        visits = np.zeros(node_count, dtype=np.int64)
+        endings = np.zeros(node_count, dtype=np.int64)
+        completed = total_length = longest = 0
+
+        # Only walkers still in a conversation are kept
+        cursors = table.cursors(size)
+        if not 0 <= self.graph.starting_index < node_count:
+            cursors = cursors[:0]
+
+        for length in range(1, self.max_steps + 1):
+            if not len(cursors):
+                break
+            visits += np.bincount(cursors, minlength=node_count)
+
+            if self.cumulative is None:
+                choices = (rng.random(len(cursors)) * counts[cursors]).astype(np.int64)
+            else:
+                draws = rng.random(len(cursors))
+                choices = (self.cumulative[cursors] <= draws[:, None]).sum(axis=1)
+
+            # Nodes without responses read NO_RESPONSE, so both kinds of
+            # ending come out negative
+            targets = flat.take(cursors * width + choices)
+            ended = targets < 0
+            finished = int(np.count_nonzero(ended))
+            if finished:
+                endings += np.bincount(cursors[ended], minlength=node_count)
+                completed += finished
+                total_length += finished * length
+                longest = length
+                cursors = targets[~ended]
+            else:
+                cursors = targets
+
+        return (visits.tolist(), endings.tolist(), completed, total_length, longest)
+
+    def _run_python(self, size: int, seed) -> tuple:
+        rng = random.Random(seed)
+        flat = self.table.table
+        width = self.table.width
+        counts = self.table.response_counts
+        cumulative = self.cumulative
+        node_count = len(counts)
+        start = self.graph.starting_index
+        max_steps = self.max_steps
+
+        visits = array('q', [0]) * node_count
+        endings = array('q', [0]) * node_count
+        completed = total_length = longest = 0
+
+        if not 0 <= start < node_count:
+            size = 0
+
+        for _ in range(size):
+            cursor = start
+            for length in range(1, max_steps + 1):
+                visits[cursor] += 1
+                count = counts[cursor]
+                if cumulative is None:
+                    choice = int(rng.random() * count)
+                else:
+                    row = cursor * width
+                    choice = bisect_right(cumulative, rng.random(), row, row + count) - row
+                target = flat[cursor * width + choice] if count else NO_RESPONSE
+                if target < 0:
+                    endings[cursor] += 1
+                    completed += 1
+                    total_length += length
+                    longest = max(longest, length)
+                    break
+                cursor = target
+
+        return (visits, endings, completed, total_length, longest)
+
+    def report(self, walks: int, results: list) -> CoverageReport:
+        """Combine the results of all chunks."""
+        node_count = len(self.table.response_counts)
+        visits = [0] * node_count
+        endings = [0] * node_count
+        completed = total_length = longest = 0
+
+        for chunk_visits, chunk_endings, chunk_completed, chunk_length, chunk_longest in results:
+            visits = list(map(operator.add, visits, chunk_visits))
+            endings = list(map(operator.add, endings, chunk_endings))
+            completed += chunk_completed
+            total_length += chunk_length
+            longest = max(longest, chunk_longest)
+
+        return CoverageReport(
+            node_ids=tuple(self.graph.node_ids),
+            node_index=self.graph.node_index,
+            walks=walks,
+            completed=completed,
+            truncated=walks - completed,
+            visits=visits,
+            endings=endings,
+            ending_nodes=self.ending_nodes,
+            total_length=total_length,
+            longest=longest,
+        )
+
+
+def _cumulative(weights: Sequence[float], count: int, dialogue_id: str) -> List[float]:
+    """Normalized cumulative weights of a node's responses."""
+    weights = list(weights)
+    if len(weights) != count:
+        raise ValueError(f"Policy gave {len(weights)} weights for the {count} "
+                         f"responses of '{dialogue_id}'")
+    if any(weight < 0 for weight in weights):
+        raise ValueError(f"Policy gave a negative weight for '{dialogue_id}'")
+
+    total = sum(weights)
+    if total <= 0:
+        weights, total = [1.0] * count, float(count)
+
+    cumulative = []
+    running = 0.0
+    for weight in weights:
+        running += weight
+        cumulative.append(running / total)
+    # Never let rounding leave a draw past the last response
+    cumulative[-1] = 2.0
+    return cumulative
+
+
+def main(argv=None):
+    """Parse arguments, explore a dialogue file and print the coverage"""
+    from dialogue_server import load_graph
+
+    parser = argparse.ArgumentParser(description="Estimate dialogue coverage with random walks")
+    parser.add_argument("dialogue", help="JSON dialogue file or compiled .dlgb file")
+    parser.add_argument("--walks", type=int, default=1000000)
+    parser.add_argument("--max-steps", type=int, default=1000)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--processes", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    try:
+        graph = load_graph(args.dialogue)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+
+    report = explore(graph, args.walks, args.max_steps, seed=args.seed,
+                     processes=args.processes)
+    print(f"{report.walks} walks: {report.completed} reached an ending, "
+          f"{report.truncated} truncated after {args.max_steps} nodes")
+    print(f"Mean path length: {report.mean_length:.2f} nodes (longest {report.longest})")
+
+    print("Endings:")
+    endings = sorted(report.ending_probabilities().items(), key=lambda item: -item[1])
+    for dialogue_id, probability in endings:
+        print(f"  {probability:8.4%}  {dialogue_id}")
+
+    never_visited = report.never_visited()
+    print(f"Never visited: {len(never_visited)} of {len(report.node_ids)} nodes")
+    for dialogue_id in never_visited[:50]:
+        print(f"  {dialogue_id}")
+    if len(never_visited) > 50:
+        print(f"  ... and {len(never_visited) - 50} more")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+"""
+Dialogue Document - Indexed, editable dialogue trees for the editor.
+
+A DialogueDocument wraps the plain dialogue dict that is loaded from and
+saved to JSON, and keeps the indexes the editor needs so that lookups and
+edits do not scan the node list: an ID to node map, per-node response maps,
+the reverse references kept by its IncrementalValidator, and the option list
+for the "next dialogue" selector.
+
+All edits must go through the document so the indexes stay in step.
+"""
+from typing import Dict, List, Optional, Tuple
+
+from dialogue_paths import PathAnalytics, analyze_edges
+from dialogue_validation import IncrementalValidator, ValidationIssue
+
+
+class DialogueDocument:
+    """Editable dialogue tree with constant-time lookups."""
+
+    def __init__(self, data: Optional[Dict] = None):
+        """
+        Index a dialogue document.
+
+        Args:
+            data: Dialogue dict with "starting_dialogue" and "dialogues". It
+                is used in place, not copied.
+        """
+        if data is None:
+            data = {"starting_dialogue": "", "dialogues": []}
+        data.setdefault("starting_dialogue", "")
+        data.setdefault("dialogues", [])
+        self.data: Dict = data
+
+        # Later nodes with a duplicate ID replace earlier ones, as in DialogueGraph
+        self.nodes: Dict[str, Dict] = {node["id"]: node for node in data["dialogues"]}
+
+        # Node ID -> response ID -> response, built on first use
+        self._responses: Dict[str, Dict[str, Dict]] = {}
+
+        # Cached "next dialogue" options, rebuilt after node edits
+        self._options: Optional[Tuple[List[str], Dict[str, str], Dict[str, int]]] = None
+
+        # Path analytics, dropped by every structural edit
+        self._paths: Optional[PathAnalytics] = None
+
+        self.validator = IncrementalValidator(data)
+
+    @property
+    def dialogues(self) -> List[Dict]:
+        """The dialogue nodes, in document order."""
+        return self.data["dialogues"]
+
+    @property
+    def starting_dialogue(self) -> str:
+        """ID of the starting dialogue."""
+        return self.data["starting_dialogue"]
+
+    def set_starting_dialogue(self, node_id: str) -> None:
+        """
+        Change the starting dialogue.
+
+        Args:
+            node_id: ID of the new starting dialogue
+        """
+        self.data["starting_dialogue"] = node_id
+        self._paths = None
+        self.validator.starting_changed(node_id)
+
+    def get_node(self, node_id: str) -> Optional[Dict]:
+        """
+        Get a dialogue node by its ID.
+
+        Args:
+            node_id: ID of the dialogue node
+
+        Returns:
+            The node, or None if it does not exist
+        """
+        return self.nodes.get(node_id)
+
+    def get_response(self, node_id: str, response_id: str) -> Optional[Dict]:
+        """
+        Get a response by its ID within a node.
+
+        Args:
+            node_id: ID of the dialogue node
+            response_id: ID of the response
+
+        Returns:
+            The response, or None if it does not exist
+        """
+        responses = self._responses.get(node_id)
+        if responses is None:
+            node = self.nodes.get(node_id)
+            if node is None:
+                return None
+
+            responses = {}
+            for response in node.get("responses", []):
+                # The first response with a given ID wins, matching a list scan
+                responses.setdefault(response["id"], response)
+            self._responses[node_id] = responses
+
+        return responses.get(response_id)
+
+    def referencing_nodes(self, node_id: str) -> List[str]:
+        """
+        Get the nodes that have a response leading to a node.
+
+        Args:
+            node_id: ID of the target node
+
+        Returns:
+            IDs of the referencing nodes
+        """
+        return self.validator.referencing_nodes(node_id)
+
+    def add_node(self, node: Dict) -> None:
+        """
+        Append a dialogue node.
+
+        Args:
+            node: The new node; it must have an "id"
+        """
+        node.setdefault("responses", [])
+        self.dialogues.append(node)
+        self.nodes[node["id"]] = node
+        self._responses.pop(node["id"], None)
+        self._add_option(node)
+        self._paths = None
+        self.validator.node_added(node)
+
+    def update_node(self, node_id: str, **fields) -> None:
+        """
+        Change fields of a node other than its ID and responses.
+
+        Args:
+            node_id: ID of the dialogue node
+            **fields: New field values, e.g. npc_name and text
+        """
+        node = self.nodes[node_id]
+        node.update(fields)
+        self.validator.fields_changed(node_id)
+        # Option labels show the NPC name and text
+        if self._options is not None:
+            self._options[1][node_id] = self._option_label(node)
+
+    def delete_node(self, node_id: str) -> bool:
+        """
+        Delete a node and every response that leads to it.
+
+        Args:
+            node_id: ID of the node to delete
+
+        Returns:
+            bool: True if the node existed
+        """
+        if node_id not in self.nodes:
+            return False
+
+        self.data["dialogues"] = [node for node in self.dialogues if node["id"] != node_id]
+        del self.nodes[node_id]
+        self._responses.pop(node_id, None)
+        self._options = None
+        self._paths = None
+        self.validator.node_removed(node_id)
+
+        # Only the nodes that reference the deleted one need rewriting
+        for source_id in self.referencing_nodes(node_id):
+            source = self.nodes[source_id]
+            source["responses"] = [
+                response for response in source["responses"]
+                if response.get("next_dialogue") != node_id
+            ]
+            self._responses_changed(source_id)
+
+        return True
+
+    def add_response(self, node_id: str, response: Dict) -> None:
+        """
+        Append a response to a node.
+
+        Args:
+            node_id: ID of the dialogue node
+            response: The new response
+        """
+        self.nodes[node_id].setdefault("responses", []).append(response)
+        self._responses_changed(node_id)
+
+    def update_response(self, node_id: str, response_id: str, **fields) -> None:
+        """
+        Change fields of a response, such as its text or next_dialogue.
+
+        Args:
+            node_id: ID of the dialogue node
+            response_id: ID of the response
+            **fields: New field values
+        """
+        self.get_response(node_id, response_id).update(fields)
+        if "next_dialogue" in fields or "id" in fields:
+            self._responses_changed(node_id)
+        else:
+            self.validator.fields_changed(node_id)
+
+    def delete_response(self, node_id: str, response_id: str) -> None:
+        """
+        Remove every response with an ID from a node.
+
+        Args:
+            node_id: ID of the dialogue node
+            response_id: ID of the response
+        """
+        node = self.nodes[node_id]
+        node["responses"] = [
+            response for response in node["responses"]
+            if response["id"] != response_id
+        ]
+        self._responses_changed(node_id)
+
+    def next_dialogue_options(self) -> Tuple[List[str], Dict[str, str], Dict[str, int]]:
+        """
+        Get the choices for a "next dialogue" selector.
+
+        The result is built once and kept up to date as nodes are added
+        and edited, so rendering many responses does not rebuild it. Only
+        deleting a node rebuilds it.
+
+        Returns:
+            Tuple of (option IDs starting with "", ID -> label,
+            ID -> position in the option list)
+        """
+        if self._options is None:
+            self._options = ([""], {"": "- Select -"}, {"": 0})
+            for node in self.dialogues:
+                self._add_option(node)
+
+        return self._options
+
+    def _add_option(self, node: Dict) -> None:
+        """Append a node to the cached option list, if there is one."""
+        if self._options is None:
+            return
+
+        ids, labels, positions = self._options
+        node_id = node["id"]
+        if node_id not in positions:
+            positions[node_id] = len(ids)
+            ids.append(node_id)
+        labels[node_id] = self._option_label(node)
+
+    @staticmethod
+    def _option_label(node: Dict) -> str:
+        """Label of a node in the "next dialogue" selector."""
+        return f"{node['id']} ({node.get('npc_name', '')}: {node.get('text', '')[:20]}...)"
+
+    def issues(self) -> List[ValidationIssue]:
+        """
+        Get the current validation issues.
+
+        Returns:
+            List of issues, errors first
+        """
+        return self.validator.issues()
+
+    def path_analytics(self) -> PathAnalytics:
+        """
+        Get path counts, depths, longest paths and dominators of the tree.
+
+        The result is cached until the next edit that changes the tree's
+        structure; text edits keep it.
+
+        Returns:
+            The PathAnalytics, see dialogue_paths
+        """
+        if self._paths is None:
+            validator = self.validator
+            node_ids = list(validator.nodes)
+            index = {node_id: i for i, node_id in enumerate(node_ids)}
+            edges = [
+                [index[target] for target in validator.out_edges.get(node_id, []) if target in index]
+                for node_id in node_ids
+            ]
+            endings = [index[node_id] for node_id in validator.endings]
+            self._paths = analyze_edges(node_ids, edges, endings,
+                                        index.get(self.starting_dialogue, -1))
+
+        return self._paths
+
+    def _responses_changed(self, node_id: str) -> None:
+        """Drop the response map of a node and update validation."""
+        self._responses.pop(node_id, None)
+        self._paths = None
+        self.validator.responses_changed(node_id)
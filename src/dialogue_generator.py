@@ -0,0 +1,182 @@
+"""
+Dialogue Generator - Seeded synthetic dialogue trees for benchmarks.
+
+The generated tree is shaped like a heap: node i leads to nodes
+i * fan_out + 1 ... i * fan_out + fan_out, so every node is reachable from
+node_0 and the tree is about log(num_nodes) / log(fan_out) choices deep.
+A cycle_density fraction of the responses point back to an earlier node
+instead, which makes loops. Leaves either have no responses or a single
+response that ends the conversation. With quests, some responses carry
+StartQuest, UpdateQuest and CompleteQuest scripts for them.
+
+The same arguments and seed always produce the same tree, so benchmark
+results from different releases are comparable. write_dialogue_file()
+streams the nodes to disk one at a time, so even million-node files are
+written without holding the tree in memory.
+
+Usage:
+    python dialogue_generator.py <output.json> [--nodes 100000] [--seed 1]
+"""
+import argparse
+import json
+import random
+import sys
+from typing import Dict, Iterator, List
+
+_WORDS = ["terminal", "signal", "access", "memory", "door", "protocol", "quest", "echo",
+          "the", "a", "of", "and", "to", "you", "we", "it"]
+
+# Stages of every generated quest
+QUEST_STAGES = 3
+
+
+def generate_quests(quest_count: int) -> List[Dict]:
+    """
+    Make the quest definitions of a generated tree.
+
+    Args:
+        quest_count: Number of quests
+
+    Returns:
+        List of quest dicts with numbered stages
+    """
+    return [
+        {
+            "id": f"quest_{q}",
+            "title": f"Quest {q}",
+            "description": f"Generated quest {q}",
+            "stages": [
+                {"id": stage, "description": f"Stage {stage}", "journal_entry": f"Stage {stage}"}
+                for stage in range(1, QUEST_STAGES + 1)
+            ],
+        }
+        for q in range(quest_count)
+    ]
+
+
+def iter_dialogues(num_nodes: int = 1000, fan_out: int = 3, cycle_density: float = 0.05,
+                   text_length: int = 80, quest_count: int = 0,
+                   seed: int = 1) -> Iterator[Dict]:
+    """
+    Generate the dialogue nodes of a synthetic tree one at a time.
+
+    Args:
+        num_nodes: Number of dialogue nodes
+        fan_out: Responses of every inner node
+        cycle_density: Fraction of responses that lead back to an earlier node
+        text_length: Approximate characters of each dialogue text; response
+            texts are a quarter of that
+        quest_count: Number of quests that scripts refer to
+        seed: Random seed
+
+    Yields:
+        Dialogue node dicts, node_0 first
+    """
+    rng = random.Random(seed)
+
+    def text(length: int) -> str:
+        words = []
+        size = 0
+        while size < length:
+            word = rng.choice(_WORDS)
+            words.append(word)
+            size += len(word) + 1
+        return " ".join(words)
+
+    def script() -> str:
+        quest = f"quest_{rng.randrange(quest_count)}"
+        kind = rng.randrange(3)
+        if kind == 0:
+            return f"StartQuest_{quest}"
+        if kind == 1:
+            return f"UpdateQuest_{quest}_{rng.randint(1, QUEST_STAGES)}"
+        return f"CompleteQuest_{quest}"
+
+    for i in range(num_nodes):
+        responses = []
+        first_child = i * fan_out + 1
+        if first_child < num_nodes:
+            for j in range(fan_out):
+                if first_child + j < num_nodes and rng.random() >= cycle_density:
+                    target = first_child + j
+                else:
+                    target = rng.randrange(i + 1)
+                response = {
+                    "id": f"node_{i}_resp_{j}",
+                    "text": text(text_length // 4),
+                    "next_dialogue": f"node_{target}",
+                }
+                if quest_count and rng.random() < 0.05:
+                    response["script"] = script()
+                responses.append(response)
+        elif rng.random() < 0.5:
+            responses.append({"id": f"node_{i}_end", "text": text(text_length // 4)})
+
+        yield {
+            "id": f"node_{i}",
+            "npc_name": f"NPC {i % 16}",
+            "text": text(text_length),
+            "responses": responses,
+        }
+
+
+def generate_dialogue(num_nodes: int = 1000, fan_out: int = 3, cycle_density: float = 0.05,
+                      text_length: int = 80, quest_count: int = 0, seed: int = 1) -> Dict:
+    """
+    Generate a synthetic dialogue document in memory.
+
+    See iter_dialogues() for the arguments.
+
+    Returns:
+        Dialogue dict with starting_dialogue, dialogues and quests
+    """
+    return {
+        "starting_dialogue": "node_0",
+        "dialogues": list(iter_dialogues(num_nodes, fan_out, cycle_density, text_length,
+                                         quest_count, seed)),
+        "quests": generate_quests(quest_count),
+    }
+
+
+def write_dialogue_file(file_path: str, num_nodes: int = 1000, fan_out: int = 3,
+                        cycle_density: float = 0.05, text_length: int = 80,
+                        quest_count: int = 0, seed: int = 1) -> None:
+    """
+    Write a synthetic dialogue file, streaming one node at a time.
+
+    See iter_dialogues() for the arguments.
+
+    Args:
+        file_path: Output JSON file path
+    """
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write('{"starting_dialogue": "node_0", "dialogues": [\n')
+        for i, node in enumerate(iter_dialogues(num_nodes, fan_out, cycle_density,
+                                                text_length, quest_count, seed)):
+            if i:
+                f.write(",\n")
+            f.write(json.dumps(node))
+        f.write('\n], "quests": ')
+        f.write(json.dumps(generate_quests(quest_count)))
+        f.write("}\n")
+
+
+def main(argv=None):
+    """Parse arguments and write a synthetic dialogue file"""
+    parser = argparse.ArgumentParser(description="Generate a synthetic dialogue tree")
+    parser.add_argument("output", help="JSON file to write")
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--fan-out", type=int, default=3)
+    parser.add_argument("--cycle-density", type=float, default=0.05)
+    parser.add_argument("--text-length", type=int, default=80)
+    parser.add_argument("--quests", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    write_dialogue_file(args.output, args.nodes, args.fan_out, args.cycle_density,
+                        args.text_length, args.quests, args.seed)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
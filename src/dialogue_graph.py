@@ -0,0 +1,406 @@
+"""
+Dialogue Graph - Compiled, read-only dialogue trees.
+
+A DialogueGraph is built once from parsed dialogue data and shared by any
+number of DialogueManager sessions. Node IDs are interned and mapped to
+integer indices, and response transitions are stored in flat arrays so a
+session only needs to remember the index of its current node.
+
+A graph built with compact=True keeps its nodes and responses as slotted,
+read-only records with shared strings (see dialogue_records) instead of the
+parsed dicts, which saves memory on large trees. plain_node() hands out
+plain dict copies of them, which is what DialogueManager returns.
+"""
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Any, Dict, List, Optional, Tuple, Mapping
+
+from dialogue_conditions import Condition, response_condition
+from dialogue_quests import QuestIndex
+from dialogue_records import NodeRecord, StringPool, compact_node, gc_paused, plain_node
+from dialogue_scripts import CompiledScript, ScriptRegistry, default_registry
+from dialogue_templates import NodeText, RenderCache, RenderedText, node_text
+
+# Number of plain dict copies of compact nodes a graph keeps
+PLAIN_NODE_CACHE_SIZE = 4096
+
+
+class DialogueGraph:
+    """Compiled dialogue tree shared between sessions. Must not be modified."""
+
+    def __init__(self, starting_dialogue_id: str, dialogues: List[Dict],
+                 quests: Optional[List[Dict]] = None,
+                 variables: Optional[Dict[str, Any]] = None,
+                 script_registry: Optional[ScriptRegistry] = None,
+                 compact: bool = False):
+        """
+        Compile dialogue nodes into an indexed graph.
+
+        Args:
+            starting_dialogue_id: ID of the starting dialogue
+            dialogues: List of dialogue node dicts; a compact graph uses
+                NodeRecords in the list as they are
+            quests: Optional list of quest dicts
+            variables: Optional initial variable values
+            script_registry: Registry used to resolve scripts, defaults to
+                dialogue_scripts.default_registry
+            compact: Store nodes as read-only records with shared strings
+                instead of using the given dicts
+        """
+        self.script_registry = script_registry or default_registry
+
+        # Later nodes with a duplicate ID replace earlier ones, as before
+        by_id: Dict[str, Dict] = {}
+        duplicates: List[str] = []
+        if compact:
+            pool = StringPool()
+            for dialogue in dialogues:
+                node = dialogue if type(dialogue) is NodeRecord else compact_node(dialogue, pool)
+                node_id = node["id"]
+                if node_id in by_id:
+                    duplicates.append(node_id)
+                by_id[node_id] = node
+        else:
+            for dialogue in dialogues:
+                node_id = sys.intern(dialogue["id"])
+                if node_id in by_id:
+                    duplicates.append(node_id)
+                by_id[node_id] = dialogue
+
+        # IDs that appeared more than once, reported by validation
+        self.duplicate_node_ids: Tuple[str, ...] = tuple(duplicates)
+
+        # Node IDs and records, addressed by integer node index
+        self.node_ids: Tuple[str, ...] = tuple(by_id)
+        self.nodes: Tuple[Dict, ...] = tuple(by_id.values())
+        self.node_index: Dict[str, int] = {
+            node_id: index for index, node_id in enumerate(self.node_ids)
+        }
+
+        self.starting_dialogue_id: str = sys.intern(starting_dialogue_id or "")
+        self.starting_index: int = self.node_index.get(self.starting_dialogue_id, -1)
+
+        # Responses of node i occupy slots response_start[i]:response_start[i + 1].
+        # response_targets holds the node index each slot leads to, or -1.
+        self.response_start = array('l', [0])
+        self.response_targets = array('l')
+        responses: List[Dict] = []
+        response_slots: List[Dict[str, int]] = []
+        conditions: List[Optional[Condition]] = []
+        scripts: List[Optional[CompiledScript]] = []
+        compile_script = self.script_registry.compile
+
+        for node in self.nodes:
+            slots: Dict[str, int] = {}
+            for response in node.get("responses", []):
+                slot = len(responses)
+                # The first response with a given ID wins, matching a list scan
+                slots.setdefault(sys.intern(response["id"]), slot)
+                responses.append(response)
+                conditions.append(response_condition(response))
+                scripts.append(compile_script(response.get("script")))
+                self.response_targets.append(
+                    self.node_index.get(response.get("next_dialogue") or "", -1)
+                )
+            response_slots.append(slots)
+            self.response_start.append(len(responses))
+
+        self.responses: Tuple[Dict, ...] = tuple(responses)
+        self.response_slots: Tuple[Dict[str, int], ...] = tuple(response_slots)
+
+        # Compiled condition of each response slot, or None if the graph has
+        # no conditional responses at all
+        self.response_conditions: Optional[Tuple[Optional[Condition], ...]] = (
+            tuple(conditions) if any(conditions) else None
+        )
+
+        # Compiled scripts of each response slot and each node's on_entry
+        # hook, or None if the graph has none
+        self.response_scripts: Optional[Tuple[Optional[CompiledScript], ...]] = (
+            tuple(scripts) if any(scripts) else None
+        )
+        entry_scripts = [compile_script(node.get("on_entry")) for node in self.nodes]
+        self.entry_scripts: Optional[Tuple[Optional[CompiledScript], ...]] = (
+            tuple(entry_scripts) if any(entry_scripts) else None
+        )
+
+        # Text templates of each node, or None if every text is static
+        node_texts = [node_text(node) for node in self.nodes]
+        self.node_texts: Optional[Tuple[Optional[NodeText], ...]] = (
+            tuple(node_texts) if any(node_texts) else None
+        )
+        self.render_cache = RenderCache()
+
+        # Per-locale text tables (a dialogue_locale.LocaleCatalog), if any
+        self.locales = None
+
+        # Node index -> plain dict copy of a compact node, oldest first
+        self._plain_nodes: "OrderedDict[int, Dict]" = OrderedDict()
+        self._plain_lock = threading.Lock()
+
+        # Read-only views for callers that expect the dict-based API
+        self.dialogues: Mapping[str, Dict] = MappingProxyType(by_id)
+        self.quests: Mapping[str, Dict] = MappingProxyType(
+            {q["id"]: q for q in (quests or [])}
+        )
+        self.variables: Mapping[str, Any] = MappingProxyType(dict(variables or {}))
+        self._quest_index: Optional[QuestIndex] = None
+
+    @classmethod
+    def from_data(cls, data: Dict, compact: bool = False) -> "DialogueGraph":
+        """
+        Compile a parsed dialogue document.
+
+        Args:
+            data: Parsed dialogue JSON with starting_dialogue and dialogues
+            compact: Store nodes as compact records, for documents that
+                nothing else holds on to
+
+        Returns:
+            The compiled DialogueGraph
+
+        Raises:
+            ValueError: If the document is missing required fields
+        """
+        if "starting_dialogue" not in data or "dialogues" not in data:
+            raise ValueError("Invalid dialogue file structure")
+
+        if not compact:
+            return cls(data["starting_dialogue"], data["dialogues"], data.get("quests"),
+                       data.get("variables"))
+
+        with gc_paused():
+            return cls(data["starting_dialogue"], data["dialogues"], data.get("quests"),
+                       data.get("variables"), compact=True)
+
+    def __len__(self) -> int:
+        """Number of dialogue nodes in the graph."""
+        return len(self.nodes)
+
+    def node(self, node_index: int) -> Dict:
+        """
+        Get a dialogue node by index.
+
+        Args:
+            node_index: Index of the dialogue node
+
+        Returns:
+            The dialogue node
+        """
+        return self.nodes[node_index]
+
+    def plain_node(self, node_index: int) -> Dict:
+        """
+        Get a dialogue node as a plain dict, with its responses as a list.
+
+        Compact nodes are copied on first use, and the copies of the most
+        recently copied nodes are kept and shared, so treat them as
+        read-only like the nodes of a graph built from dicts.
+
+        Args:
+            node_index: Index of the dialogue node
+
+        Returns:
+            The dialogue node dict
+        """
+        node = self.nodes[node_index]
+        if type(node) is not NodeRecord:
+            return node
+
+        plain = self._plain_nodes.get(node_index)
+        if plain is None:
+            plain = plain_node(node)
+            with self._plain_lock:
+                self._plain_nodes[node_index] = plain
+                while len(self._plain_nodes) > PLAIN_NODE_CACHE_SIZE:
+                    self._plain_nodes.popitem(last=False)
+        return plain
+
+    def get_node(self, dialogue_id: str) -> Optional[Dict]:
+        """
+        Get a dialogue node by ID.
+
+        Args:
+            dialogue_id: The ID of the dialogue node
+
+        Returns:
+            The dialogue node, or None if it does not exist
+        """
+        index = self.node_index.get(dialogue_id)
+        if index is None:
+            return None
+
+        return self.nodes[index]
+
+    def response_range(self, node_index: int) -> range:
+        """
+        Get the response slots belonging to a node.
+
+        Args:
+            node_index: Index of the dialogue node
+
+        Returns:
+            Range of response slots
+        """
+        return range(self.response_start[node_index], self.response_start[node_index + 1])
+
+    def find_response(self, node_index: int, response_id: str) -> int:
+        """
+        Find the slot of a response in constant time.
+
+        Args:
+            node_index: Index of the dialogue node
+            response_id: The ID of the response
+
+        Returns:
+            The response slot, or -1 if the node has no such response
+        """
+        if node_index < 0:
+            return -1
+
+        return self.response_slots[node_index].get(response_id, -1)
+
+    def transition(self, node_index: int, response_id: str) -> Optional[int]:
+        """
+        Get the node a response leads to.
+
+        Args:
+            node_index: Index of the dialogue node
+            response_id: The ID of the response
+
+        Returns:
+            Index of the next node (-1 if it does not exist), or None if the
+            node has no such response
+        """
+        slot = self.find_response(node_index, response_id)
+        if slot < 0:
+            return None
+
+        return self.response_targets[slot]
+
+    def node_conditions(self, node_index: int) -> Optional[Tuple[Optional[Condition], ...]]:
+        """
+        Get the compiled conditions of a node's responses.
+
+        Args:
+            node_index: Index of the dialogue node
+
+        Returns:
+            One condition (or None) per response in list order, or None if
+            no response of the node is conditional
+        """
+        if self.response_conditions is None:
+            return None
+
+        start = self.response_start[node_index]
+        conditions = self.response_conditions[start:self.response_start[node_index + 1]]
+        return conditions if any(conditions) else None
+
+    def response_condition(self, node_index: int, response_id: str) -> Optional[Condition]:
+        """
+        Get the compiled condition of a response.
+
+        Args:
+            node_index: Index of the dialogue node
+            response_id: The ID of the response
+
+        Returns:
+            The condition, or None if the response is unconditional or missing
+        """
+        if self.response_conditions is None:
+            return None
+
+        slot = self.find_response(node_index, response_id)
+        return self.response_conditions[slot] if slot >= 0 else None
+
+    def response_script(self, node_index: int, response_id: str) -> Optional[CompiledScript]:
+        """
+        Get the compiled script of a response.
+
+        Args:
+            node_index: Index of the dialogue node
+            response_id: The ID of the response
+
+        Returns:
+            The script, or None if the response has none or is missing
+        """
+        if self.response_scripts is None:
+            return None
+
+        slot = self.find_response(node_index, response_id)
+        return self.response_scripts[slot] if slot >= 0 else None
+
+    def entry_script(self, node_index: int) -> Optional[CompiledScript]:
+        """
+        Get the compiled on_entry script of a node.
+
+        Args:
+            node_index: Index of the dialogue node
+
+        Returns:
+            The script, or None if the node has none
+        """
+        if self.entry_scripts is None or node_index < 0:
+            return None
+
+        return self.entry_scripts[node_index]
+
+    def node_text(self, node_index: int) -> Optional[NodeText]:
+        """
+        Get the text templates of a node and its responses.
+
+        Args:
+            node_index: Index of the dialogue node
+
+        Returns:
+            The templates, or None if all of the node's texts are static
+        """
+        if self.node_texts is None or node_index < 0:
+            return None
+
+        return self.node_texts[node_index]
+
+    def render_text(self, node_index: int, variables: Dict[str, Any]) -> Optional[RenderedText]:
+        """
+        Render the texts of a node with a session's variables.
+
+        Args:
+            node_index: Index of the dialogue node
+            variables: Variable values of the session
+
+        Returns:
+            The node text and one text per response (None where a text is
+            static), or None if all of the node's texts are static
+        """
+        templates = self.node_text(node_index)
+        if templates is None:
+            return None
+
+        return self.render_cache.render(node_index, templates, variables)
+
+    @property
+    def quest_index(self) -> QuestIndex:
+        """Quest stage tables and triggers, built on first use."""
+        if self._quest_index is None:
+            self._quest_index = QuestIndex(self)
+        return self._quest_index
+
+    def get_response(self, dialogue_id: str, response_id: str) -> Optional[Dict]:
+        """
+        Look up a response by dialogue and response ID.
+
+        Args:
+            dialogue_id: The ID of the dialogue node
+            response_id: The ID of the response
+
+        Returns:
+            The response record, or None if it does not exist
+        """
+        slot = self.find_response(self.node_index.get(dialogue_id, -1), response_id)
+        if slot < 0:
+            return None
+
+        return self.responses[slot]
@@ -0,0 +1,515 @@
+"""
+Dialogue Lazy - On-demand node loading for huge dialogue files.
+
+A LazyDialogueGraph makes one pass over a memory-mapped dialogue file to
+record the byte range of every node, and only decodes a node the first time
+a session reaches it. Decoded nodes are kept in a bounded LRU cache. The
+offsets can be saved to a sidecar index file so later loads skip the scan.
+"""
+import json
+import mmap
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from dialogue_conditions import Condition, response_condition
+from dialogue_quests import QuestIndex
+from dialogue_scripts import CompiledScript, default_registry
+from dialogue_templates import NodeText, RenderCache, RenderedText, node_text
+
+# Default number of decoded nodes kept in memory
+DEFAULT_MAX_CACHED_NODES = 4096
+
+# Version of the sidecar index format
+INDEX_VERSION = 2
+
+# A complete JSON string, or a structural bracket
+_TOKEN = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[\[\]{}]', re.DOTALL)
+_WHITESPACE = b" \t\n\r"
+_QUOTE = ord('"')
+
+
+def _followed_by_colon(buffer, pos: int) -> bool:
+    """Check whether the next non-whitespace byte at pos is a colon."""
+    while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+        pos += 1
+    return pos < len(buffer) and buffer[pos] == ord(":")
+
+
+def scan_dialogue_offsets(buffer) -> Dict:
+    """
+    Record the byte ranges of the nodes in a dialogue file.
+
+    Only strings and brackets are visited, so node text is skipped without
+    being decoded.
+
+    Args:
+        buffer: The file contents as bytes or a memory map
+
+    Returns:
+        Dict with "starting_dialogue", "quests" and "variables" (each a
+        [start, end] byte range or None) and "nodes" (a list of [id, start, end])
+
+    Raises:
+        ValueError: If the file is not a valid dialogue file
+    """
+    index = {"starting_dialogue": None, "quests": None, "variables": None, "nodes": []}
+    nodes = index["nodes"]
+
+    depth = 0
+    top_key = None          # Last key seen in the top-level object
+    node_key = None         # Last key seen directly inside the current node
+    in_dialogues = False
+    node_start = -1
+    node_id = None
+    quests_start = -1
+    variables_start = -1
+    expect_start_value = False
+
+    for match in _TOKEN.finditer(buffer):
+        token = match.group()
+
+        if token[0] == _QUOTE:
+            # Strings below the node level (response text etc.) are skipped
+            if depth == 1:
+                if _followed_by_colon(buffer, match.end()):
+                    top_key = token
+                    expect_start_value = token == b'"starting_dialogue"'
+                elif expect_start_value:
+                    index["starting_dialogue"] = json.loads(token)
+                    expect_start_value = False
+            elif depth == 3 and node_id is None and node_start >= 0:
+                if _followed_by_colon(buffer, match.end()):
+                    node_key = token
+                elif node_key == b'"id"':
+                    node_id = json.loads(token)
+            continue
+
+        start = match.start()
+
+        if token in (b"{", b"["):
+            depth += 1
+            if depth == 2 and token == b"[":
+                if top_key == b'"dialogues"':
+                    in_dialogues = True
+                elif top_key == b'"quests"':
+                    quests_start = start
+            elif depth == 2 and top_key == b'"variables"':
+                variables_start = start
+            elif depth == 3 and in_dialogues and token == b"{":
+                node_start = start
+                node_id = None
+                node_key = None
+            continue
+
+        # Closing bracket
+        if depth == 3 and node_start >= 0:
+            if node_id is None:
+                raise ValueError(f"Dialogue node at byte {node_start} has no id")
+            nodes.append([node_id, node_start, match.end()])
+            node_start = -1
+        elif depth == 2:
+            if in_dialogues:
+                in_dialogues = False
+                index["dialogues"] = True
+            elif quests_start >= 0:
+                index["quests"] = [quests_start, match.end()]
+                quests_start = -1
+            elif variables_start >= 0:
+                index["variables"] = [variables_start, match.end()]
+                variables_start = -1
+        depth -= 1
+
+    if index["starting_dialogue"] is None or not index.pop("dialogues", False):
+        raise ValueError("Invalid dialogue file structure")
+
+    return index
+
+
+# A decoded node, its responses by ID, its compiled response conditions,
+# its compiled on_entry script, the compiled scripts of its responses by ID
+# and its text templates
+_DecodedNode = Tuple[
+    Dict, Dict[str, Dict], Optional[Tuple[Optional[Condition], ...]],
+    Optional[CompiledScript], Dict[str, CompiledScript], Optional[NodeText]
+]
+
+
+class _LazyNodes(Mapping):
+    """Read-only mapping of dialogue ID to node that decodes on access."""
+
+    def __init__(self, graph: "OnDemandDialogueGraph"):
+        self._graph = graph
+
+    def __getitem__(self, dialogue_id: str) -> Dict:
+        index = self._graph.node_index[dialogue_id]
+        return self._graph.node(index)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._graph.node_ids)
+
+    def __len__(self) -> int:
+        return len(self._graph.node_ids)
+
+    def __contains__(self, dialogue_id) -> bool:
+        return dialogue_id in self._graph.node_index
+
+
+class OnDemandDialogueGraph:
+    """
+    Base class for dialogue graphs that decode nodes on demand.
+
+    Subclasses call _init_nodes() once the node IDs are known and implement
+    _load_node() to decode a single node.
+    """
+
+    def _init_nodes(self, node_ids: List[str], starting_dialogue_id: Optional[str],
+                    quests: List[Dict], max_cached_nodes: int,
+                    duplicate_node_ids: Tuple[str, ...] = (),
+                    variables: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Set up the node index and the decoded-node cache.
+
+        Args:
+            node_ids: Unique node IDs, in node index order
+            starting_dialogue_id: ID of the starting dialogue
+            quests: List of quest dicts
+            max_cached_nodes: Maximum number of decoded nodes kept in memory
+            duplicate_node_ids: IDs that appeared more than once in the file
+            variables: Initial variable values
+        """
+        self.max_cached_nodes = max_cached_nodes
+        self.duplicate_node_ids: Tuple[str, ...] = tuple(duplicate_node_ids)
+
+        self.node_ids: Tuple[str, ...] = tuple(sys.intern(node_id) for node_id in node_ids)
+        self.node_index: Dict[str, int] = {
+            node_id: i for i, node_id in enumerate(self.node_ids)
+        }
+
+        self.starting_dialogue_id: str = sys.intern(starting_dialogue_id or "")
+        self.starting_index: int = self.node_index.get(self.starting_dialogue_id, -1)
+
+        self.quests = {q["id"]: q for q in quests}
+        self.variables: Dict[str, Any] = dict(variables or {})
+        self.script_registry = default_registry
+        self.dialogues: Mapping = _LazyNodes(self)
+        self._quest_index: Optional[QuestIndex] = None
+        self.render_cache = RenderCache()
+        # Per-locale text tables (a dialogue_locale.LocaleCatalog), if any
+        self.locales = None
+
+        # Node index -> decoded node, least recently used first
+        self._decoded: "OrderedDict[int, _DecodedNode]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load_node(self, node_index: int) -> Dict:
+        """Decode a single node. Implemented by subclasses."""
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        """Number of dialogue nodes in the graph."""
+        return len(self.node_ids)
+
+    @property
+    def cached_nodes(self) -> int:
+        """Number of currently decoded nodes."""
+        return len(self._decoded)
+
+    def _decode(self, node_index: int) -> "_DecodedNode":
+        """Decode a node, or get it from the decoded-node cache."""
+        with self._lock:
+            entry = self._decoded.get(node_index)
+            if entry is not None:
+                self._decoded.move_to_end(node_index)
+                return entry
+
+        node = self._load_node(node_index)
+
+        responses: Dict[str, Dict] = {}
+        for response in node.get("responses", []):
+            # The first response with a given ID wins, matching a list scan
+            responses.setdefault(response["id"], response)
+
+        # Conditions and scripts are compiled when the node is decoded
+        conditions = tuple(response_condition(r) for r in node.get("responses", []))
+        compile_script = self.script_registry.compile
+        scripts = {}
+        for response_id, response in responses.items():
+            script = compile_script(response.get("script"))
+            if script is not None:
+                scripts[response_id] = script
+        entry = (node, responses, conditions if any(conditions) else None,
+                 compile_script(node.get("on_entry")), scripts, node_text(node))
+
+        with self._lock:
+            self._decoded[node_index] = entry
+            while len(self._decoded) > self.max_cached_nodes:
+                self._decoded.popitem(last=False)
+
+        return entry
+
+    def node(self, node_index: int) -> Dict:
+        """
+        Get a dialogue node by index, decoding it on first use.
+
+        Args:
+            node_index: Index of the dialogue node
+
+        Returns:
+            The dialogue node
+        """
+        return self._decode(node_index)[0]
+
+    def get_node(self, dialogue_id: str) -> Optional[Dict]:
+        """
+        Get a dialogue node by ID.
+
+        Args:
+            dialogue_id: The ID of the dialogue node
+
+        Returns:
+            The dialogue node, or None if it does not exist
+        """
+        index = self.node_index.get(dialogue_id)
+        if index is None:
+            return None
+
+        return self.node(index)
+
+    def transition(self, node_index: int, response_id: str) -> Optional[int]:
+        """
+        Get the node a response leads to.
+
+        Args:
+            node_index: Index of the dialogue node
+            response_id: The ID of the response
+
+        Returns:
+            Index of the next node (-1 if it does not exist), or None if the
+            node has no such response
+        """
+        if node_index < 0:
+            return None
+
+        response = self._decode(node_index)[1].get(response_id)
+        if response is None:
+            return None
+
+        return self.node_index.get(response.get("next_dialogue") or "", -1)
+
+    def node_conditions(self, node_index: int) -> Optional[Tuple[Optional[Condition], ...]]:
+        """
+        Get the compiled conditions of a node's responses.
+
+        Args:
+            node_index: Index of the dialogue node
+
+        Returns:
+            One condition (or None) per response in list order, or None if
+            no response of the node is conditional
+        """
+        return self._decode(node_index)[2]
+
+    def response_condition(self, node_index: int, response_id: str) -> Optional[Condition]:
+        """
+        Get the compiled condition of a response.
+
+        Args:
+            node_index: Index of the dialogue node
+            response_id: The ID of the response
+
+        Returns:
+            The condition, or None if the response is unconditional or missing
+        """
+        if node_index < 0:
+            return None
+
+        response = self._decode(node_index)[1].get(response_id)
+        return response_condition(response) if response is not None else None
+
+    def response_script(self, node_index: int, response_id: str) -> Optional[CompiledScript]:
+        """
+        Get the compiled script of a response.
+
+        Args:
+            node_index: Index of the dialogue node
+            response_id: The ID of the response
+
+        Returns:
+            The script, or None if the response has none or is missing
+        """
+        if node_index < 0:
+            return None
+
+        return self._decode(node_index)[4].get(response_id)
+
+    def entry_script(self, node_index: int) -> Optional[CompiledScript]:
+        """
+        Get the compiled on_entry script of a node.
+
+        Args:
+            node_index: Index of the dialogue node
+
+        Returns:
+            The script, or None if the node has none
+        """
+        if node_index < 0:
+            return None
+
+        return self._decode(node_index)[3]
+
+    def node_text(self, node_index: int) -> Optional[NodeText]:
+        """
+        Get the text templates of a node and its responses.
+
+        Args:
+            node_index: Index of the dialogue node
+
+        Returns:
+            The templates, or None if all of the node's texts are static
+        """
+        if node_index < 0:
+            return None
+
+        return self._decode(node_index)[5]
+
+    def render_text(self, node_index: int, variables: Dict[str, Any]) -> Optional[RenderedText]:
+        """
+        Render the texts of a node with a session's variables.
+
+        Args:
+            node_index: Index of the dialogue node
+            variables: Variable values of the session
+
+        Returns:
+            The node text and one text per response (None where a text is
+            static), or None if all of the node's texts are static
+        """
+        templates = self.node_text(node_index)
+        if templates is None:
+            return None
+
+        return self.render_cache.render(node_index, templates, variables)
+
+    @property
+    def quest_index(self) -> QuestIndex:
+        """Quest stage tables and triggers, built on first use."""
+        if self._quest_index is None:
+            self._quest_index = QuestIndex(self)
+        return self._quest_index
+
+    def get_response(self, dialogue_id: str, response_id: str) -> Optional[Dict]:
+        """
+        Look up a response by dialogue and response ID.
+
+        Args:
+            dialogue_id: The ID of the dialogue node
+            response_id: The ID of the response
+
+        Returns:
+            The response record, or None if it does not exist
+        """
+        index = self.node_index.get(dialogue_id)
+        if index is None:
+            return None
+
+        return self._decode(index)[1].get(response_id)
+
+
+class LazyDialogueGraph(OnDemandDialogueGraph):
+    """Dialogue graph that decodes nodes from a memory-mapped file on demand."""
+
+    def __init__(self, file_path: str, max_cached_nodes: int = DEFAULT_MAX_CACHED_NODES,
+                 index_path: Optional[str] = None):
+        """
+        Map a dialogue file and index its nodes.
+
+        Args:
+            file_path: Path to the JSON dialogue file
+            max_cached_nodes: Maximum number of decoded nodes kept in memory
+            index_path: Optional sidecar index file. It is used if it matches
+                the dialogue file and (re)written otherwise.
+
+        Raises:
+            OSError: If the file cannot be read
+            ValueError: If the file is not a valid dialogue file
+        """
+        self.file_path = file_path
+
+        self._file = open(file_path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError("Invalid dialogue file structure")
+
+        stat = os.fstat(self._file.fileno())
+        index = self._read_index(index_path, stat) if index_path else None
+        if index is None:
+            index = scan_dialogue_offsets(self._map)
+            if index_path:
+                self._write_index(index_path, stat, index)
+
+        # Later nodes with a duplicate ID replace earlier ones, as with JSON loading
+        ranges: Dict[str, Tuple[int, int]] = {}
+        duplicates: List[str] = []
+        for node_id, start, end in index["nodes"]:
+            if node_id in ranges:
+                duplicates.append(node_id)
+            ranges[node_id] = (start, end)
+        self._ranges: List[Tuple[int, int]] = list(ranges.values())
+
+        quests = []
+        if index["quests"]:
+            start, end = index["quests"]
+            quests = json.loads(self._map[start:end])
+
+        variables = {}
+        if index.get("variables"):
+            start, end = index["variables"]
+            variables = json.loads(self._map[start:end])
+
+        self._init_nodes(list(ranges), index["starting_dialogue"], quests, max_cached_nodes,
+                         tuple(duplicates), variables)
+
+    def _read_index(self, index_path: str, stat: os.stat_result) -> Optional[Dict]:
+        """Load a sidecar index if it belongs to the current file."""
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if (saved.get("version") != INDEX_VERSION or saved.get("size") != stat.st_size
+                or saved.get("mtime_ns") != stat.st_mtime_ns):
+            return None
+
+        return saved["index"]
+
+    def _write_index(self, index_path: str, stat: os.stat_result, index: Dict) -> None:
+        """Save the node offsets next to the dialogue file."""
+        try:
+            with open(index_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    "version": INDEX_VERSION,
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "index": index
+                }, f)
+        except OSError as e:
+            print(f"Warning: could not write dialogue index '{index_path}': {e}")
+
+    def close(self) -> None:
+        """Release the memory map and the file."""
+        self._decoded.clear()
+        self._map.close()
+        self._file.close()
+
+    def _load_node(self, node_index: int) -> Dict:
+        """Decode a node from its byte range in the file."""
+        start, end = self._ranges[node_index]
+        return json.loads(self._map[start:end])
@@ -4,168 +4,697 @@ Dialogue Tree Library - Core functionality for dialogue tree management.
 This module provides the foundation for loading, parsing, and traversing
 dialogue trees stored in JSON format.
 """
+import copy
 import json
-from typing import Dict, List, Any, Optional, Tuple
+from collections import deque
+from typing import Dict, List, Any, Optional, Tuple, Mapping
+
+from dialogue_graph import DialogueGraph
+from dialogue_cache import load_graph_file, load_graph_from_string, load_graph_binary
+from dialogue_lazy import LazyDialogueGraph
+from dialogue_binary import BinaryDialogueGraph
+from dialogue_validation import (ValidationIssue, validate_graph, validate_locale, ERROR,
+                                 INVALID_LOCALE_TABLE, MISSING_START)
+from dialogue_conditions import DialogueState
+from dialogue_locale import attach_locales, display_node
+from dialogue_records import NodeRecord, ResponseRecord
+from dialogue_scripts import ScriptBatch
+from dialogue_snapshot import read_snapshot, snapshot_session
 
 
 class DialogueManager:
     """Manages dialogue trees and state."""
     
-    def __init__(self):
-        """Initialize the dialogue manager."""
-        # Dictionary to store all dialogues, keyed by ID
-        self.dialogues: Dict = {}
+    # Sessions only hold a cursor into a shared DialogueGraph, so keep them small
+    __slots__ = ("graph", "_cursor", "state", "_view", "history", "locale")
+    
+    def __init__(self, graph: Optional[DialogueGraph] = None, history_size: int = 0):
+        """
+        Initialize the dialogue manager.
+        
+        Args:
+            graph: Optional compiled dialogue graph to start a session on
+            history_size: Number of visited dialogues to remember, 0 to keep
+                no history
+        """
+        # Compiled dialogue tree, possibly shared with other managers
+        self.graph: Optional[DialogueGraph] = None
+        
+        # Index of the current active dialogue node in the graph, -1 if none
+        self._cursor: int = -1
         
-        # Dictionary to store all quests, keyed by ID
-        self.quests: Dict = {}
+        # Variables and quest progress, with cached condition results
+        self.state: DialogueState = DialogueState()
         
-        # ID of the current active dialogue
-        self.current_dialogue_id: str = ""
+        # Last filtered view of a node: (node index, state version, dialogue)
+        self._view: Optional[Tuple[int, int, Dict]] = None
+        
+        # Node indexes of the most recently visited dialogues, oldest first
+        self.history: Optional[deque] = deque(maxlen=history_size) if history_size > 0 else None
+        
+        # Locale texts are shown in, None for the texts of the dialogue file
+        self.locale: Optional[str] = None
+        
+        if graph is not None:
+            self.use_graph(graph)
+    
+    @property
+    def dialogues(self) -> Mapping[str, Dict]:
+        """
+        All dialogues, keyed by ID. Read-only; on graphs loaded from files
+        the nodes are compact records (see dialogue_records.plain_node).
+        """
+        return self.graph.dialogues if self.graph is not None else {}
+    
+    @property
+    def quests(self) -> Mapping[str, Dict]:
+        """All quests, keyed by ID."""
+        return self.graph.quests if self.graph is not None else {}
+    
+    @property
+    def active_quests(self) -> Dict[str, Dict]:
+        """Progress of started quests, keyed by quest ID."""
+        return self.state.quests
+    
+    @property
+    def variables(self) -> Dict[str, Any]:
+        """Current variable values."""
+        return self.state.variables
+    
+    @property
+    def starting_dialogue_id(self) -> str:
+        """ID of the starting dialogue."""
+        return self.graph.starting_dialogue_id if self.graph is not None else ""
+    
+    @property
+    def current_dialogue_id(self) -> str:
+        """ID of the current active dialogue, empty if there is none."""
+        if self._cursor < 0:
+            return ""
+        return self.graph.node_ids[self._cursor]
+    
+    @current_dialogue_id.setter
+    def current_dialogue_id(self, dialogue_id: str) -> None:
+        if self.graph is None:
+            self._cursor = -1
+        else:
+            self._cursor = self.graph.node_index.get(dialogue_id, -1)
+    
+    def use_graph(self, graph: DialogueGraph) -> None:
+        """
+        Start a new session on an already compiled dialogue graph.
         
-        # ID of the starting dialogue
-        self.starting_dialogue_id: str = ""
+        The graph is shared, not copied, so any number of managers can
+        use the same one. A LazyDialogueGraph can be used the same way.
         
-        # Track active quests and their state
-        self.active_quests: Dict = {}
+        Args:
+            graph: The compiled dialogue graph
+        """
+        self.graph = graph
+        self._cursor = graph.starting_index
+        self.state = DialogueState(getattr(graph, "variables", None))
+        self._view = None
+        self._restart_history()
+        self._run_script(graph.entry_script(self._cursor))
     
-    def load_dialogue_file(self, file_path: str) -> bool:
+    def load_dialogue_file(self, file_path: str, use_cache: bool = True, lazy: bool = False) -> bool:
         """
         Load a dialogue JSON file and validate its structure.
         
+        Text tables named <name>.<locale>.json next to the file are found
+        too, and used once a locale is chosen with set_locale().
+        
         Args:
             file_path: Path to the JSON dialogue file
+            use_cache: Share the compiled graph through the process-wide
+                cache instead of parsing the file again
+            lazy: Memory-map the file and only decode dialogue nodes when
+                they are first reached, for very large files
             
         Returns:
             bool: True if loading succeeded, False otherwise
         """
         try:
+            if use_cache:
+                self.use_graph(load_graph_file(file_path, lazy=lazy))
+                return True
+            
+            if lazy:
+                self.use_graph(attach_locales(LazyDialogueGraph(file_path), file_path))
+                return True
+            
             with open(file_path, 'r', encoding='utf-8') as f:
                 data = json.load(f)
             
-            # Validate required fields
-            if "starting_dialogue" not in data or "dialogues" not in data:
-                print("Error: Invalid dialogue file structure")
+            if not self._load_data(data):
                 return False
-                
-            # Store dialogue data
-            self.dialogues = {d["id"]: d for d in data["dialogues"]}
-            self.starting_dialogue_id = data["starting_dialogue"]
-            self.current_dialogue_id = self.starting_dialogue_id
-            
-            # Store quest data if present
-            if "quests" in data:
-                self.quests = {q["id"]: q for q in data["quests"]}
-            else:
-                self.quests = {}
-                
-            self.active_quests = {}
-            
+            attach_locales(self.graph, file_path)
             return True
             
         except Exception as e:
             print(f"Error loading dialogue file: {e}")
             return False
 
-    def load_dialogue_from_string(self, json_string: str) -> bool:
+    def load_dialogue_from_string(self, json_string: str, use_cache: bool = True) -> bool:
         """
         Load dialogue data directly from a JSON string.
         Useful for web interfaces with file upload.
         
         Args:
             json_string: JSON string containing dialogue data
+            use_cache: Share the compiled graph through the process-wide
+                cache instead of parsing the string again
             
         Returns:
             bool: True if loading succeeded, False otherwise
         """
         try:
+            if use_cache:
+                self.use_graph(load_graph_from_string(json_string))
+                return True
+            
             data = json.loads(json_string)
             
-            # Validate required fields
-            if "starting_dialogue" not in data or "dialogues" not in data:
-                print("Error: Invalid dialogue file structure")
-                return False
-                
-            # Store dialogue data
-            self.dialogues = {d["id"]: d for d in data["dialogues"]}
-            self.starting_dialogue_id = data["starting_dialogue"]
-            self.current_dialogue_id = self.starting_dialogue_id
-            
-            # Store quest data if present
-            if "quests" in data:
-                self.quests = {q["id"]: q for q in data["quests"]}
-            else:
-                self.quests = {}
-                
-            self.active_quests = {}
+            return self._load_data(data)
+            
+        except Exception as e:
+            print(f"Error parsing dialogue JSON: {e}")
+            return False
+    
+    def load_dialogue_data(self, data: Dict, copy_data: bool = True) -> bool:
+        """
+        Load dialogue data that has already been parsed, without any disk I/O.
+        
+        Args:
+            data: Parsed dialogue document
+            copy_data: Take a deep copy of the document. Pass False to use
+                the caller's node and response dicts directly; they must not
+                be modified after loading, because transitions, conditions,
+                scripts and templates are compiled from them at load time.
+                Load the data again to pick up edits.
+            
+        Returns:
+            bool: True if loading succeeded, False otherwise
+        """
+        try:
+            if copy_data:
+                data = copy.deepcopy(data)
+            
+            return self._load_data(data, compact=copy_data)
+            
+        except Exception as e:
+            print(f"Error loading dialogue data: {e}")
+            return False
+    
+    def load_dialogue_binary(self, file_path: str, use_cache: bool = True) -> bool:
+        """
+        Load a dialogue file compiled with dialogue_compiler.py.
+        
+        The file is memory-mapped and nodes are decoded when first reached.
+        
+        Args:
+            file_path: Path to the compiled dialogue file
+            use_cache: Share the graph through the process-wide cache
             
+        Returns:
+            bool: True if loading succeeded, False otherwise
+        """
+        try:
+            if use_cache:
+                self.use_graph(load_graph_binary(file_path))
+            else:
+                self.use_graph(attach_locales(BinaryDialogueGraph(file_path), file_path))
             return True
             
         except Exception as e:
-            print(f"Error parsing dialogue JSON: {e}")
+            print(f"Error loading compiled dialogue file: {e}")
+            return False
+    
+    def _load_data(self, data: Dict, compact: bool = True) -> bool:
+        """
+        Compile parsed dialogue data and start a session on it.
+        
+        Args:
+            data: Parsed dialogue document
+            compact: Store the nodes as compact records; only pass False
+                when the caller keeps using the node dicts
+            
+        Returns:
+            bool: True if the data has a valid structure, False otherwise
+        """
+        try:
+            graph = DialogueGraph.from_data(data, compact=compact)
+        except ValueError as e:
+            print(f"Error: {e}")
             return False
+        
+        self.use_graph(graph)
+        return True
+    
+    def get_variable(self, name: str, default: Any = None) -> Any:
+        """
+        Get the value of a dialogue variable.
+        
+        Args:
+            name: Variable name
+            default: Value returned if the variable is not set
+            
+        Returns:
+            The variable value
+        """
+        return self.state.get_variable(name, default)
+    
+    def set_variable(self, name: str, value: Any) -> None:
+        """
+        Set a dialogue variable, re-gating the responses that depend on it.
+        
+        Args:
+            name: Variable name
+            value: New value
+        """
+        self.state.set_variable(name, value)
     
     def get_current_dialogue(self) -> Optional[Dict]:
         """
-        Get the current dialogue node with its text and responses.
+        Get the current dialogue node with its text and available responses.
+        
+        Responses whose condition does not hold are left out, and text
+        templates are filled in with the session's variables. Nodes without
+        conditional responses or templates are shared with other sessions,
+        so treat them as read-only; for the others a copy is returned; it is
+        reused until the state changes, and only conditions whose variables
+        or quests changed are re-evaluated. Either way it is a plain dict
+        with its responses in a list, even on a compact graph.
         
         Returns:
             Dict containing dialogue information or None if invalid
         """
-        if not self.current_dialogue_id or self.current_dialogue_id not in self.dialogues:
+        if self._cursor < 0:
+            return None
+        
+        node = self.graph.node(self._cursor)
+        conditions = self.graph.node_conditions(self._cursor)
+        localized = self.locale is not None and getattr(self.graph, "locales", None) is not None
+        if conditions is None and not localized and self.graph.node_text(self._cursor) is None:
+            return node if type(node) is not NodeRecord else self.graph.plain_node(self._cursor)
+        
+        view = self._view
+        if view is not None and view[0] == self._cursor and view[1] == self.state.version:
+            return view[2]
+        
+        dialogue = dict(self._display_node(self._cursor))
+        if conditions is not None:
+            dialogue["responses"] = self._filter_responses(dialogue, conditions)
+        
+        self._view = (self._cursor, self.state.version, dialogue)
+        return dialogue
+    
+    def get_available_responses(self, dialogue_id: Optional[str] = None) -> List[Dict]:
+        """
+        Get the responses of a dialogue whose conditions currently hold.
+        
+        Args:
+            dialogue_id: Dialogue to check, defaults to the current dialogue
+            
+        Returns:
+            List of available responses, with their texts localized and
+            templates filled in
+        """
+        if self.graph is None:
+            return []
+        
+        if dialogue_id is None:
+            node_index = self._cursor
+        else:
+            node_index = self.graph.node_index.get(dialogue_id, -1)
+        if node_index < 0:
+            return []
+        
+        node = self._display_node(node_index)
+        conditions = self.graph.node_conditions(node_index)
+        if conditions is None:
+            return list(node.get("responses", []))
+        
+        return self._filter_responses(node, conditions)
+    
+    def _display_node(self, node_index: int) -> Dict:
+        """A node as a plain dict, with its texts localized and templates filled in."""
+        node, templates, key = display_node(self.graph, node_index, self.locale)
+        if type(node) is NodeRecord:
+            node = self.graph.plain_node(node_index)
+        if templates is None:
+            return node
+        
+        text, response_texts = self.graph.render_cache.render(key, templates, self.state.variables)
+        dialogue = dict(node)
+        if text is not None:
+            dialogue["text"] = text
+        if any(rendered is not None for rendered in response_texts):
+            dialogue["responses"] = [
+                response if rendered is None else {**response, "text": rendered}
+                for response, rendered in zip(node.get("responses", []), response_texts)
+            ]
+        return dialogue
+    
+    def set_locale(self, locale: Optional[str]) -> bool:
+        """
+        Choose the locale dialogue texts are shown in.
+        
+        Strings missing from the locale's table fall back to the default
+        locale, then to the dialogue file. Both tables are loaded now, so a
+        broken table is reported here; one that breaks later is reported
+        when it is read again and its strings fall back. The locale is a
+        display setting and is not part of snapshots.
+        
+        Args:
+            locale: Locale code, e.g. "fr", or None for the texts of the
+                dialogue file
+            
+        Returns:
+            bool: True if the locale can be shown, False otherwise
+        """
+        if locale is not None:
+            catalog = getattr(self.graph, "locales", None)
+            if catalog is None or not catalog.has_locale(locale):
+                print(f"Error: No text table for locale '{locale}'")
+                return False
+            
+            for needed in (locale, catalog.default_locale):
+                try:
+                    catalog.table(needed)
+                except (OSError, ValueError) as e:
+                    print(f"Error loading text table for locale '{needed}': {e}")
+                    return False
+        
+        self.locale = locale
+        self._view = None
+        return True
+    
+    def _filter_responses(self, node: Dict, conditions: Tuple) -> List[Dict]:
+        """Responses of a node whose compiled conditions hold."""
+        check = self.state.check
+        return [
+            response for response, condition in zip(node.get("responses", []), conditions)
+            if check(condition)
+        ]
+    
+    def get_response(self, response_id: str, dialogue_id: Optional[str] = None) -> Optional[Dict]:
+        """
+        Look up a response by ID in constant time.
+        
+        Args:
+            response_id: The ID of the response
+            dialogue_id: Dialogue the response belongs to, defaults to the
+                current dialogue
+            
+        Returns:
+            The response dict, or None if it does not exist
+        """
+        if self.graph is None:
+            return None
+        
+        if dialogue_id is None:
+            dialogue_id = self.current_dialogue_id
+        
+        response = self.graph.get_response(dialogue_id, response_id)
+        return dict(response) if type(response) is ResponseRecord else response
+    
+    def get_next_dialogue_id(self, response_id: str, dialogue_id: Optional[str] = None) -> Optional[str]:
+        """
+        Get the dialogue a response leads to.
+        
+        Args:
+            response_id: The ID of the response
+            dialogue_id: Dialogue the response belongs to, defaults to the
+                current dialogue
+            
+        Returns:
+            ID of the next dialogue, or None if the response does not exist
+        """
+        response = self.get_response(response_id, dialogue_id)
+        if response is None:
             return None
         
-        return self.dialogues[self.current_dialogue_id]
+        return response.get("next_dialogue")
     
-    def choose_response(self, response_id: str) -> bool:
+    def choose_response(self, response_id: str, batch: Optional[ScriptBatch] = None) -> bool:
         """
         Process a user's response choice and update the current dialogue.
         
+        The response's script runs first, then the on_entry script of the
+        dialogue it leads to.
+        
         Args:
             response_id: The ID of the selected response
+            batch: Queue the script effects here instead of running them
+                now; the caller applies the batch later
             
         Returns:
-            bool: Whether the response was valid
+            bool: Whether the response was valid and available
         """
-        dialogue = self.get_current_dialogue()
-        if not dialogue:
+        if self.graph is None:
             return False
         
-        # Find the response with the given ID
-        for response in dialogue["responses"]:
-            if response["id"] == response_id:
-                # Update current dialogue
-                self.current_dialogue_id = response["next_dialogue"]
-                return True
+        next_index = self.graph.transition(self._cursor, response_id)
+        if next_index is None:
+            return False
+        
+        if not self.state.check(self.graph.response_condition(self._cursor, response_id)):
+            return False
         
-        return False
+        script = self.graph.response_script(self._cursor, response_id)
+        
+        # Update current dialogue
+        self._cursor = next_index
+        if self.history is not None and next_index >= 0:
+            self.history.append(next_index)
+        
+        self._run_script(script, batch)
+        self._run_script(self.graph.entry_script(next_index), batch)
+        return True
     
     def reset_dialogue(self) -> None:
         """Reset to the starting dialogue."""
-        self.current_dialogue_id = self.starting_dialogue_id
+        self._cursor = self.graph.starting_index if self.graph is not None else -1
+        self._restart_history()
+        if self.graph is not None:
+            self._run_script(self.graph.entry_script(self._cursor))
+    
+    def _restart_history(self) -> None:
+        """Clear the history down to the current dialogue."""
+        if self.history is None:
+            return
+        
+        self.history.clear()
+        if self._cursor >= 0:
+            self.history.append(self._cursor)
+    
+    def get_history(self) -> List[str]:
+        """
+        Get the most recently visited dialogues.
+        
+        Returns:
+            Dialogue IDs, oldest first and ending with the current one;
+            empty if the session keeps no history
+        """
+        if self.history is None or self.graph is None:
+            return []
+        
+        node_ids = self.graph.node_ids
+        return [node_ids[index] for index in self.history]
+    
+    def snapshot(self) -> Optional[bytes]:
+        """
+        Save the session to a compact binary snapshot.
+        
+        The snapshot holds the current dialogue, variables, quest progress
+        and history, and can only be restored on the same dialogue graph.
+        
+        Returns:
+            The snapshot bytes, or None if no dialogue is loaded or a
+            variable holds a value that cannot be saved
+        """
+        if self.graph is None:
+            return None
+        
+        try:
+            return snapshot_session(self)
+        except ValueError as e:
+            print(f"Error saving session: {e}")
+            return None
+    
+    def restore(self, snapshot: bytes) -> bool:
+        """
+        Restore a session saved with snapshot().
+        
+        The dialogue graph must already be loaded. No scripts are run.
+        
+        Args:
+            snapshot: The snapshot bytes
+            
+        Returns:
+            bool: True if the snapshot was restored, False otherwise
+        """
+        if self.graph is None:
+            print("Error restoring session: no dialogue loaded")
+            return False
+        
+        try:
+            cursor, state, history = read_snapshot(self.graph, snapshot)
+        except ValueError as e:
+            print(f"Error restoring session: {e}")
+            return False
+        
+        self._cursor = cursor
+        self.state = state
+        self._view = None
+        if history is not None:
+            capacity, indexes = history
+            self.history = deque(indexes, maxlen=capacity or None)
+        elif self.history is not None:
+            self.history.clear()
+        return True
+    
+    def _run_script(self, script, batch: Optional[ScriptBatch] = None) -> None:
+        """Run a compiled script now, or queue it on a batch."""
+        if script is None:
+            return
+        
+        if batch is not None:
+            batch.defer(self, script)
+        else:
+            script.run(self)
+    
+    def get_quest_progress(self, quest_id: str) -> Optional[Dict]:
+        """
+        Get the progress of a started quest.
+        
+        Args:
+            quest_id: ID of the quest
+        
+        Returns:
+            Dict with id, title, current_stage, stage (the stage definition,
+            None if the quest has no such stage) and completed, or None if
+            the quest has not been started
+        """
+        progress = self.state.quests.get(quest_id)
+        if progress is None:
+            return None
+        
+        quest = self.quests.get(quest_id, {})
+        stage = progress.get("current_stage", 0)
+        return {
+            "id": quest_id,
+            "title": quest.get("title", quest_id),
+            "current_stage": stage,
+            "stage": self.graph.quest_index.stage(quest_id, stage) if self.graph is not None else None,
+            "completed": progress.get("completed", False),
+        }
+    
+    def get_active_quests(self, include_completed: bool = False) -> List[Dict]:
+        """
+        Get the progress of the quests this session has started.
+        
+        Only started quests are visited, however many the dialogue defines.
+        
+        Args:
+            include_completed: Also list completed quests
+        
+        Returns:
+            List of progress dicts as returned by get_quest_progress()
+        """
+        quests = []
+        for quest_id, progress in self.state.quests.items():
+            if include_completed or not progress.get("completed", False):
+                quests.append(self.get_quest_progress(quest_id))
+        return quests
+    
+    def get_affected_quests(self, response_id: str, dialogue_id: Optional[str] = None) -> Tuple[str, ...]:
+        """
+        Get the quests that choosing a response can change.
+        
+        The answer is precomputed when the dialogue's scripts are compiled,
+        from the response script and the on_entry script of its target.
+        
+        Args:
+            response_id: The ID of the response
+            dialogue_id: Dialogue the response belongs to, defaults to the
+                current dialogue
+        
+        Returns:
+            IDs of the affected quests, empty if there are none
+        """
+        if self.graph is None:
+            return ()
+        
+        if dialogue_id is None:
+            node_index = self._cursor
+        else:
+            node_index = self.graph.node_index.get(dialogue_id, -1)
+        if node_index < 0:
+            return ()
+        
+        return self.graph.quest_index.affected_by(node_index, response_id)
+    
+    def get_validation_issues(self) -> List[ValidationIssue]:
+        """
+        Run the full-graph validation and return structured results.
+        
+        Checks dangling references, duplicate node and response IDs,
+        unreachable nodes, cycles with no way out and nodes that can never
+        lead to an ending, in time linear in the size of the tree.
+        
+        Returns:
+            List of ValidationIssue, errors first, empty if no issues
+        """
+        if self.graph is None:
+            return [ValidationIssue(ERROR, MISSING_START, "Starting dialogue '' not found")]
+        
+        return validate_graph(self.graph)
 
-    def validate_dialogue_tree(self) -> List[str]:
+    def get_locale_issues(self, locale: Optional[str] = None) -> List[ValidationIssue]:
         """
-        Validate the entire dialogue tree for errors.
+        Check text tables for missing and unused translations.
         
+        Args:
+            locale: Locale to check, defaults to every locale with a table
+            
         Returns:
-            List of error messages, empty if no errors
+            List of issues, empty if every table is complete; a table that
+            cannot be loaded is reported as an error
         """
-        errors = []
+        catalog = getattr(self.graph, "locales", None)
+        if catalog is None:
+            return []
         
-        # Check if starting dialogue exists
-        if self.starting_dialogue_id not in self.dialogues:
-            errors.append(f"Starting dialogue '{self.starting_dialogue_id}' not found")
+        issues = []
+        for code in [locale] if locale is not None else catalog.locales:
+            try:
+                table = catalog.table(code)
+            except (OSError, ValueError) as e:
+                issues.append(ValidationIssue(
+                    ERROR, INVALID_LOCALE_TABLE, f"Text table for locale '{code}' cannot be loaded: {e}"
+                ))
+                continue
+            if table is not None:
+                issues.extend(validate_locale(self.graph, table))
+        return issues
+    
+    def validate_dialogue_tree(self, include_warnings: bool = False) -> List[str]:
+        """
+        Validate the entire dialogue tree for errors.
         
-        # Check all referenced dialogues exist
-        for dialogue_id, dialogue in self.dialogues.items():
-            for response in dialogue.get("responses", []):
-                next_dialogue = response.get("next_dialogue")
-                if next_dialogue and next_dialogue not in self.dialogues:
-                    errors.append(
-                        f"Dialogue '{dialogue_id}' references non-existent dialogue '{next_dialogue}'"
-                    )
+        Args:
+            include_warnings: Also report unreachable nodes, dead-end
+                cycles and nodes that never lead to an ending
         
-        return errors
+        Returns:
+            List of error messages, empty if no errors
+        """
+        return [
+            issue.message for issue in self.get_validation_issues()
+            if include_warnings or issue.severity == ERROR
+        ]
 
 
 # Simple usage example
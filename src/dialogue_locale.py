@@ -0,0 +1,457 @@
+"""
+Dialogue Locale - Per-locale text tables for localized dialogue trees.
+
+A localized tree ships as one structure file (dialogue IDs, next_dialogue
+edges, conditions and scripts, with the texts of the default locale) and
+one text table per locale next to it:
+
+    dialogue.json        the structure
+    dialogue.fr.json     {"locale": "fr", "dialogues": {...}}
+    dialogue.de.json
+
+A text table maps dialogue IDs to the translated npc_name, text and
+response texts:
+
+    {
+      "locale": "fr",
+      "dialogues": {
+        "tutorial_welcome": {
+          "npc_name": "Système",
+          "text": "Bienvenue, {player_name} !",
+          "responses": {"ask_about_system": "Qu'est-ce que c'est ?"}
+        }
+      }
+    }
+
+The structure is compiled once. The graph's LocaleCatalog is shared by all
+of its sessions; it loads a table the first time a session shows its
+locale and keeps a bounded number of tables in an LRU, so rarely used
+locales are dropped again. A string missing from a table falls back to the
+table of the default locale, then to the text in the structure file.
+Translated texts may use templates (see dialogue_templates.py).
+
+validate_locale() in dialogue_validation reports missing and unused keys,
+and extract_table() turns a full translated copy of a tree into a table.
+
+Usage:
+    python dialogue_locale.py check <dialogue.json> [--locale fr]
+    python dialogue_locale.py extract <translated_copy.json> <locale> <output.json>
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+from dialogue_records import plain_node
+from dialogue_templates import NodeText, node_text
+
+# Locale whose table is tried when a string is missing
+DEFAULT_LOCALE = "en"
+
+# Default number of text tables a catalog keeps loaded
+DEFAULT_MAX_LOADED_LOCALES = 4
+
+# Locale codes in table file names, e.g. fr, pt-BR, zh_Hant
+_LOCALE = r"[A-Za-z]{2,3}(?:[-_][A-Za-z0-9]{2,8})*"
+
+# Memo value of a node no loaded table has strings for
+_UNTRANSLATED: Tuple = ()
+
+
+class LocaleTable:
+    """Translated strings of one locale."""
+
+    def __init__(self, locale: str, dialogues: Dict[str, Dict]):
+        """
+        Create a table.
+
+        Args:
+            locale: Locale code, e.g. "fr"
+            dialogues: Dialogue ID -> {"npc_name": ..., "text": ...,
+                "responses": {response ID: text}}
+        """
+        self.locale = locale
+        self.dialogues = dialogues
+
+        # Dialogue ID -> localized node and its templates, built on first use
+        self._localized: Dict[str, Tuple] = {}
+
+    def __len__(self) -> int:
+        """Number of dialogues with translated strings."""
+        return len(self.dialogues)
+
+    @classmethod
+    def from_data(cls, data: Dict, locale: Optional[str] = None) -> "LocaleTable":
+        """
+        Create a table from a parsed table file.
+
+        Args:
+            data: Parsed table JSON with "dialogues"
+            locale: Locale code, if the data does not name one
+
+        Returns:
+            The table
+
+        Raises:
+            ValueError: If the data is not a text table
+        """
+        if not isinstance(data, dict) or not isinstance(data.get("dialogues"), dict):
+            raise ValueError("Invalid locale table structure")
+
+        locale = data.get("locale") or locale
+        if not locale:
+            raise ValueError("Locale table does not name its locale")
+
+        return cls(locale, data["dialogues"])
+
+    @classmethod
+    def from_file(cls, file_path: str, locale: Optional[str] = None) -> "LocaleTable":
+        """
+        Load a table file.
+
+        Args:
+            file_path: Path to the table JSON
+            locale: Locale code, if the file does not name one
+
+        Returns:
+            The table
+
+        Raises:
+            OSError: If the file cannot be read
+            ValueError: If the file is not a text table
+        """
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return cls.from_data(json.load(f), locale)
+
+
+class LocaleCatalog:
+    """The text tables of a dialogue graph, loaded on first use."""
+
+    def __init__(self, paths: Dict[str, str], default_locale: Optional[str] = DEFAULT_LOCALE,
+                 max_loaded: int = DEFAULT_MAX_LOADED_LOCALES):
+        """
+        Create a catalog. No table is loaded yet.
+
+        Args:
+            paths: Locale code -> path of its table file
+            default_locale: Locale whose table fills in strings missing from
+                other tables; the structure's own texts come last
+            max_loaded: Maximum number of tables kept in memory
+        """
+        self.paths = dict(paths)
+        self.default_locale = default_locale
+        self.max_loaded = max_loaded
+        # Number of table files read, including reloads after eviction
+        self.loads = 0
+
+        # Locale -> loaded table, least recently used first
+        self._tables: "OrderedDict[str, LocaleTable]" = OrderedDict()
+        # Locales whose table failed to load; skipped when showing texts
+        # until the table loads or is evicted
+        self._failed: Set[str] = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def discover(cls, file_path: str, default_locale: Optional[str] = DEFAULT_LOCALE,
+                 max_loaded: int = DEFAULT_MAX_LOADED_LOCALES) -> Optional["LocaleCatalog"]:
+        """
+        Find the tables next to a structure file, named <name>.<locale>.json.
+
+        Args:
+            file_path: Path to the structure file, e.g. dialogue.json or
+                dialogue.dlgb
+            default_locale: See __init__
+            max_loaded: See __init__
+
+        Returns:
+            The catalog, or None if there are no tables
+        """
+        directory, name = os.path.split(os.path.abspath(file_path))
+        pattern = re.compile(re.escape(os.path.splitext(name)[0]) + rf"\.({_LOCALE})\.json$")
+
+        paths = {}
+        for entry in os.listdir(directory):
+            match = pattern.match(entry)
+            if match:
+                paths[match.group(1)] = os.path.join(directory, entry)
+
+        return cls(paths, default_locale, max_loaded) if paths else None
+
+    @property
+    def locales(self) -> Tuple[str, ...]:
+        """Locales that have a table."""
+        return tuple(sorted(self.paths))
+
+    @property
+    def loaded_locales(self) -> Tuple[str, ...]:
+        """Locales whose tables are in memory, least recently used first."""
+        with self._lock:
+            return tuple(self._tables)
+
+    def has_locale(self, locale: str) -> bool:
+        """Whether texts can be shown in a locale, from a table or the structure."""
+        return locale in self.paths or locale == self.default_locale
+
+    def table(self, locale: Optional[str]) -> Optional[LocaleTable]:
+        """
+        Get the table of a locale, loading it on first use.
+
+        Args:
+            locale: Locale code
+
+        Returns:
+            The table, or None if the locale has no table
+
+        Raises:
+            OSError: If the table file cannot be read
+            ValueError: If the file is not a text table
+        """
+        with self._lock:
+            table = self._tables.get(locale)
+            if table is not None:
+                self._tables.move_to_end(locale)
+                return table
+
+        path = self.paths.get(locale)
+        if path is None:
+            return None
+
+        try:
+            table = LocaleTable.from_file(path, locale)
+        except (OSError, ValueError):
+            with self._lock:
+                self._failed.add(locale)
+            raise
+
+        with self._lock:
+            self._failed.discard(locale)
+            # Another thread may have loaded it meanwhile; keep the first one
+            table = self._tables.setdefault(locale, table)
+            self._tables.move_to_end(locale)
+            self.loads += 1
+            while len(self._tables) > self.max_loaded:
+                self._tables.popitem(last=False)
+
+        return table
+
+    def evict(self, locale: Optional[str] = None) -> None:
+        """
+        Drop a loaded table; it is read again when next used. A table that
+        failed to load is tried again too.
+
+        Args:
+            locale: Locale to drop, or None to drop every table
+        """
+        with self._lock:
+            if locale is None:
+                self._tables.clear()
+                self._failed.clear()
+            else:
+                self._tables.pop(locale, None)
+                self._failed.discard(locale)
+
+    def localize(self, locale: str, dialogue_id: str,
+                 node: Dict) -> Optional[Tuple[Dict, Optional[NodeText]]]:
+        """
+        Get a node with its strings in a locale.
+
+        Localized nodes are built once per loaded table and shared by every
+        session, so treat them as read-only. A table that fails to load is
+        reported once and skipped, so its strings fall back as if they were
+        missing.
+
+        Args:
+            locale: Locale code
+            dialogue_id: ID of the node
+            node: The node from the structure
+
+        Returns:
+            The localized node and its text templates, or None if no table
+            has strings for the node
+        """
+        tables = [self._display_table(locale)]
+        if self.default_locale != locale:
+            tables.append(self._display_table(self.default_locale))
+        tables = [table for table in tables if table is not None]
+        if not tables:
+            return None
+
+        # Without its fallback the node would be memoized incomplete
+        fallback_failed = self.default_locale != locale and self.default_locale in self._failed
+        memo = tables[0]._localized if not fallback_failed else {}
+        localized = memo.get(dialogue_id)
+        if localized is None:
+            entries = [table.dialogues.get(dialogue_id) for table in tables]
+            entries = [entry for entry in entries if isinstance(entry, dict)]
+            if entries:
+                localized_node = _localize_node(node, entries)
+                localized = (localized_node, node_text(localized_node))
+            else:
+                localized = _UNTRANSLATED
+            memo[dialogue_id] = localized
+
+        return localized if localized is not _UNTRANSLATED else None
+
+    def _display_table(self, locale: Optional[str]) -> Optional[LocaleTable]:
+        """The table of a locale, or None if it has none or it fails to load."""
+        if locale in self._failed:
+            return None
+
+        try:
+            return self.table(locale)
+        except (OSError, ValueError) as e:
+            print(f"Error loading text table for locale '{locale}': {e}")
+            return None
+
+
+def attach_locales(graph, file_path: str):
+    """
+    Give a graph the text tables found next to its structure file.
+
+    Args:
+        graph: The graph compiled from the file
+        file_path: Path to the structure file
+
+    Returns:
+        The graph
+    """
+    graph.locales = LocaleCatalog.discover(file_path)
+    return graph
+
+
+def display_node(graph, node_index: int,
+                 locale: Optional[str]) -> Tuple[Dict, Optional[NodeText], Hashable]:
+    """
+    Get a node as shown in a locale.
+
+    Args:
+        graph: A DialogueGraph, LazyDialogueGraph or BinaryDialogueGraph
+        node_index: Index of the dialogue node
+        locale: Locale code, or None for the structure's own texts
+
+    Returns:
+        The node, its text templates (None if its texts are static) and the
+        key its rendered texts are cached under
+    """
+    node = graph.node(node_index)
+    catalog = getattr(graph, "locales", None)
+    if locale is not None and catalog is not None:
+        localized = catalog.localize(locale, graph.node_ids[node_index], node)
+        if localized is not None:
+            return localized[0], localized[1], (locale, node_index)
+
+    return node, graph.node_text(node_index), node_index
+
+
+def extract_table(data: Dict, locale: str) -> Dict:
+    """
+    Make a text table from a full dialogue document.
+
+    Use it on a translated copy of a tree to move to one structure file with
+    text tables, or on the structure itself to start a new translation.
+
+    Args:
+        data: Parsed dialogue document
+        locale: Locale code of the document's texts
+
+    Returns:
+        The table as JSON-ready data
+    """
+    dialogues = {}
+    for node in data.get("dialogues", []):
+        entry: Dict[str, Any] = {}
+        for field in ("npc_name", "text"):
+            if node.get(field):
+                entry[field] = node[field]
+        responses = {response["id"]: response["text"]
+                     for response in node.get("responses") or [] if response.get("text")}
+        if responses:
+            entry["responses"] = responses
+        if entry:
+            dialogues[node["id"]] = entry
+
+    return {"locale": locale, "dialogues": dialogues}
+
+
+def _localize_node(node: Dict, entries: List[Dict]) -> Dict:
+    """Plain dict copy of a node with its strings taken from the first entry that has them."""
+    localized = plain_node(node)
+    for field in ("npc_name", "text"):
+        for entry in entries:
+            if field in entry:
+                localized[field] = entry[field]
+                break
+
+    response_tables = [entry.get("responses") or {} for entry in entries]
+    responses = []
+    for response in localized.get("responses") or []:
+        for texts in response_tables:
+            text = texts.get(response.get("id"))
+            if text is not None:
+                response = {**response, "text": text}
+                break
+        responses.append(response)
+    if "responses" in localized:
+        localized["responses"] = responses
+
+    return localized
+
+
+def main(argv=None):
+    """Check the text tables of a tree, or extract a table from a translated copy"""
+    parser = argparse.ArgumentParser(description="Check and extract dialogue text tables")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    check = commands.add_parser("check", help="report missing and unused translations")
+    check.add_argument("dialogue", help="structure file with <name>.<locale>.json tables next to it")
+    check.add_argument("--locale", help="only check this locale")
+
+    extract = commands.add_parser("extract", help="write the texts of a document as a table")
+    extract.add_argument("dialogue", help="full dialogue document")
+    extract.add_argument("locale", help="locale code of its texts")
+    extract.add_argument("output", help="table file to write")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "extract":
+        with open(args.dialogue, 'r', encoding='utf-8') as f:
+            table = extract_table(json.load(f), args.locale)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(table, f, ensure_ascii=False, indent=2)
+        print(f"Wrote {len(table['dialogues'])} dialogues to {args.output}")
+        return 0
+
+    from dialogue_server import load_graph
+    from dialogue_validation import validate_locale
+
+    graph = load_graph(args.dialogue)
+    if graph.locales is None:
+        print(f"No text tables found next to {args.dialogue}")
+        return 1
+
+    found = 0
+    for locale in [args.locale] if args.locale else graph.locales.locales:
+        try:
+            table = graph.locales.table(locale)
+        except (OSError, ValueError) as e:
+            print(f"{locale}: cannot load text table: {e}")
+            found += 1
+            continue
+        if table is None:
+            print(f"No text table for locale '{locale}'")
+            return 1
+        issues = validate_locale(graph, table)
+        found += len(issues)
+        print(f"{locale}: {len(issues)} issues")
+        for issue in issues:
+            print(f"  {issue.code}: {issue.message}")
+
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
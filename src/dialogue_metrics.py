@@ -0,0 +1,350 @@
+"""
+Dialogue Metrics - Optional instrumentation for DialogueManager.
+
+InstrumentedDialogueManager is a drop-in DialogueManager subclass that
+records into a Metrics object:
+
+- latency histograms of loading, choosing a response, validation,
+  condition evaluation and script runs
+- counters of successful and failed loads and choices
+- how often each dialogue node is visited and each response is chosen
+
+Plain DialogueManager objects are not instrumented at all, so sessions that
+do not need metrics pay nothing; an instrumented session whose Metrics is
+disabled pays one attribute check per call.
+
+Metrics.snapshot() returns everything as plain data, and
+Metrics.prometheus_text() renders the Prometheus text exposition format.
+write_prometheus() writes it atomically to a file (e.g. for a node exporter
+textfile collector) and serve_prometheus() answers HTTP scrapes from a
+background thread.
+
+Updates are not locked. Counts are exact with one thread per Metrics
+object, as in the asyncio and pre-fork servers; share one between threads
+only where approximate counts are acceptable.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+from dialogue_lib import DialogueManager
+from dialogue_validation import ERROR
+
+# Upper bounds of the latency buckets, in seconds
+LATENCY_BUCKETS = (
+    1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+    1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Operations with a latency histogram
+OPERATIONS = ("load", "choose", "validate", "condition", "script")
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Fixed-bucket histogram of observed values."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        """
+        Create an empty histogram.
+
+        Args:
+            bounds: Sorted upper bounds of the buckets; larger values go to
+                an overflow bucket
+        """
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Record one value."""
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, fraction: float) -> float:
+        """
+        Estimate a quantile as the upper bound of the bucket that holds it.
+
+        Args:
+            fraction: Quantile between 0 and 1, e.g. 0.99
+
+        Returns:
+            The bucket bound, infinity for the overflow bucket, 0 if empty
+        """
+        if not self.count:
+            return 0.0
+
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    """Counters and latency histograms shared by instrumented sessions."""
+
+    def __init__(self, enabled: bool = True):
+        """
+        Create an empty metrics registry.
+
+        Args:
+            enabled: Start recording right away
+        """
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self) -> None:
+        """Clear every counter and histogram."""
+        self.latency: Dict[str, Histogram] = {operation: Histogram() for operation in OPERATIONS}
+        # (name, result) -> count, e.g. ("choices", "rejected")
+        self.counters: Counter = Counter()
+        # Dialogue ID -> visits
+        self.node_visits: Counter = Counter()
+        # (dialogue ID, response ID) -> times chosen
+        self.response_selections: Counter = Counter()
+        self.started = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get all recorded values as plain data.
+
+        Returns:
+            Dict with "counters", "latency" (per operation: count, sum,
+            p50, p99 and the bucket counts), "node_visits" and
+            "response_selections"
+        """
+        return {
+            "started": self.started,
+            "counters": {f"{name}_{result}": count
+                         for (name, result), count in sorted(self.counters.items())},
+            "latency": {
+                operation: {
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "p50": histogram.quantile(0.5),
+                    "p99": histogram.quantile(0.99),
+                    "buckets": list(zip(histogram.bounds + (float("inf"),), histogram.counts)),
+                }
+                for operation, histogram in self.latency.items()
+            },
+            "node_visits": dict(self.node_visits),
+            "response_selections": {
+                f"{dialogue_id}/{response_id}": count
+                for (dialogue_id, response_id), count in self.response_selections.items()
+            },
+        }
+
+    def prometheus_text(self, prefix: str = "dialogue") -> str:
+        """
+        Render the metrics in the Prometheus text exposition format.
+
+        Args:
+            prefix: Prefix of every metric name
+
+        Returns:
+            The exposition text
+        """
+        lines = []
+
+        by_name: Dict[str, list] = {}
+        for (name, result), count in sorted(self.counters.items()):
+            by_name.setdefault(name, []).append((result, count))
+        for name, samples in by_name.items():
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            for result, count in samples:
+                lines.append(f'{prefix}_{name}_total{{result="{_escape(result)}"}} {count}')
+
+        histogram_name = f"{prefix}_operation_seconds"
+        lines.append(f"# HELP {histogram_name} Latency of dialogue operations")
+        lines.append(f"# TYPE {histogram_name} histogram")
+        for operation, histogram in self.latency.items():
+            cumulative = 0
+            for bound, count in zip(histogram.bounds, histogram.counts):
+                cumulative += count
+                lines.append(f'{histogram_name}_bucket{{operation="{operation}",le="{bound!r}"}} '
+                             f'{cumulative}')
+            lines.append(f'{histogram_name}_bucket{{operation="{operation}",le="+Inf"}} '
+                         f'{histogram.count}')
+            lines.append(f'{histogram_name}_sum{{operation="{operation}"}} {histogram.sum!r}')
+            lines.append(f'{histogram_name}_count{{operation="{operation}"}} {histogram.count}')
+
+        lines.append(f"# TYPE {prefix}_node_visits_total counter")
+        for dialogue_id, count in sorted(self.node_visits.items()):
+            lines.append(f'{prefix}_node_visits_total{{dialogue="{_escape(dialogue_id)}"}} {count}')
+
+        lines.append(f"# TYPE {prefix}_response_selections_total counter")
+        for (dialogue_id, response_id), count in sorted(self.response_selections.items()):
+            lines.append(f'{prefix}_response_selections_total{{dialogue="{_escape(dialogue_id)}",'
+                         f'response="{_escape(response_id)}"}} {count}')
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, file_path: str, prefix: str = "dialogue") -> None:
+        """
+        Write the Prometheus text to a file, replacing it atomically.
+
+        Args:
+            file_path: Output file, e.g. in a textfile collector directory
+            prefix: Prefix of every metric name
+        """
+        temp_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text(prefix))
+        os.replace(temp_path, file_path)
+
+    def serve_prometheus(self, host: str = "127.0.0.1", port: int = 9464,
+                         prefix: str = "dialogue") -> ThreadingHTTPServer:
+        """
+        Answer HTTP scrapes with the Prometheus text from a background thread.
+
+        Args:
+            host: Interface to listen on
+            port: TCP port, 0 for any free port
+            prefix: Prefix of every metric name
+
+        Returns:
+            The HTTP server; call shutdown() and server_close() to stop it
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.prometheus_text(prefix).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        return server
+
+
+class InstrumentedDialogueManager(DialogueManager):
+    """DialogueManager that records its activity into a Metrics object."""
+
+    __slots__ = ("metrics",)
+
+    def __init__(self, graph=None, history_size: int = 0, metrics: Optional[Metrics] = None):
+        """
+        Initialize an instrumented dialogue manager.
+
+        Args:
+            graph: Optional compiled dialogue graph to start a session on
+            history_size: Number of visited dialogues to remember
+            metrics: Metrics to record into, shared by any number of
+                sessions; defaults to a new one
+        """
+        self.metrics: Metrics = metrics if metrics is not None else Metrics()
+        super().__init__(graph, history_size)
+
+    def use_graph(self, graph) -> None:
+        super().use_graph(graph)
+        if self.metrics.enabled and self._cursor >= 0:
+            self.metrics.node_visits[graph.node_ids[self._cursor]] += 1
+
+    def load_dialogue_file(self, file_path: str, use_cache: bool = True, lazy: bool = False) -> bool:
+        return self._timed_load(super().load_dialogue_file, file_path, use_cache, lazy)
+
+    def load_dialogue_from_string(self, json_string: str, use_cache: bool = True) -> bool:
+        return self._timed_load(super().load_dialogue_from_string, json_string, use_cache)
+
+    def load_dialogue_data(self, data: Dict, copy_data: bool = True) -> bool:
+        return self._timed_load(super().load_dialogue_data, data, copy_data)
+
+    def load_dialogue_binary(self, file_path: str, use_cache: bool = True) -> bool:
+        return self._timed_load(super().load_dialogue_binary, file_path, use_cache)
+
+    def choose_response(self, response_id: str, batch=None) -> bool:
+        metrics = self.metrics
+        if not metrics.enabled:
+            return super().choose_response(response_id, batch)
+
+        source = self._cursor
+        start = time.perf_counter()
+        chosen = super().choose_response(response_id, batch)
+        metrics.latency["choose"].observe(time.perf_counter() - start)
+
+        if not chosen:
+            metrics.counters["choices", "rejected"] += 1
+            return False
+
+        node_ids = self.graph.node_ids
+        metrics.counters["choices", "ok"] += 1
+        metrics.response_selections[node_ids[source], response_id] += 1
+        if self._cursor >= 0:
+            metrics.node_visits[node_ids[self._cursor]] += 1
+        return True
+
+    def reset_dialogue(self) -> None:
+        super().reset_dialogue()
+        if self.metrics.enabled and self._cursor >= 0:
+            self.metrics.node_visits[self.graph.node_ids[self._cursor]] += 1
+
+    def get_validation_issues(self) -> list:
+        metrics = self.metrics
+        if not metrics.enabled:
+            return super().get_validation_issues()
+
+        start = time.perf_counter()
+        issues = super().get_validation_issues()
+        metrics.latency["validate"].observe(time.perf_counter() - start)
+        failed = any(issue.severity == ERROR for issue in issues)
+        metrics.counters["validations", "failed" if failed else "ok"] += 1
+        return issues
+
+    def _filter_responses(self, node: Dict, conditions: Tuple) -> list:
+        metrics = self.metrics
+        if not metrics.enabled:
+            return super()._filter_responses(node, conditions)
+
+        start = time.perf_counter()
+        responses = super()._filter_responses(node, conditions)
+        metrics.latency["condition"].observe(time.perf_counter() - start)
+        metrics.counters["conditions", "evaluated"] += len(conditions)
+        return responses
+
+    def _run_script(self, script, batch=None) -> None:
+        metrics = self.metrics
+        if script is None or not metrics.enabled:
+            super()._run_script(script, batch)
+            return
+
+        start = time.perf_counter()
+        super()._run_script(script, batch)
+        metrics.latency["script"].observe(time.perf_counter() - start)
+        metrics.counters["scripts", "deferred" if batch is not None else "run"] += 1
+
+    def _timed_load(self, load, *args) -> bool:
+        """Time a load method and count its result."""
+        metrics = self.metrics
+        if not metrics.enabled:
+            return load(*args)
+
+        start = time.perf_counter()
+        loaded = load(*args)
+        metrics.latency["load"].observe(time.perf_counter() - start)
+        metrics.counters["loads", "ok" if loaded else "error"] += 1
+        return loaded
+
+
+def _escape(value: str) -> str:
+    """Escape a Prometheus label value."""
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
@@ -0,0 +1,368 @@
+"""
+Dialogue Paths - Exact path analytics for dialogue trees.
+
+analyze_paths() works out, for every node reachable from the starting
+dialogue:
+
+- depth: the fewest choices needed to reach it (breadth-first search)
+- path count: the number of distinct choice sequences that reach it
+- longest: the most choices on any path that reaches it, if that is finite
+- dominators: the nodes every playthrough passes before reaching it
+
+Path counts and longest paths are dynamic programs over the graph with its
+cycles condensed (Tarjan's strongly connected components), so a loop is
+entered once and counts as a single route through it. Nodes with a loop on
+some path to them are flagged as unbounded: their real path count is
+infinite and they have no longest path. Dominators come from the Cooper-Harvey-Kennedy
+iterative algorithm. Every pass is linear, or close to it, in the size of
+the graph.
+
+Results of a compiled graph are cached for as long as the graph lives;
+DialogueDocument.path_analytics() caches them until the next structural
+edit.
+"""
+import weakref
+from collections import deque
+from typing import Any, Dict, Iterable, List, NamedTuple, Sequence, Tuple
+
+from dialogue_validation import strongly_connected_components
+
+_analytics: "weakref.WeakKeyDictionary[Any, PathAnalytics]" = weakref.WeakKeyDictionary()
+
+
+class PathAnalytics(NamedTuple):
+    """Path statistics of a dialogue tree, by node index."""
+
+    node_ids: Tuple[str, ...]
+    # Dialogue ID -> node index
+    node_index: Dict[str, int]
+    start: int
+    # Nodes without responses or with a response that ends the conversation
+    ending_nodes: Tuple[int, ...]
+    # Fewest choices from the start, -1 if unreachable
+    depth: Sequence[int]
+    # Previous node on a path with the fewest choices, -1 for the start
+    parent: Sequence[int]
+    # Distinct paths from the start with cycles condensed, 0 if unreachable
+    path_count: Sequence[int]
+    # Most choices on a path from the start, -1 if unreachable or unbounded
+    longest: Sequence[int]
+    # 1 if a cycle lies on some path from the start to the node
+    unbounded: Sequence[int]
+    # Immediate dominator, -1 for the start and unreachable nodes
+    idom: Sequence[int]
+
+    def index(self, dialogue_id: str) -> int:
+        """Node index of a dialogue ID; raises ValueError if it does not exist."""
+        index = self.node_index.get(dialogue_id)
+        if index is None:
+            raise ValueError(f"Unknown dialogue '{dialogue_id}'")
+        return index
+
+    def dominators(self, dialogue_id: str) -> List[str]:
+        """
+        Get the nodes every path from the start to a node passes through.
+
+        Args:
+            dialogue_id: ID of the node
+
+        Returns:
+            Dialogue IDs from the start down to the node itself, empty if the
+            node is unreachable
+        """
+        index = self.index(dialogue_id)
+        if self.depth[index] < 0:
+            return []
+
+        chain = []
+        while index >= 0:
+            chain.append(self.node_ids[index])
+            index = self.idom[index]
+        chain.reverse()
+        return chain
+
+    def required_nodes(self) -> List[str]:
+        """
+        Get the nodes every complete playthrough passes through.
+
+        Returns:
+            Dialogue IDs in the order they are passed, empty if no ending
+            can be reached
+        """
+        endings = [index for index in self.ending_nodes if self.depth[index] >= 0]
+        if not endings:
+            return []
+
+        # Dominators lie on every path, including the shortest, so they
+        # are shallower than the nodes they dominate
+        reachable = sorted((i for i in range(len(self.depth)) if self.depth[i] >= 0),
+                           key=self.depth.__getitem__)
+        levels = [0] * len(self.depth)
+        for index in reachable:
+            if self.idom[index] >= 0:
+                levels[index] = levels[self.idom[index]] + 1
+
+        # Nearest common dominator of all reachable endings
+        common = endings[0]
+        for ending in endings[1:]:
+            while common != ending:
+                if levels[common] >= levels[ending]:
+                    common = self.idom[common]
+                else:
+                    ending = self.idom[ending]
+        return self.dominators(self.node_ids[common])
+
+    def shortest_path(self, dialogue_id: str) -> List[str]:
+        """
+        Get one path with the fewest choices from the start to a node.
+
+        Args:
+            dialogue_id: ID of the node
+
+        Returns:
+            Dialogue IDs from the start to the node, empty if unreachable
+        """
+        index = self.index(dialogue_id)
+        if self.depth[index] < 0:
+            return []
+
+        path = []
+        while index >= 0:
+            path.append(self.node_ids[index])
+            index = self.parent[index]
+        path.reverse()
+        return path
+
+    def ending_summary(self) -> List[Dict[str, Any]]:
+        """
+        Get the statistics of every ending, reachable or not.
+
+        Returns:
+            One dict per ending node with its id, paths, shortest, longest
+            and unbounded values
+        """
+        return [
+            {
+                "id": self.node_ids[index],
+                "paths": self.path_count[index],
+                "shortest": self.depth[index],
+                "longest": self.longest[index],
+                "unbounded": bool(self.unbounded[index]),
+            }
+            for index in self.ending_nodes
+        ]
+
+
+def analyze_paths(graph) -> PathAnalytics:
+    """
+    Analyze the paths of a compiled dialogue graph, caching the result.
+
+    Args:
+        graph: A DialogueGraph, LazyDialogueGraph or BinaryDialogueGraph
+
+    Returns:
+        The PathAnalytics
+    """
+    analytics = _analytics.get(graph)
+    if analytics is None:
+        edges, endings = graph_edges(graph)
+        analytics = _analytics[graph] = analyze_edges(
+            graph.node_ids, edges, endings, graph.starting_index)
+    return analytics
+
+
+def graph_edges(graph) -> Tuple[List[List[int]], List[int]]:
+    """
+    Collect the edges and endings of a compiled graph.
+
+    Args:
+        graph: The dialogue graph
+
+    Returns:
+        Tuple of (successor node indexes of each node, one per response
+        that leads to an existing node; ending node indexes)
+    """
+    node_index = graph.node_index
+    edges: List[List[int]] = []
+    endings: List[int] = []
+    for index in range(len(graph.node_ids)):
+        responses = graph.node(index).get("responses") or []
+        targets = []
+        is_ending = not responses
+        for response in responses:
+            next_dialogue = response.get("next_dialogue")
+            if not next_dialogue:
+                is_ending = True
+            elif next_dialogue in node_index:
+                targets.append(node_index[next_dialogue])
+        edges.append(targets)
+        if is_ending:
+            endings.append(index)
+    return edges, endings
+
+
+def analyze_edges(node_ids: Sequence[str], edges: Sequence[Sequence[int]],
+                  endings: Iterable[int], start: int) -> PathAnalytics:
+    """
+    Analyze the paths of a graph given as edge lists.
+
+    Args:
+        node_ids: Dialogue ID of each node index
+        edges: Successor node indexes of each node; a target that appears
+            twice is two distinct choices
+        endings: Indexes of the ending nodes
+        start: Index of the starting node, -1 if there is none
+
+    Returns:
+        The PathAnalytics
+    """
+    count = len(node_ids)
+    depth = [-1] * count
+    parent = [-1] * count
+    path_count = [0] * count
+    longest = [-1] * count
+    unbounded = bytearray(count)
+    idom = [-1] * count
+
+    if 0 <= start < count:
+        _bfs_depths(edges, start, depth, parent)
+        _condensed_paths(edges, count, start, depth, path_count, longest, unbounded)
+        _immediate_dominators(edges, count, start, idom)
+
+    node_ids = tuple(node_ids)
+    return PathAnalytics(
+        node_ids=node_ids,
+        # The first node with an ID wins, as in a list scan
+        node_index={node_id: index for index, node_id in reversed(list(enumerate(node_ids)))},
+        start=start,
+        ending_nodes=tuple(sorted(set(endings))),
+        depth=depth,
+        parent=parent,
+        path_count=path_count,
+        longest=longest,
+        unbounded=unbounded,
+        idom=idom,
+    )
+
+
+def _bfs_depths(edges: Sequence[Sequence[int]], start: int, depth: List[int],
+                parent: List[int]) -> None:
+    """Fewest choices from the start to every reachable node."""
+    depth[start] = 0
+    queue = deque([start])
+    while queue:
+        node = queue.popleft()
+        next_depth = depth[node] + 1
+        for target in edges[node]:
+            if depth[target] < 0:
+                depth[target] = next_depth
+                parent[target] = node
+                queue.append(target)
+
+
+def _condensed_paths(edges: Sequence[Sequence[int]], count: int, start: int,
+                     depth: List[int], path_count: List[int], longest: List[int],
+                     unbounded: bytearray) -> None:
+    """Path counts and longest paths over the condensation of the reachable graph."""
+    # Tarjan emits components sinks first, so reversed is topological order
+    components = strongly_connected_components(edges, count)
+    component_of = [0] * count
+    for number, component in enumerate(components):
+        for node in component:
+            component_of[node] = number
+
+    # Per component: paths into it, longest path into it, whether a cycle
+    # lies on a path into it or inside it
+    paths = [0] * len(components)
+    longest_into = [-1] * len(components)
+    cyclic = bytearray(len(components))
+    first = component_of[start]
+    paths[first] = 1
+    longest_into[first] = 0
+
+    for number in range(len(components) - 1, -1, -1):
+        if not paths[number]:
+            continue
+
+        component = components[number]
+        if len(component) > 1 or component[0] in edges[component[0]]:
+            cyclic[number] = 1
+
+        for node in component:
+            path_count[node] = paths[number]
+            longest[node] = -1 if cyclic[number] else longest_into[number]
+            unbounded[node] = cyclic[number]
+
+        for node in component:
+            for target in edges[node]:
+                other = component_of[target]
+                if other == number:
+                    continue
+                paths[other] += paths[number]
+                if longest_into[number] + 1 > longest_into[other]:
+                    longest_into[other] = longest_into[number] + 1
+                if cyclic[number]:
+                    cyclic[other] = 1
+
+
+def _immediate_dominators(edges: Sequence[Sequence[int]], count: int, start: int,
+                          idom: List[int]) -> None:
+    """Cooper-Harvey-Kennedy iterative dominators of the nodes reachable from start."""
+    # Reverse postorder of an iterative depth-first search
+    postorder: List[int] = []
+    visited = bytearray(count)
+    visited[start] = 1
+    work = [(start, 0)]
+    while work:
+        node, position = work[-1]
+        node_edges = edges[node]
+        if position < len(node_edges):
+            work[-1] = (node, position + 1)
+            target = node_edges[position]
+            if not visited[target]:
+                visited[target] = 1
+                work.append((target, 0))
+        else:
+            work.pop()
+            postorder.append(node)
+
+    # Work in reverse postorder numbers: the start is 0 and a dominator
+    # always has a smaller number than the nodes it dominates
+    rpo = postorder[::-1]
+    number = [-1] * count
+    for position, node in enumerate(rpo):
+        number[node] = position
+    predecessors = [[] for _ in rpo]
+    for node in rpo:
+        for target in edges[node]:
+            predecessors[number[target]].append(number[node])
+
+    # The start is its own dominator while iterating; -1 is not yet known
+    doms = [-1] * len(rpo)
+    doms[0] = 0
+    changed = True
+    while changed:
+        changed = False
+        for position in range(1, len(rpo)):
+            new_idom = -1
+            for predecessor in predecessors[position]:
+                if doms[predecessor] < 0:
+                    continue
+                if new_idom < 0:
+                    new_idom = predecessor
+                    continue
+                # Intersect: climb whichever finger is further from the start
+                a, b = predecessor, new_idom
+                while a != b:
+                    while a > b:
+                        a = doms[a]
+                    while b > a:
+                        b = doms[b]
+                new_idom = a
+
+            if doms[position] != new_idom:
+                doms[position] = new_idom
+                changed = True
+
+    for position in range(1, len(rpo)):
+        idom[rpo[position]] = rpo[doms[position]]
@@ -0,0 +1,342 @@
+"""
+Dialogue Pre-fork Server - Multi-process mode for the dialogue server.
+
+The parent process loads and compiles the dialogue graph once, freezes it
+out of the garbage collector's view and forks the workers, so every worker
+shares the same graph pages copy-on-write instead of holding its own copy.
+
+The parent only accepts connections. It reads each connection's first
+request line and, if it is a hello, picks the worker from the session ID
+(CRC32 modulo the number of workers); other connections are spread round
+robin. The socket and the bytes already read are handed to that worker over
+a Unix socket (SCM_RIGHTS), and from then on the worker talks to the client
+directly. Because a session ID always maps to the same worker, a worker can
+keep its sessions in memory between connections and no two processes ever
+write the same session.
+
+Usage:
+    python dialogue_prefork.py <dialogue.json|dialogue.dlgb> --workers 4 [--port 7777]
+
+POSIX only, since it relies on fork() and descriptor passing.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import multiprocessing
+import os
+import selectors
+import signal
+import socket
+import sys
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from dialogue_server import DEFAULT_PORT, DialogueServer, load_graph
+from dialogue_store import MemorySessionStore, SQLiteSessionStore
+
+# Longest first line the parent waits for before routing anyway
+MAX_FIRST_LINE = 64 * 1024
+
+# Seconds the parent waits for a first line before routing anyway
+HANDSHAKE_TIMEOUT = 5.0
+
+# Leading byte of every handoff message, so a message is never empty even
+# when the client has not sent anything yet
+_HANDOFF = b"C"
+
+
+def shard_for(session_id: str, workers: int) -> int:
+    """
+    Get the worker that owns a session.
+
+    Args:
+        session_id: ID of the session
+        workers: Number of workers
+
+    Returns:
+        Worker number in range(workers)
+    """
+    return zlib.crc32(session_id.encode("utf-8")) % workers
+
+
+class PreforkServer:
+    """Accepts connections and hands them to forked workers by session ID."""
+
+    def __init__(self, graph, workers: Optional[int] = None, host: str = "127.0.0.1",
+                 port: int = DEFAULT_PORT, sessions_path: Optional[str] = None,
+                 max_connections: int = 50000):
+        """
+        Set up a pre-fork server. Call start() to fork the workers.
+
+        Args:
+            graph: The dialogue graph, loaded before forking
+            workers: Number of worker processes, defaults to the CPU count
+            host: Interface to listen on
+            port: TCP port, 0 for any free port
+            sessions_path: SQLite file for named sessions; without one each
+                worker keeps its sessions in memory
+            max_connections: Connections each worker accepts
+        """
+        self.graph = graph
+        self.workers = workers or os.cpu_count() or 1
+        self.host = host
+        self.port = port
+        self.sessions_path = sessions_path
+        self.max_connections = max_connections
+
+        self._listener: Optional[socket.socket] = None
+        self._channels: List[socket.socket] = []
+        self._processes: List[multiprocessing.Process] = []
+        self._next_worker = 0
+        self._stopping = False
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        """Address the server listens on, once started."""
+        return self._listener.getsockname()[:2]
+
+    def start(self) -> None:
+        """Bind the listening socket and fork the workers."""
+        self._listener = socket.create_server((self.host, self.port), backlog=4096)
+        self._listener.setblocking(False)
+
+        # Keep the collector from touching, and so copying, the graph's pages
+        gc.collect()
+        gc.freeze()
+
+        context = multiprocessing.get_context("fork")
+        for number in range(self.workers):
+            # Unlike datagrams, a sequenced packet channel reads EOF once the
+            # parent's end is closed, so a worker notices when the parent dies
+            parent_end, worker_end = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            process = context.Process(target=self._run_worker,
+                                      args=(number, worker_end, parent_end),
+                                      name=f"dialogue-worker-{number}", daemon=True)
+            process.start()
+            worker_end.close()
+            self._channels.append(parent_end)
+            self._processes.append(process)
+
+        gc.unfreeze()
+
+    def serve_forever(self) -> None:
+        """Route connections to the workers until shutdown() is called."""
+        selector = selectors.DefaultSelector()
+        selector.register(self._listener, selectors.EVENT_READ)
+
+        # Connection -> (bytes read so far, accept time)
+        pending: Dict[socket.socket, Tuple[bytes, float]] = {}
+
+        try:
+            while not self._stopping:
+                for key, _ in selector.select(timeout=0.5):
+                    if key.fileobj is self._listener:
+                        self._accept(selector, pending)
+                    else:
+                        self._read_first_line(selector, pending, key.fileobj)
+
+                # Route clients that connect but stay silent
+                deadline = time.monotonic() - HANDSHAKE_TIMEOUT
+                for connection, (data, accepted) in list(pending.items()):
+                    if accepted < deadline:
+                        self._dispatch(selector, pending, connection, data)
+        finally:
+            selector.close()
+            for connection in pending:
+                connection.close()
+
+    def shutdown(self) -> None:
+        """Make serve_forever() return. Safe to call from a signal handler."""
+        self._stopping = True
+
+    def close(self) -> None:
+        """Stop routing and shut the workers down, saving their sessions."""
+        self.shutdown()
+        for process in self._processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+        for process in self._processes:
+            process.join(10)
+        for channel in self._channels:
+            channel.close()
+        if self._listener is not None:
+            self._listener.close()
+
+    # Parent side
+
+    def _accept(self, selector: selectors.BaseSelector,
+                pending: Dict[socket.socket, Tuple[bytes, float]]) -> None:
+        """Accept every waiting connection."""
+        while True:
+            try:
+                connection, _ = self._listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            connection.setblocking(False)
+            selector.register(connection, selectors.EVENT_READ)
+            pending[connection] = (b"", time.monotonic())
+
+    def _read_first_line(self, selector: selectors.BaseSelector,
+                         pending: Dict[socket.socket, Tuple[bytes, float]],
+                         connection: socket.socket) -> None:
+        """Collect bytes until the first request line is complete."""
+        data, accepted = pending[connection]
+        try:
+            chunk = connection.recv(MAX_FIRST_LINE - len(data))
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            chunk = b""
+
+        if not chunk:
+            selector.unregister(connection)
+            del pending[connection]
+            connection.close()
+            return
+
+        data += chunk
+        if b"\n" in data or len(data) >= MAX_FIRST_LINE:
+            self._dispatch(selector, pending, connection, data)
+        else:
+            pending[connection] = (data, accepted)
+
+    def _dispatch(self, selector: selectors.BaseSelector,
+                  pending: Dict[socket.socket, Tuple[bytes, float]],
+                  connection: socket.socket, data: bytes) -> None:
+        """Hand a connection and the bytes read from it to its worker."""
+        selector.unregister(connection)
+        del pending[connection]
+
+        worker = self._route(data)
+        try:
+            socket.send_fds(self._channels[worker], [_HANDOFF + data], [connection.fileno()])
+        except OSError as e:
+            print(f"Error handing connection to worker {worker}: {e}")
+        finally:
+            # The worker has its own descriptor now
+            connection.close()
+
+    def _route(self, data: bytes) -> int:
+        """Pick a worker from a connection's first line."""
+        line = data.split(b"\n", 1)[0]
+        try:
+            request = json.loads(line)
+        except ValueError:
+            request = None
+
+        if isinstance(request, dict) and request.get("op") == "hello":
+            session_id = request.get("session")
+            if isinstance(session_id, str) and session_id:
+                return shard_for(session_id, self.workers)
+
+        self._next_worker = (self._next_worker + 1) % self.workers
+        return self._next_worker
+
+    # Worker side
+
+    def _run_worker(self, number: int, channel: socket.socket,
+                    parent_end: socket.socket) -> None:
+        """Worker process entry point."""
+        # Holding the parent's end of our own channel would keep it from ever
+        # reading EOF
+        parent_end.close()
+
+        # The parent owns the listening socket and the other channels
+        self._listener.close()
+        for other in self._channels:
+            other.close()
+
+        # Ctrl-C reaches the whole process group; let the parent decide
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+        if self.sessions_path:
+            store = SQLiteSessionStore(self.sessions_path)
+        else:
+            store = MemorySessionStore()
+
+        server = DialogueServer(self.graph, store, max_connections=self.max_connections)
+        try:
+            asyncio.run(_worker_loop(server, channel))
+        finally:
+            store.close()
+
+
+async def _worker_loop(server: DialogueServer, channel: socket.socket) -> None:
+    """Serve the connections the parent hands over until SIGTERM."""
+    loop = asyncio.get_running_loop()
+    stopped = asyncio.Event()
+    loop.add_signal_handler(signal.SIGTERM, stopped.set)
+
+    channel.setblocking(False)
+
+    def receive() -> None:
+        while True:
+            try:
+                message, fds, _, _ = socket.recv_fds(channel, len(_HANDOFF) + MAX_FIRST_LINE, 16)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                message, fds = b"", []
+            if not message:
+                # The parent has gone away
+                stopped.set()
+                return
+            for fd in fds:
+                connection = socket.socket(fileno=fd)
+                loop.create_task(_adopt(server, connection, message[len(_HANDOFF):]))
+
+    loop.add_reader(channel.fileno(), receive)
+    try:
+        await stopped.wait()
+    finally:
+        loop.remove_reader(channel.fileno())
+        await server.close()
+
+
+async def _adopt(server: DialogueServer, connection: socket.socket, data: bytes) -> None:
+    """Serve a connection whose first bytes were already read by the parent."""
+    reader = asyncio.StreamReader(limit=server.max_line)
+    reader.feed_data(data)
+
+    protocol = asyncio.StreamReaderProtocol(reader, server.handle_connection)
+    await asyncio.get_running_loop().connect_accepted_socket(lambda: protocol, connection)
+
+
+def main(argv=None):
+    """Parse arguments and run the pre-fork server"""
+    parser = argparse.ArgumentParser(description="Serve dialogue trees from several processes")
+    parser.add_argument("dialogue", help="JSON dialogue file or compiled .dlgb file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--lazy", action="store_true", help="decode JSON nodes on first use")
+    parser.add_argument("--sessions", help="SQLite file for named sessions")
+    parser.add_argument("--max-connections", type=int, default=50000,
+                        help="connections per worker")
+    args = parser.parse_args(argv)
+
+    try:
+        graph = load_graph(args.dialogue, lazy=args.lazy)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+
+    server = PreforkServer(graph, args.workers, args.host, args.port, args.sessions,
+                           args.max_connections)
+    server.start()
+    signal.signal(signal.SIGTERM, lambda *_: server.shutdown())
+
+    print(f"Serving {args.dialogue} on {args.host}:{args.port} with {server.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
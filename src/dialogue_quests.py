@@ -0,0 +1,201 @@
+"""
+Dialogue Quests - Quest progression with precomputed stage indexes.
+
+A QuestIndex is built once per dialogue graph and shared by its sessions.
+It holds each quest's stage order, for constant-time stage lookups and
+"next stage" steps, and an index of the responses and on_entry hooks whose
+scripts touch each quest.
+
+Which quests a transition affects is known when its scripts are compiled
+(CompiledScript.quests), so answering it is two lookups and no session
+ever scans all quests when a response is chosen.
+
+Quest progress is stored in the session's DialogueState as
+{"current_stage": <stage id, 0 before the first stage>, "completed": bool}.
+"""
+from typing import Dict, List, Optional, Tuple
+
+# Where a quest can be changed: (dialogue ID, response ID or None for on_entry)
+QuestTrigger = Tuple[str, Optional[str]]
+
+
+class QuestIndex:
+    """Stage tables and script triggers of the quests in a graph."""
+
+    def __init__(self, graph):
+        """
+        Index the quest definitions of a graph.
+
+        The trigger index needs every node and is built on first use, so
+        lazily loaded graphs only pay for it when it is asked for.
+
+        Args:
+            graph: A DialogueGraph, LazyDialogueGraph or BinaryDialogueGraph
+        """
+        self._graph = graph
+
+        # Quest ID -> stage IDs in order, and stage ID -> (position, stage)
+        self.stage_ids: Dict[str, Tuple] = {}
+        self._stages: Dict[str, Dict] = {}
+        for quest_id, quest in graph.quests.items():
+            stages = quest.get("stages") or []
+            self.stage_ids[quest_id] = tuple(stage.get("id") for stage in stages)
+            self._stages[quest_id] = {
+                stage.get("id"): (position, stage) for position, stage in enumerate(stages)
+            }
+
+        self._triggers: Optional[Dict[str, List[QuestTrigger]]] = None
+
+    def has_stage(self, quest_id: str, stage_id) -> bool:
+        """
+        Check whether a quest defines a stage.
+
+        Args:
+            quest_id: ID of the quest
+            stage_id: ID of the stage
+
+        Returns:
+            bool: True if the stage exists
+        """
+        return stage_id in self._stages.get(quest_id, ())
+
+    def stage(self, quest_id: str, stage_id) -> Optional[Dict]:
+        """
+        Get a stage definition.
+
+        Args:
+            quest_id: ID of the quest
+            stage_id: ID of the stage
+
+        Returns:
+            The stage dict, or None if it does not exist
+        """
+        entry = self._stages.get(quest_id, {}).get(stage_id)
+        return entry[1] if entry is not None else None
+
+    def next_stage(self, quest_id: str, stage_id):
+        """
+        Get the stage that follows another one.
+
+        Args:
+            quest_id: ID of the quest
+            stage_id: Current stage ID, 0 before the first stage
+
+        Returns:
+            The next stage ID, or None if there is none. Quests without
+            stage definitions simply count up.
+        """
+        stage_ids = self.stage_ids.get(quest_id)
+        if not stage_ids:
+            return stage_id + 1 if isinstance(stage_id, int) else None
+
+        entry = self._stages[quest_id].get(stage_id)
+        if entry is None:
+            # Not started yet, or at an unknown stage
+            return stage_ids[0] if not stage_id else None
+
+        position = entry[0] + 1
+        return stage_ids[position] if position < len(stage_ids) else None
+
+    def affected_by(self, node_index: int, response_id: str) -> Tuple[str, ...]:
+        """
+        Get the quests a transition can change.
+
+        Args:
+            node_index: Index of the dialogue node the response belongs to
+            response_id: The ID of the response
+
+        Returns:
+            Quest IDs touched by the response script or by the on_entry
+            script of the node it leads to
+        """
+        graph = self._graph
+        quests: Tuple[str, ...] = ()
+
+        script = graph.response_script(node_index, response_id)
+        if script is not None:
+            quests = script.quests
+
+        target = graph.transition(node_index, response_id)
+        if target is not None and target >= 0:
+            entry = graph.entry_script(target)
+            if entry is not None and entry.quests:
+                quests = tuple(dict.fromkeys(quests + entry.quests))
+
+        return quests
+
+    def triggers(self, quest_id: str) -> List[QuestTrigger]:
+        """
+        Get every response and on_entry hook whose script touches a quest.
+
+        Args:
+            quest_id: ID of the quest
+
+        Returns:
+            List of (dialogue ID, response ID or None for on_entry)
+        """
+        if self._triggers is None:
+            self._triggers = self._build_triggers()
+        return self._triggers.get(quest_id, [])
+
+    def _build_triggers(self) -> Dict[str, List[QuestTrigger]]:
+        """Scan every node once for scripts that touch quests."""
+        graph = self._graph
+        triggers: Dict[str, List[QuestTrigger]] = {}
+
+        for index, dialogue_id in enumerate(graph.node_ids):
+            entry = graph.entry_script(index)
+            for quest_id in entry.quests if entry is not None else ():
+                triggers.setdefault(quest_id, []).append((dialogue_id, None))
+
+            for response in graph.node(index).get("responses", []):
+                script = graph.response_script(index, response["id"])
+                for quest_id in script.quests if script is not None else ():
+                    triggers.setdefault(quest_id, []).append((dialogue_id, response["id"]))
+
+        return triggers
+
+
+def _quest_index(session) -> Optional[QuestIndex]:
+    """The quest index of a session's graph, if it has one."""
+    graph = getattr(session, "graph", None)
+    return graph.quest_index if graph is not None else None
+
+
+# Script handlers for the built-in quest commands
+
+def start_quest(session, quest_id: str) -> None:
+    """Start a quest if it has not been started."""
+    if quest_id not in session.state.quests:
+        session.state.set_quest(quest_id, {"current_stage": 0, "completed": False})
+
+
+def update_quest(session, quest_id: str, stage: int) -> None:
+    """Move a quest to a stage, starting it if needed."""
+    progress = dict(session.state.quests.get(quest_id) or {"completed": False})
+    progress["current_stage"] = stage
+    session.state.set_quest(quest_id, progress)
+
+
+def advance_quest(session, quest_id: str) -> None:
+    """Move an active quest to the next stage in its definition."""
+    progress = session.state.quests.get(quest_id)
+    if progress is None or progress.get("completed"):
+        return
+
+    index = _quest_index(session)
+    current = progress.get("current_stage", 0)
+    if index is not None:
+        next_stage = index.next_stage(quest_id, current)
+    else:
+        next_stage = current + 1
+
+    if next_stage is not None:
+        update_quest(session, quest_id, next_stage)
+
+
+def complete_quest(session, quest_id: str) -> None:
+    """Mark a quest as completed."""
+    progress = dict(session.state.quests.get(quest_id) or {"current_stage": 0})
+    progress["completed"] = True
+    session.state.set_quest(quest_id, progress)
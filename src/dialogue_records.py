@@ -0,0 +1,236 @@
+"""
+Dialogue Records - Compact read-only dialogue nodes and responses.
+
+A parsed dialogue node is a dict with its own hash table, and every copy of
+a repeated string such as an NPC name is a separate object. NodeRecord and
+ResponseRecord store the usual fields in __slots__ instead, and a
+StringPool makes equal strings (NPC names, IDs and the next_dialogue
+references to them) share one object. A large compiled graph holds about a
+third less memory this way (see benchmark_memory.py).
+
+Records are Mappings without item assignment, so code that reads nodes as
+dicts keeps working: node["text"], node.get("npc_name", ""), "responses" in
+node and dict(node) behave the same, and a record compares equal to the dict
+it was built from. Records are not dicts, though: the responses of a node
+are a tuple of ResponseRecord, and json.dumps() does not accept them.
+plain_node() makes a plain dict copy with a list of response dicts, which
+is what DialogueManager hands out. Keys outside the usual fields are kept in
+a small dict of extras.
+"""
+import gc
+from collections.abc import Mapping
+from contextlib import contextmanager
+from operator import attrgetter
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Slot value of a field the source dict did not have
+_MISSING: Any = object()
+
+
+class StringPool:
+    """Hands out one shared object per distinct string."""
+
+    def __init__(self):
+        self._strings: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+    def get(self, value: Any) -> Any:
+        """
+        Get the shared copy of a string.
+
+        Args:
+            value: Any value; only strings are pooled
+
+        Returns:
+            The pooled string, or the value itself if it is not a string
+        """
+        if type(value) is str:
+            return self._strings.setdefault(value, value)
+        return value
+
+
+class _Record(Mapping):
+    """Read-only Mapping over __slots__ fields plus a dict of extras."""
+
+    __slots__ = ("_extra",)
+
+    # Field names, in the order keys are listed
+    _fields: tuple = ()
+    _field_set: frozenset = frozenset()
+    # Reads every field slot at once, as a tuple
+    _field_values: attrgetter
+
+    def _set_extra(self, source: Dict) -> None:
+        """Keep the keys of source that are not fields."""
+        field_set = self._field_set
+        if source.keys() <= field_set:
+            self._extra = None
+        else:
+            self._extra = {key: value for key, value in source.items() if key not in field_set}
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._field_set:
+            value = getattr(self, key)
+            if value is not _MISSING:
+                return value
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self._field_set:
+            value = getattr(self, key)
+            return default if value is _MISSING else value
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+
+    def __contains__(self, key: object) -> bool:
+        if key in self._field_set:
+            return getattr(self, key) is not _MISSING
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self._fields:
+            if getattr(self, key) is not _MISSING:
+                yield key
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        count = sum(1 for key in self._fields if getattr(self, key) is not _MISSING)
+        return count + (len(self._extra) if self._extra is not None else 0)
+
+    def _plain(self) -> Dict:
+        """The fields and extras as a new dict."""
+        plain = {key: value for key, value in zip(self._fields, self._field_values(self))
+                 if value is not _MISSING}
+        if self._extra is not None:
+            plain.update(self._extra)
+        return plain
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        return plain_node(self) == plain_node(other)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self)!r})"
+
+    def __reduce__(self):
+        return (_rebuild, (type(self), dict(self)))
+
+
+class ResponseRecord(_Record):
+    """A dialogue response stored in slots."""
+
+    _fields = ("id", "text", "next_dialogue", "condition", "script")
+    _field_set = frozenset(_fields)
+    _field_values = attrgetter(*_fields)
+    __slots__ = _fields
+
+    def __init__(self, source: Dict, pool: StringPool):
+        get = source.get
+        shared = pool.get
+        self.id = shared(get("id", _MISSING))
+        self.text = shared(get("text", _MISSING))
+        self.next_dialogue = shared(get("next_dialogue", _MISSING))
+        self.condition = get("condition", _MISSING)
+        self.script = shared(get("script", _MISSING))
+        self._set_extra(source)
+
+
+class NodeRecord(_Record):
+    """A dialogue node stored in slots, with its responses as records."""
+
+    _fields = ("id", "npc_name", "text", "responses", "on_entry")
+    _field_set = frozenset(_fields)
+    _field_values = attrgetter(*_fields)
+    __slots__ = _fields
+
+    def __init__(self, source: Dict, pool: StringPool):
+        get = source.get
+        shared = pool.get
+        self.id = shared(get("id", _MISSING))
+        self.npc_name = shared(get("npc_name", _MISSING))
+        self.text = shared(get("text", _MISSING))
+        self.on_entry = get("on_entry", _MISSING)
+
+        responses = get("responses", _MISSING)
+        if type(responses) is list or type(responses) is tuple:
+            responses = tuple([
+                response if type(response) is ResponseRecord else ResponseRecord(response, pool)
+                for response in responses
+            ])
+        self.responses = responses
+        self._set_extra(source)
+
+
+def plain_responses(responses: Iterable[Dict]) -> List[Dict]:
+    """
+    Copy a sequence of responses to a list, with records turned into dicts.
+
+    Args:
+        responses: Response records or dicts
+
+    Returns:
+        The list of response dicts
+    """
+    return [response._plain() if type(response) is ResponseRecord else response
+            for response in responses]
+
+
+def plain_node(node: Dict) -> Dict:
+    """
+    Copy a node to a plain dict, as it was before it was compacted.
+
+    Args:
+        node: A NodeRecord, or a node dict whose responses may be records
+
+    Returns:
+        A new dict, with the responses as a list of dicts
+    """
+    plain = node._plain() if isinstance(node, _Record) else dict(node)
+    responses = plain.get("responses")
+    if type(responses) is tuple or type(responses) is list:
+        plain["responses"] = plain_responses(responses)
+    return plain
+
+
+def compact_node(node: Dict, pool: Optional[StringPool] = None) -> NodeRecord:
+    """
+    Convert a parsed dialogue node to a compact record.
+
+    Args:
+        node: The node dict
+        pool: String pool shared by the nodes of one graph
+
+    Returns:
+        The NodeRecord
+    """
+    return NodeRecord(node, pool if pool is not None else StringPool())
+
+
+@contextmanager
+def gc_paused() -> Iterator[None]:
+    """
+    Pause the cyclic garbage collector while many records are created.
+
+    Records are tracked by the collector, unlike dicts that only hold
+    strings, so building a large graph would otherwise trigger many full
+    collections that cannot free anything.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _rebuild(cls, data: Dict) -> _Record:
+    """Unpickle a record."""
+    return cls(data, StringPool())
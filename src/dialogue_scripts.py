@@ -0,0 +1,260 @@
+"""
+Dialogue Scripts - Script commands resolved to handlers at load time.
+
+Responses may carry a "script" and nodes an "on_entry" hook. A script is a
+command string such as "StartQuest_tutorial", a list of them, or a list of
+command dicts such as {"type": "start_quest", "quest_id": "tutorial"}.
+
+When a dialogue is loaded every script is compiled once into a tuple of
+(handler, arguments) pairs, so running a transition is a direct call per
+command with no string parsing. Commands are looked up in a ScriptRegistry;
+register custom handlers before loading the dialogues that use them.
+
+Built-in commands:
+
+    StartQuest_<quest>              start_quest      quest_id
+    UpdateQuest_<quest>_<stage>     update_quest     quest_id, stage
+    AdvanceQuest_<quest>            advance_quest    quest_id
+    CompleteQuest_<quest>           complete_quest   quest_id
+    SetVariable_<name>_<value>      set_variable     name, value
+
+Arguments are split from the right, so quest IDs and variable names may
+contain underscores. A ScriptBatch collects the effects of many sessions
+and applies them in one pass, for server loops that advance once per tick.
+"""
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from dialogue_quests import advance_quest, complete_quest, start_quest, update_quest
+
+# A compiled command: handler(session, *arguments)
+Handler = Callable[..., None]
+Effect = Tuple[Handler, Tuple[Any, ...]]
+# (effect or None, quest ID the command changes or None, error or None)
+_CompiledCommand = Tuple[Optional[Effect], Optional[str], Optional[str]]
+
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+_LITERALS = {"true": True, "false": False, "null": None, "none": None}
+
+
+class CompiledScript:
+    """A script resolved to handler calls."""
+
+    __slots__ = ("source", "effects", "unknown", "quests")
+
+    def __init__(self, source: Any, effects: Tuple[Effect, ...], unknown: Tuple[str, ...],
+                 quests: Tuple[str, ...] = ()):
+        self.source = source
+        self.effects = effects
+        # Why each unknown or malformed command was skipped
+        self.unknown = unknown
+        # IDs of the quests the commands change, from their "quest_id" argument
+        self.quests = quests
+
+    def run(self, session) -> None:
+        """
+        Run every command against a session.
+
+        Args:
+            session: The DialogueManager the script applies to
+        """
+        for handler, arguments in self.effects:
+            handler(session, *arguments)
+
+    def __repr__(self) -> str:
+        return f"CompiledScript({self.source!r})"
+
+
+class ScriptRegistry:
+    """Maps script command names to handlers and compiles scripts."""
+
+    def __init__(self):
+        # Command name -> (handler, number of arguments, argument parsers)
+        self._commands: Dict[str, Tuple[Handler, int, Tuple[Callable, ...]]] = {}
+        # Dict "type" -> command name
+        self._types: Dict[str, str] = {}
+        # Dict form argument names per command
+        self._fields: Dict[str, Tuple[str, ...]] = {}
+        # Compiled command strings -> (effect, quest ID, error)
+        self._compiled: Dict[str, _CompiledCommand] = {}
+
+    def register(self, name: str, handler: Handler, fields: Tuple[str, ...] = (),
+                 parsers: Tuple[Callable, ...] = ()) -> None:
+        """
+        Register a script command.
+
+        Args:
+            name: Command name in the string form, e.g. "StartQuest"
+            handler: Called as handler(session, *arguments)
+            fields: Argument names, also used as keys in the dict form, whose
+                "type" is the snake_case command name
+            parsers: Optional converters for each argument string
+        """
+        parsers = tuple(parsers) + (str,) * (len(fields) - len(parsers))
+        self._commands[name] = (handler, len(fields), parsers)
+        self._types[_snake_case(name)] = name
+        self._fields[name] = tuple(fields)
+        self._compiled.clear()
+
+    def compile(self, script: Any) -> Optional[CompiledScript]:
+        """
+        Compile a script from a dialogue file.
+
+        Args:
+            script: A command string, a list of commands or None
+
+        Returns:
+            The compiled script, or None if there is nothing to run
+        """
+        if not script:
+            return None
+
+        commands = script if isinstance(script, list) else [script]
+        effects: List[Effect] = []
+        unknown: List[str] = []
+        quests: Dict[str, None] = {}
+        for command in commands:
+            effect, quest_id, error = self._compile_command(command)
+            if effect is not None:
+                effects.append(effect)
+            if quest_id is not None:
+                quests[quest_id] = None
+            if error is not None:
+                unknown.append(error)
+
+        return CompiledScript(script, tuple(effects), tuple(unknown), tuple(quests))
+
+    def _compile_command(self, command: Any) -> _CompiledCommand:
+        """Resolve a single command, memoizing the string form."""
+        if isinstance(command, dict):
+            type_name = command.get("type")
+            name = self._types.get(type_name) if isinstance(type_name, str) else None
+            if name is None:
+                return None, None, f"'{command.get('type')}' is not a registered command"
+            handler, _, parsers = self._commands[name]
+            try:
+                arguments = tuple(
+                    parse(command[field]) if isinstance(command[field], str) else command[field]
+                    for field, parse in zip(self._fields[name], parsers)
+                )
+            except KeyError as e:
+                return None, None, f"'{type_name}' is missing '{e.args[0]}'"
+            except (ValueError, TypeError):
+                return None, None, f"'{type_name}' has an invalid argument"
+            return (handler, arguments), self._quest_argument(name, arguments), None
+
+        if not isinstance(command, str):
+            return None, None, f"{command!r} is not a command"
+
+        compiled = self._compiled.get(command)
+        if compiled is None:
+            compiled = self._compiled[command] = self._parse_command(command)
+        return compiled
+
+    def _parse_command(self, command: str) -> _CompiledCommand:
+        """Split a command string into a handler and converted arguments."""
+        name, _, argument_text = command.partition("_")
+        entry = self._commands.get(name)
+        if entry is None:
+            return None, None, f"'{command}' is not a registered command"
+
+        handler, arity, parsers = entry
+        arguments = argument_text.rsplit("_", arity - 1) if arity else []
+        if len(arguments) != arity or not all(arguments):
+            return None, None, f"'{command}' expects {arity} argument{'s' if arity != 1 else ''}"
+
+        try:
+            arguments = tuple(parse(a) for parse, a in zip(parsers, arguments))
+        except ValueError:
+            return None, None, f"'{command}' has an invalid argument"
+        return (handler, arguments), self._quest_argument(name, arguments), None
+
+    def _quest_argument(self, name: str, arguments: Tuple[Any, ...]) -> Optional[str]:
+        """The "quest_id" argument of a command, if it has one."""
+        fields = self._fields[name]
+        if "quest_id" not in fields:
+            return None
+        return str(arguments[fields.index("quest_id")])
+
+    def is_registered(self, name: str) -> bool:
+        """Whether a command name has a handler."""
+        return name in self._commands
+
+
+class ScriptBatch:
+    """
+    Deferred script effects of many sessions, applied in one pass.
+
+    Pass a batch to DialogueManager.choose_response() to queue the effects
+    of a transition instead of running them; the server loop then calls
+    apply() once per tick. Until then, conditions still see the old state.
+    """
+
+    __slots__ = ("_pending",)
+
+    def __init__(self):
+        self._pending: List[Tuple[Any, CompiledScript]] = []
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def defer(self, session, script: Optional[CompiledScript]) -> None:
+        """
+        Queue a script to run against a session.
+
+        Args:
+            session: The DialogueManager the script applies to
+            script: Compiled script, ignored if None
+        """
+        if script is not None and script.effects:
+            self._pending.append((session, script))
+
+    def apply(self) -> int:
+        """
+        Run every queued effect in the order it was queued.
+
+        Returns:
+            Number of scripts run
+        """
+        pending, self._pending = self._pending, []
+        for session, script in pending:
+            script.run(session)
+        return len(pending)
+
+
+def parse_value(text: str) -> Any:
+    """
+    Convert a script argument to true/false/null, a number or a string.
+
+    Args:
+        text: The argument text
+
+    Returns:
+        The converted value
+    """
+    literal = text.lower()
+    if literal in _LITERALS:
+        return _LITERALS[literal]
+    if _NUMBER.fullmatch(text):
+        return float(text) if "." in text else int(text)
+    return text
+
+
+def _snake_case(name: str) -> str:
+    """StartQuest -> start_quest"""
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
+
+
+# Built-in handlers. Quest handlers live in dialogue_quests.
+
+def set_variable(session, name: str, value: Any) -> None:
+    """Set a dialogue variable."""
+    session.state.set_variable(name, value)
+
+
+default_registry = ScriptRegistry()
+default_registry.register("StartQuest", start_quest, ("quest_id",))
+default_registry.register("UpdateQuest", update_quest, ("quest_id", "stage"), (str, int))
+default_registry.register("AdvanceQuest", advance_quest, ("quest_id",))
+default_registry.register("CompleteQuest", complete_quest, ("quest_id",))
+default_registry.register("SetVariable", set_variable, ("name", "value"), (str, parse_value))
@@ -0,0 +1,350 @@
+"""
+Dialogue Server - Asyncio line-protocol server for many concurrent sessions.
+
+Every connection is one conversation on a dialogue graph that is loaded once
+and shared by all connections, so a connection only costs a DialogueManager
+(a cursor and its variables and quest progress) and its stream buffers.
+
+Usage:
+    python dialogue_server.py <dialogue.json|dialogue.dlgb> [--port 7777]
+
+Protocol: one JSON object per line in each direction.
+
+    {"op": "current"}                        the current dialogue
+    {"op": "choose", "response": "<id>"}     choose a response
+    {"op": "reset"}                          back to the starting dialogue
+    {"op": "locale", "locale": "<code>"}     show texts in a locale (null for
+                                             the texts of the dialogue file)
+    {"op": "hello", "session": "<id>"}       name the session; with a session
+                                             store it is restored now and
+                                             saved when the connection closes;
+                                             a stored session that cannot be
+                                             restored is an error and is left
+                                             as it is
+
+Each request may carry a "seq" value, which is echoed in the reply. Replies
+are {"ok": true, "dialogue": {...}} with the dialogue's id, npc_name, text
+and available responses (id and text), or null once the conversation has
+ended, and {"ok": false, "error": "..."} for failed requests.
+
+Requests on a connection are handled in order and the next line is only read
+after the reply has been handed to the transport, which waits whenever the
+client reads slower than it writes. Connections beyond max_connections are
+refused with an error, so overload does not degrade every conversation.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from typing import Dict, Optional, Set, Tuple
+
+from dialogue_cache import load_graph_binary, load_graph_file
+from dialogue_lib import DialogueManager
+from dialogue_locale import display_node
+from dialogue_store import SessionStore, SQLiteSessionStore
+
+DEFAULT_PORT = 7777
+
+# Replies that do not depend on the session
+_BUSY = b'{"ok":false,"error":"server busy"}\n'
+_LINE_TOO_LONG = b'{"ok":false,"error":"request line too long"}\n'
+
+
+def load_graph(file_path: str, lazy: bool = False):
+    """
+    Load the dialogue graph a server hosts.
+
+    Args:
+        file_path: JSON dialogue file, or a .dlgb file from dialogue_compiler.py
+        lazy: Memory-map a JSON file and decode nodes on first use
+
+    Returns:
+        The shared, read-only graph
+    """
+    if file_path.endswith(".dlgb"):
+        return load_graph_binary(file_path)
+    return load_graph_file(file_path, lazy=lazy)
+
+
+class DialogueServer:
+    """Serves conversations on one shared dialogue graph."""
+
+    def __init__(self, graph, store: Optional[SessionStore] = None,
+                 max_connections: int = 50000, max_line: int = 64 * 1024,
+                 write_buffer: int = 64 * 1024, render_cache_size: int = 65536):
+        """
+        Set up a server. Call start() or serve() to accept connections.
+
+        Args:
+            graph: The dialogue graph every session runs on
+            store: Optional session store for named sessions
+            max_connections: Connections beyond this are refused
+            max_line: Longest accepted request line, in bytes
+            write_buffer: Bytes buffered per connection before waiting on
+                the client
+            render_cache_size: Number of rendered dialogues to keep; nodes
+                without conditions or templates look the same to every
+                session with the same locale
+        """
+        self.graph = graph
+        self.store = store
+        self.max_connections = max_connections
+        self.max_line = max_line
+        self.write_buffer = write_buffer
+        self.render_cache_size = render_cache_size
+
+        # (locale, dialogue ID) -> JSON of the dialogue as sent to clients
+        self._rendered: Dict[Tuple[Optional[str], str], bytes] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        # Tasks of the open connections, cancelled by close()
+        self._handlers: Set[asyncio.Task] = set()
+
+        # Statistics
+        self.connections = 0
+        self.requests = 0
+        self.refused = 0
+
+    async def start(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT, sock=None):
+        """
+        Start accepting connections.
+
+        Args:
+            host: Interface to listen on
+            port: TCP port, 0 for any free port
+            sock: Already bound listening socket to use instead of host and port
+
+        Returns:
+            The asyncio server
+        """
+        if sock is not None:
+            self._server = await asyncio.start_server(self.handle_connection, sock=sock,
+                                                      limit=self.max_line)
+        else:
+            self._server = await asyncio.start_server(self.handle_connection, host, port,
+                                                      limit=self.max_line)
+        return self._server
+
+    async def serve(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> None:
+        """Accept connections until cancelled."""
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def close(self) -> None:
+        """Stop accepting connections and end the open ones, saving named sessions."""
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+        handlers = list(self._handlers)
+        for handler in handlers:
+            handler.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+
+    async def handle_connection(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter) -> None:
+        """
+        Serve one conversation until the client disconnects.
+
+        Args:
+            reader: Stream of request lines
+            writer: Stream for replies
+        """
+        if self.connections >= self.max_connections:
+            self.refused += 1
+            writer.write(_BUSY)
+            await self._close_writer(writer)
+            return
+
+        self.connections += 1
+        handler = asyncio.current_task()
+        self._handlers.add(handler)
+        writer.transport.set_write_buffer_limits(high=self.write_buffer)
+        manager = DialogueManager(self.graph)
+        session_id: Optional[str] = None
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    writer.write(_LINE_TOO_LONG)
+                    break
+                if not line:
+                    break
+
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError
+                except ValueError:
+                    writer.write(self._error("invalid request", None))
+                else:
+                    if request.get("op") == "hello":
+                        named, reply = await self._hello(manager, request)
+                        if named is not None:
+                            session_id = named
+                    else:
+                        reply = self.handle_request(manager, request)
+                    writer.write(reply)
+
+                # Wait while the client is not keeping up with its replies
+                await writer.drain()
+
+        except (ConnectionError, asyncio.CancelledError):
+            # Client went away, or the server is closing
+            pass
+        finally:
+            self.connections -= 1
+            self._handlers.discard(handler)
+            if self.store is not None and session_id is not None:
+                self.store.save_session(session_id, manager)
+            await self._close_writer(writer)
+
+    def handle_request(self, manager: DialogueManager, request: Dict) -> bytes:
+        """
+        Apply a current, choose, reset or locale request to a session.
+
+        Args:
+            manager: The connection's session
+            request: The decoded request
+
+        Returns:
+            The reply line
+        """
+        self.requests += 1
+        op = request.get("op")
+        seq = request.get("seq")
+
+        if op == "choose":
+            response_id = request.get("response")
+            if not isinstance(response_id, str) or not manager.choose_response(response_id):
+                return self._error(f"response {response_id!r} is not available", seq)
+        elif op == "reset":
+            manager.reset_dialogue()
+        elif op == "locale":
+            locale = request.get("locale")
+            if (locale is not None and not isinstance(locale, str)) or not manager.set_locale(locale):
+                return self._error(f"locale {locale!r} is not available", seq)
+        elif op != "current":
+            return self._error(f"unknown op {op!r}", seq)
+
+        return self._reply(manager, seq)
+
+    def render(self, manager: DialogueManager) -> bytes:
+        """
+        Get the JSON of a session's current dialogue as sent to clients.
+
+        Args:
+            manager: The session
+
+        Returns:
+            The dialogue JSON, or null once the conversation has ended
+        """
+        dialogue_id = manager.current_dialogue_id
+        if not dialogue_id:
+            return b"null"
+
+        key = (manager.locale, dialogue_id)
+        rendered = self._rendered.get(key)
+        if rendered is not None:
+            return rendered
+
+        dialogue = manager.get_current_dialogue()
+        rendered = json.dumps({
+            "id": dialogue["id"],
+            "npc_name": dialogue.get("npc_name", ""),
+            "text": dialogue.get("text", ""),
+            "responses": [
+                {"id": response["id"], "text": response.get("text", "")}
+                for response in dialogue.get("responses", [])
+            ],
+        }, separators=(",", ":")).encode("utf-8")
+
+        # Conditional responses and templated texts differ between sessions,
+        # so only cache the rest
+        node_index = self.graph.node_index[dialogue_id]
+        if (self.graph.node_conditions(node_index) is None
+                and display_node(self.graph, node_index, manager.locale)[1] is None):
+            if len(self._rendered) >= self.render_cache_size:
+                del self._rendered[next(iter(self._rendered))]
+            self._rendered[key] = rendered
+
+        return rendered
+
+    async def _hello(self, manager: DialogueManager, request: Dict):
+        """Name the session, restoring it from the store if it was saved."""
+        self.requests += 1
+        session_id = request.get("session")
+        seq = request.get("seq")
+        if not isinstance(session_id, str) or not session_id:
+            return None, self._error("hello needs a session ID", seq)
+
+        if self.store is not None:
+            # The read may wait for the disk or a group commit in progress;
+            # do it off the event loop so other connections keep going
+            loop = asyncio.get_running_loop()
+            snapshot = await loop.run_in_executor(None, self.store.load, session_id)
+            # A snapshot that does not fit the graph is refused rather than
+            # replaced by a fresh session when the connection closes
+            if snapshot is not None and not manager.restore(snapshot):
+                return None, self._error(f"session {session_id!r} cannot be restored", seq)
+        return session_id, self._reply(manager, seq)
+
+    def _reply(self, manager: DialogueManager, seq) -> bytes:
+        """Successful reply with the current dialogue."""
+        if seq is None:
+            return b'{"ok":true,"dialogue":' + self.render(manager) + b"}\n"
+        return (b'{"ok":true,"seq":' + json.dumps(seq).encode("utf-8")
+                + b',"dialogue":' + self.render(manager) + b"}\n")
+
+    @staticmethod
+    def _error(message: str, seq) -> bytes:
+        """Failed reply."""
+        reply = {"ok": False, "error": message}
+        if seq is not None:
+            reply["seq"] = seq
+        return json.dumps(reply, separators=(",", ":")).encode("utf-8") + b"\n"
+
+    @staticmethod
+    async def _close_writer(writer: asyncio.StreamWriter) -> None:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+def main(argv=None):
+    """Parse arguments and run the server"""
+    parser = argparse.ArgumentParser(description="Serve dialogue trees over a JSON line protocol")
+    parser.add_argument("dialogue", help="JSON dialogue file or compiled .dlgb file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--lazy", action="store_true", help="decode JSON nodes on first use")
+    parser.add_argument("--sessions", help="SQLite file for named sessions")
+    parser.add_argument("--max-connections", type=int, default=50000)
+    args = parser.parse_args(argv)
+
+    try:
+        graph = load_graph(args.dialogue, lazy=args.lazy)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+
+    store = SQLiteSessionStore(args.sessions) if args.sessions else None
+    server = DialogueServer(graph, store, max_connections=args.max_connections)
+
+    print(f"Serving {args.dialogue} on {args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if store is not None:
+            store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
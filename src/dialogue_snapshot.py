@@ -0,0 +1,337 @@
+"""
+Dialogue Snapshots - Compact binary save and restore of dialogue sessions.
+
+A snapshot holds the state of one DialogueManager session: the current node
+index, the variables, the quest progress and, if the session keeps one, its
+bounded history of visited nodes. It is meant for parking large numbers of
+idle sessions in a key-value store.
+
+Snapshots are tied to the graph they were taken on. Nodes, variables and
+quests are stored by their position in the graph rather than by name, and
+values that still equal the graph's initial ones are stored in one byte, so
+a typical snapshot is a few dozen bytes. A fingerprint of the graph layout
+is checked on restore, so a snapshot is never applied to a different tree.
+
+Layout, little-endian, integers as unsigned LEB128 varints unless noted:
+
+    magic "DSNP", format version (1 byte), flags (1 byte), fingerprint (u32)
+    cursor + 1
+    one value per declared variable, then a count of other variables and
+        (name, value) pairs
+    one quest entry per defined quest, then a count of other quests and
+        (name, quest entry) pairs
+    if FLAG_HISTORY: history capacity, history length, node index + 1 each
+
+A quest entry is a status byte (not started, active, completed) followed,
+once started, by the current stage as a value. Only current_stage and
+completed are kept from a quest's progress.
+"""
+import json
+import struct
+import weakref
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from dialogue_conditions import DialogueState
+
+MAGIC = b"DSNP"
+SNAPSHOT_VERSION = 1
+
+# Header flags
+FLAG_HISTORY = 1
+
+_HEADER = struct.Struct("<4sBBI")
+_DOUBLE = struct.Struct("<d")
+
+# Value tags
+_DEFAULT, _NONE, _FALSE, _TRUE, _INT, _FLOAT, _STR, _JSON = range(8)
+
+# Quest statuses
+_NOT_STARTED, _ACTIVE, _COMPLETED = range(3)
+
+# Graph -> (fingerprint, variable names, initial values, quest IDs, variable
+# positions, quest positions)
+_Layout = Tuple[int, Tuple[str, ...], Tuple[Any, ...], Tuple[str, ...], Dict[str, int], Dict[str, int]]
+_layouts: "weakref.WeakKeyDictionary[Any, _Layout]" = weakref.WeakKeyDictionary()
+
+
+def graph_fingerprint(graph) -> int:
+    """
+    Get the fingerprint of a graph's layout.
+
+    It covers the node IDs and the declared variables and quests, in order,
+    which is everything a snapshot refers to by position.
+
+    Args:
+        graph: A DialogueGraph, LazyDialogueGraph or BinaryDialogueGraph
+
+    Returns:
+        32-bit fingerprint
+    """
+    return _layout(graph)[0]
+
+
+def snapshot_session(session) -> bytes:
+    """
+    Serialize the state of a session.
+
+    Args:
+        session: The DialogueManager to save; it must have a graph
+
+    Returns:
+        The snapshot bytes
+
+    Raises:
+        ValueError: If a variable or quest stage holds a value that cannot
+            be stored as JSON
+    """
+    graph = session.graph
+    fingerprint, names, defaults, quest_ids, name_positions, quest_positions = _layout(graph)
+    history = session.history
+
+    out = bytearray(_HEADER.pack(MAGIC, SNAPSHOT_VERSION,
+                                 FLAG_HISTORY if history is not None else 0, fingerprint))
+    _write_uint(out, session._cursor + 1)
+
+    variables = session.state.variables
+    for name, default in zip(names, defaults):
+        value = variables.get(name)
+        if value == default and type(value) is type(default):
+            out.append(_DEFAULT)
+        else:
+            _write_value(out, value, name)
+
+    extra = [name for name in variables if name not in name_positions]
+    _write_uint(out, len(extra))
+    for name in extra:
+        _write_str(out, name)
+        _write_value(out, variables[name], name)
+
+    quests = session.state.quests
+    for quest_id in quest_ids:
+        _write_quest(out, quests.get(quest_id), quest_id)
+
+    extra = [quest_id for quest_id in quests if quest_id not in quest_positions]
+    _write_uint(out, len(extra))
+    for quest_id in extra:
+        _write_str(out, quest_id)
+        _write_quest(out, quests[quest_id], quest_id)
+
+    if history is not None:
+        _write_uint(out, history.maxlen or 0)
+        _write_uint(out, len(history))
+        for node_index in history:
+            _write_uint(out, node_index + 1)
+
+    return bytes(out)
+
+
+def read_snapshot(graph, snapshot: bytes) -> Tuple[int, DialogueState, Optional[Tuple[int, List[int]]]]:
+    """
+    Decode a snapshot taken on a graph.
+
+    Args:
+        graph: The graph the snapshot was taken on
+        snapshot: The snapshot bytes
+
+    Returns:
+        Tuple of (cursor, state, history), where history is None or a tuple
+        of (capacity, node indexes)
+
+    Raises:
+        ValueError: If the snapshot is malformed, has an unsupported version
+            or was taken on a different graph
+    """
+    fingerprint, names, defaults, quest_ids, _, _ = _layout(graph)
+
+    buffer = memoryview(snapshot)
+    if len(buffer) < _HEADER.size:
+        raise ValueError("Snapshot is truncated")
+
+    magic, version, flags, snapshot_fingerprint = _HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError("Not a dialogue snapshot")
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}")
+    if snapshot_fingerprint != fingerprint:
+        raise ValueError("Snapshot was taken on a different dialogue graph")
+
+    try:
+        reader = _Reader(buffer, _HEADER.size)
+        cursor = reader.uint() - 1
+        if cursor >= len(graph.node_ids):
+            raise ValueError("Snapshot node index is out of range")
+
+        variables: Dict[str, Any] = {}
+        for name, default in zip(names, defaults):
+            variables[name] = reader.value(default)
+        for _ in range(reader.uint()):
+            name = reader.str()
+            variables[name] = reader.value(None)
+
+        quests: Dict[str, Dict] = {}
+        for quest_id in quest_ids:
+            progress = reader.quest()
+            if progress is not None:
+                quests[quest_id] = progress
+        for _ in range(reader.uint()):
+            quest_id = reader.str()
+            progress = reader.quest()
+            if progress is not None:
+                quests[quest_id] = progress
+
+        history = None
+        if flags & FLAG_HISTORY:
+            capacity = reader.uint()
+            indexes = [reader.uint() - 1 for _ in range(reader.uint())]
+            if capacity and len(indexes) > capacity:
+                raise ValueError("Snapshot history is longer than its capacity")
+            node_count = len(graph.node_ids)
+            if any(not 0 <= index < node_count for index in indexes):
+                raise ValueError("Snapshot history node index is out of range")
+            history = (capacity, indexes)
+
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise ValueError(f"Snapshot is truncated or corrupt: {e}")
+
+    if reader.position != len(buffer):
+        raise ValueError("Snapshot has trailing bytes")
+
+    return cursor, DialogueState(variables, quests), history
+
+
+def _layout(graph) -> _Layout:
+    """Positions of the variables and quests of a graph, built once per graph."""
+    layout = _layouts.get(graph)
+    if layout is None:
+        names = tuple(graph.variables)
+        defaults = tuple(graph.variables[name] for name in names)
+        quest_ids = tuple(graph.quests)
+
+        checksum = zlib.crc32("\0".join(graph.node_ids).encode("utf-8"))
+        checksum = zlib.crc32(("\1" + "\0".join(names)).encode("utf-8"), checksum)
+        checksum = zlib.crc32(("\1" + "\0".join(quest_ids)).encode("utf-8"), checksum)
+
+        layout = (
+            checksum, names, defaults, quest_ids,
+            {name: i for i, name in enumerate(names)},
+            {quest_id: i for i, quest_id in enumerate(quest_ids)},
+        )
+        _layouts[graph] = layout
+    return layout
+
+
+# Encoding
+
+def _write_uint(out: bytearray, value: int) -> None:
+    """Append an unsigned LEB128 varint."""
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _write_str(out: bytearray, text: str) -> None:
+    encoded = text.encode("utf-8")
+    _write_uint(out, len(encoded))
+    out += encoded
+
+
+def _write_value(out: bytearray, value: Any, name: str, kind: str = "variable") -> None:
+    """Append a tagged variable value; name and kind are only used in errors."""
+    if value is None:
+        out.append(_NONE)
+    elif value is True:
+        out.append(_TRUE)
+    elif value is False:
+        out.append(_FALSE)
+    elif type(value) is int:
+        out.append(_INT)
+        # Zigzag so small negative numbers stay short
+        _write_uint(out, value << 1 if value >= 0 else ((-value) << 1) - 1)
+    elif type(value) is float:
+        out.append(_FLOAT)
+        out += _DOUBLE.pack(value)
+    elif type(value) is str:
+        out.append(_STR)
+        _write_str(out, value)
+    else:
+        try:
+            encoded = json.dumps(value, separators=(",", ":"))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Cannot save {kind} '{name}': {e}")
+        out.append(_JSON)
+        _write_str(out, encoded)
+
+
+def _write_quest(out: bytearray, progress: Optional[Dict], quest_id: str) -> None:
+    """Append a quest status and, once started, its stage."""
+    if progress is None:
+        out.append(_NOT_STARTED)
+        return
+
+    out.append(_COMPLETED if progress.get("completed") else _ACTIVE)
+    _write_value(out, progress.get("current_stage", 0), quest_id, "stage of quest")
+
+
+class _Reader:
+    """Sequential decoder over a snapshot buffer."""
+
+    __slots__ = ("buffer", "position")
+
+    def __init__(self, buffer: memoryview, position: int):
+        self.buffer = buffer
+        self.position = position
+
+    def uint(self) -> int:
+        result = 0
+        shift = 0
+        while True:
+            byte = self.buffer[self.position]
+            self.position += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def str(self) -> str:
+        length = self.uint()
+        end = self.position + length
+        if end > len(self.buffer):
+            raise IndexError("string runs past the end")
+        text = str(self.buffer[self.position:end], "utf-8")
+        self.position = end
+        return text
+
+    def value(self, default: Any) -> Any:
+        tag = self.buffer[self.position]
+        self.position += 1
+        if tag == _DEFAULT:
+            return default
+        if tag == _NONE:
+            return None
+        if tag == _FALSE:
+            return False
+        if tag == _TRUE:
+            return True
+        if tag == _INT:
+            number = self.uint()
+            return number >> 1 if not number & 1 else -((number + 1) >> 1)
+        if tag == _FLOAT:
+            (number,) = _DOUBLE.unpack_from(self.buffer, self.position)
+            self.position += _DOUBLE.size
+            return number
+        if tag == _STR:
+            return self.str()
+        if tag == _JSON:
+            return json.loads(self.str())
+        raise ValueError(f"Unknown value tag {tag}")
+
+    def quest(self) -> Optional[Dict]:
+        status = self.buffer[self.position]
+        self.position += 1
+        if status == _NOT_STARTED:
+            return None
+        if status not in (_ACTIVE, _COMPLETED):
+            raise ValueError(f"Unknown quest status {status}")
+        return {"current_stage": self.value(0), "completed": status == _COMPLETED}
@@ -0,0 +1,320 @@
+"""
+Dialogue Store - Persistent storage for session snapshots.
+
+A SessionStore keeps the snapshots produced by DialogueManager.snapshot()
+under a session ID, so a session survives worker restarts. Stores are
+pluggable: MemorySessionStore keeps everything in a dict and
+SQLiteSessionStore persists to a local SQLite database without any
+external service.
+
+SQLiteSessionStore is write-behind. save() only updates an in-process
+cache and marks the session dirty; a background thread commits every dirty
+session in one transaction every flush_interval seconds (group commit), so
+a commit's fsync is shared by thousands of sessions. The database runs in
+WAL mode so reads are not blocked by a commit in progress. Sessions saved
+since the last flush are lost if the process is killed; call flush() or
+close() on orderly shutdown.
+"""
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+_CREATE_TABLE = (
+    "CREATE TABLE IF NOT EXISTS sessions ("
+    "session_id TEXT PRIMARY KEY, snapshot BLOB NOT NULL) WITHOUT ROWID"
+)
+_SELECT = "SELECT snapshot FROM sessions WHERE session_id = ?"
+_UPSERT = "INSERT OR REPLACE INTO sessions (session_id, snapshot) VALUES (?, ?)"
+_DELETE = "DELETE FROM sessions WHERE session_id = ?"
+_COUNT = "SELECT COUNT(*) FROM sessions"
+
+
+class SessionStore:
+    """
+    Base class for session snapshot stores.
+
+    Subclasses implement load(), save_many() and delete(); flush() and
+    close() are no-ops unless the store buffers writes.
+    """
+
+    def load(self, session_id: str) -> Optional[bytes]:
+        """
+        Get the saved snapshot of a session.
+
+        Args:
+            session_id: ID of the session
+
+        Returns:
+            The snapshot bytes, or None if the session is not stored
+        """
+        raise NotImplementedError
+
+    def save(self, session_id: str, snapshot: bytes) -> None:
+        """
+        Store the snapshot of a session, replacing any earlier one.
+
+        Args:
+            session_id: ID of the session
+            snapshot: Snapshot bytes from DialogueManager.snapshot()
+        """
+        self.save_many([(session_id, snapshot)])
+
+    def save_many(self, items: Iterable[Tuple[str, bytes]]) -> None:
+        """
+        Store many snapshots at once.
+
+        Args:
+            items: (session ID, snapshot bytes) pairs
+        """
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> None:
+        """
+        Forget a session.
+
+        Args:
+            session_id: ID of the session
+        """
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Write out any buffered changes."""
+
+    def close(self) -> None:
+        """Write out buffered changes and release resources."""
+        self.flush()
+
+    def save_session(self, session_id: str, manager) -> bool:
+        """
+        Snapshot a DialogueManager and store it.
+
+        Args:
+            session_id: ID of the session
+            manager: The session to save
+
+        Returns:
+            bool: True if the session was saved, False if it has no dialogue
+                or cannot be saved
+        """
+        snapshot = manager.snapshot()
+        if snapshot is None:
+            return False
+
+        self.save(session_id, snapshot)
+        return True
+
+    def restore_session(self, session_id: str, manager) -> bool:
+        """
+        Restore a stored session into a DialogueManager.
+
+        The manager must already have the session's dialogue loaded.
+
+        Args:
+            session_id: ID of the session
+            manager: The manager to restore into
+
+        Returns:
+            bool: True if the session was found and restored
+        """
+        snapshot = self.load(session_id)
+        if snapshot is None:
+            return False
+
+        return manager.restore(snapshot)
+
+
+class MemorySessionStore(SessionStore):
+    """Session store kept in a dict, for tests and single-process use."""
+
+    def __init__(self):
+        self._snapshots: Dict[str, bytes] = {}
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
+
+    def load(self, session_id: str) -> Optional[bytes]:
+        return self._snapshots.get(session_id)
+
+    def save_many(self, items: Iterable[Tuple[str, bytes]]) -> None:
+        self._snapshots.update(items)
+
+    def delete(self, session_id: str) -> None:
+        self._snapshots.pop(session_id, None)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Write-behind session store backed by SQLite in WAL mode."""
+
+    def __init__(self, path: str, flush_interval: float = 0.05, cache_size: int = 10000,
+                 max_pending: int = 50000):
+        """
+        Open or create a session database.
+
+        Args:
+            path: Database file path
+            flush_interval: Seconds between group commits of dirty sessions;
+                0 writes through on every save
+            cache_size: Number of clean snapshots kept in memory for load()
+            max_pending: Flush early once this many sessions are dirty
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.cache_size = cache_size
+        self.max_pending = max_pending
+
+        self._connection = sqlite3.connect(path, check_same_thread=False,
+                                           isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        # With WAL, NORMAL only syncs at checkpoints and is still crash-safe
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(_CREATE_TABLE)
+
+        # Session ID -> snapshot waiting to be written, None for a delete
+        self._dirty: Dict[str, Optional[bytes]] = {}
+        # Recently used clean snapshots, least recently used first
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+
+        # Guards _dirty and _cache; _db_lock serializes use of the connection
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+
+        self._wake = threading.Event()
+        self._closed = False
+        self._writer: Optional[threading.Thread] = None
+        if flush_interval > 0:
+            self._writer = threading.Thread(target=self._write_loop,
+                                            name="SQLiteSessionStore", daemon=True)
+            self._writer.start()
+
+        # Statistics
+        self.commits = 0
+        self.sessions_written = 0
+
+    def __len__(self) -> int:
+        """Number of stored sessions, including unflushed ones."""
+        self.flush()
+        with self._db_lock:
+            return self._connection.execute(_COUNT).fetchone()[0]
+
+    @property
+    def pending(self) -> int:
+        """Number of sessions waiting to be written."""
+        return len(self._dirty)
+
+    def load(self, session_id: str) -> Optional[bytes]:
+        with self._lock:
+            if session_id in self._dirty:
+                return self._dirty[session_id]
+
+            snapshot = self._cache.get(session_id)
+            if snapshot is not None:
+                self._cache.move_to_end(session_id)
+                return snapshot
+
+        with self._db_lock:
+            row = self._connection.execute(_SELECT, (session_id,)).fetchone()
+        if row is None:
+            return None
+
+        snapshot = bytes(row[0])
+        with self._lock:
+            # A save may have raced with the read; it wins
+            if session_id not in self._dirty:
+                self._remember(session_id, snapshot)
+        return snapshot
+
+    def save_many(self, items: Iterable[Tuple[str, bytes]]) -> None:
+        self._check_open()
+        with self._lock:
+            dirty = self._dirty
+            for session_id, snapshot in items:
+                dirty[session_id] = snapshot
+                self._cache.pop(session_id, None)
+            pending = len(dirty)
+
+        if self._writer is None:
+            self.flush()
+        elif pending >= self.max_pending:
+            self._wake.set()
+
+    def delete(self, session_id: str) -> None:
+        self._check_open()
+        with self._lock:
+            self._dirty[session_id] = None
+            self._cache.pop(session_id, None)
+
+        if self._writer is None:
+            self.flush()
+
+    def flush(self) -> None:
+        """Commit every dirty session in one transaction."""
+        with self._db_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, {}
+            if not dirty:
+                return
+
+            writes = [(key, value) for key, value in dirty.items() if value is not None]
+            deletes = [(key,) for key, value in dirty.items() if value is None]
+
+            connection = self._connection
+            try:
+                connection.execute("BEGIN")
+                if writes:
+                    connection.executemany(_UPSERT, writes)
+                if deletes:
+                    connection.executemany(_DELETE, deletes)
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                with self._lock:
+                    # Keep the failed writes unless they were saved again since
+                    for key, value in dirty.items():
+                        self._dirty.setdefault(key, value)
+                raise
+
+            self.commits += 1
+            self.sessions_written += len(dirty)
+
+        with self._lock:
+            for session_id, snapshot in writes:
+                if session_id not in self._dirty:
+                    self._remember(session_id, snapshot)
+
+    def close(self) -> None:
+        """Stop the writer thread, commit pending sessions and close the database."""
+        if self._closed:
+            return
+
+        self._closed = True
+        if self._writer is not None:
+            self._wake.set()
+            self._writer.join()
+        self.flush()
+        with self._db_lock:
+            self._connection.close()
+
+    def _remember(self, session_id: str, snapshot: bytes) -> None:
+        """Add a clean snapshot to the cache. Call with _lock held."""
+        if self.cache_size <= 0:
+            return
+
+        self._cache[session_id] = snapshot
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _check_open(self) -> None:
+        if self._closed:
+            raise ValueError("Session store is closed")
+
+    def _write_loop(self) -> None:
+        """Group-commit dirty sessions until the store is closed."""
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"Error writing sessions: {e}")
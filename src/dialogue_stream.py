@@ -0,0 +1,179 @@
+"""
+Dialogue Stream - Incremental loader for very large dialogue files.
+
+json.load reads the whole file into one string and builds the complete
+document before a graph can be compiled from it. The streaming loader
+instead reads the file in chunks and decodes the "dialogues" array one node
+at a time. Each node is turned into a compact record (see dialogue_records)
+as soon as it is decoded, so only one parsed node and a single chunk of text
+are held in memory besides the records the graph keeps.
+"""
+import json
+from typing import Any, Dict, IO, Iterator, List, Tuple
+
+from dialogue_graph import DialogueGraph
+from dialogue_records import StringPool, compact_node, gc_paused
+
+# Default number of characters read from the file at a time
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+_WHITESPACE = " \t\n\r"
+
+
+class _ChunkReader:
+    """Incremental JSON tokenizer over a text stream."""
+
+    def __init__(self, stream: IO[str], chunk_size: int):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        # json.load shares equal object keys within one document, but that
+        # memo is reset on every raw_decode call; keep one for the whole file
+        # so each node does not hold its own copies of "id", "text", ...
+        keys: Dict[str, str] = {}
+        self.decoder = json.JSONDecoder(
+            object_pairs_hook=lambda pairs: {keys.setdefault(k, k): v for k, v in pairs}
+        )
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, min_size: int = 0) -> bool:
+        """Read more text, dropping what has already been consumed."""
+        if self.eof:
+            return False
+
+        chunk = self.stream.read(max(self.chunk_size, min_size))
+        if not chunk:
+            self.eof = True
+            return False
+
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of dialogue file")
+
+    def expect(self, char: str) -> None:
+        """Consume the next non-whitespace character, which must be char."""
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' but found '{found}' in dialogue file")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # The value may continue past the buffer; read at least as much
+                # again so a large value is not re-decoded once per chunk
+                if not self._fill(len(self.buffer) - self.pos):
+                    raise
+                continue
+
+            # A number at the end of the buffer may still have more digits
+            if end == len(self.buffer) and not self.eof and isinstance(value, (int, float)):
+                if self._fill():
+                    continue
+
+            self.pos = end
+            return value
+
+    def array_items(self) -> Iterator[Any]:
+        """Decode the items of a JSON array one at a time."""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+
+        while True:
+            yield self.value()
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("]")
+            return
+
+
+def iter_dialogue_file(file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE
+                       ) -> Iterator[Tuple[str, Any]]:
+    """
+    Stream the top-level fields of a dialogue file.
+
+    The "dialogues" field is yielded as ("dialogues", None), followed by
+    each element of its array as ("dialogue", node). All other fields are
+    yielded as (key, value).
+
+    Args:
+        file_path: Path to the JSON dialogue file
+        chunk_size: Number of characters to read at a time
+
+    Yields:
+        (key, value) pairs in file order
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        reader = _ChunkReader(f, chunk_size)
+        reader.expect("{")
+        if reader.peek() == "}":
+            return
+
+        while True:
+            key = reader.value()
+            if not isinstance(key, str):
+                raise ValueError("Invalid dialogue file structure")
+            reader.expect(":")
+
+            if key == "dialogues":
+                yield key, None
+                for node in reader.array_items():
+                    yield "dialogue", node
+            else:
+                yield key, reader.value()
+
+            if reader.peek() == ",":
+                reader.pos += 1
+                continue
+            reader.expect("}")
+            return
+
+
+def load_graph_streaming(file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> DialogueGraph:
+    """
+    Compile a dialogue file without materializing the whole document.
+
+    Args:
+        file_path: Path to the JSON dialogue file
+        chunk_size: Number of characters to read at a time
+
+    Returns:
+        The compiled DialogueGraph
+
+    Raises:
+        ValueError: If the file is not a valid dialogue file
+    """
+    data: Dict[str, Any] = {}
+    dialogues: List[Dict] = []
+    pool = StringPool()
+
+    with gc_paused():
+        for key, value in iter_dialogue_file(file_path, chunk_size):
+            if key == "dialogue":
+                if not isinstance(value, dict) or "id" not in value:
+                    raise ValueError("Invalid dialogue file structure")
+                dialogues.append(compact_node(value, pool))
+            elif key == "dialogues":
+                data[key] = dialogues
+            elif key in ("starting_dialogue", "quests", "variables"):
+                data[key] = value
+
+        return DialogueGraph.from_data(data, compact=True)
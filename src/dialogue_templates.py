@@ -0,0 +1,261 @@
+"""
+Dialogue Templates - Variable substitution in dialogue and response text.
+
+Node and response texts may contain placeholders such as {player_name} or
+{gold}, which show the session's variable values. Write {{ and }} for
+literal braces. A placeholder whose variable is not set is shown as it is.
+
+Templates are parsed once, when the dialogue is loaded, into a tuple of
+segments, so rendering one is a single join. Texts without braces are not
+templates and are never copied. A text whose braces do not form valid
+placeholders is shown unchanged; validate_graph() reports it.
+
+The templates of a node and its responses are grouped in a NodeText, which
+knows every variable they read. Each graph has a RenderCache shared by its
+sessions that keeps rendered texts per (node, values of those variables) in
+a bounded LRU, so the many sessions showing a node with the same values
+render it once.
+"""
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+# Number of compiled templates kept by compile_template()
+MAX_COMPILED_TEMPLATES = 4096
+
+# Default number of rendered node texts kept by a RenderCache
+DEFAULT_RENDER_CACHE_SIZE = 4096
+
+_PART = re.compile(r"\{\{|\}\}|\{([A-Za-z_][A-Za-z0-9_.]*)\}|[{}]")
+
+# Value of a variable that is not set
+_MISSING: Any = object()
+
+# Rendered node text and response texts; None where the text is static
+RenderedText = Tuple[Optional[str], Tuple[Optional[str], ...]]
+
+
+class Template:
+    """A compiled text template."""
+
+    __slots__ = ("source", "segments", "variables")
+
+    def __init__(self, source: str, segments: Tuple[str, ...], variables: Tuple[str, ...]):
+        self.source = source
+        # Literal text at even positions, variable names at odd positions
+        self.segments = segments
+        # Names of the variables the template reads, without repeats
+        self.variables = variables
+
+    def render(self, variables: Dict[str, Any]) -> str:
+        """
+        Substitute variable values into the template.
+
+        Args:
+            variables: Variable values of the session
+
+        Returns:
+            The rendered text
+        """
+        parts = list(self.segments)
+        for i in range(1, len(parts), 2):
+            value = variables.get(parts[i], _MISSING)
+            parts[i] = "{" + parts[i] + "}" if value is _MISSING else format_value(value)
+        return "".join(parts)
+
+    def __repr__(self) -> str:
+        return f"Template({self.source!r})"
+
+
+class NodeText:
+    """The templates of a node's text and of its responses' texts."""
+
+    __slots__ = ("text", "responses", "variables")
+
+    def __init__(self, text: Optional[Template], responses: Tuple[Optional[Template], ...]):
+        self.text = text
+        # One template (or None) per response in list order
+        self.responses = responses
+
+        names: Dict[str, None] = {}
+        for template in (text,) + responses:
+            if template is not None:
+                names.update(dict.fromkeys(template.variables))
+        # Every variable the rendered texts depend on
+        self.variables: Tuple[str, ...] = tuple(names)
+
+    def render(self, variables: Dict[str, Any]) -> RenderedText:
+        """
+        Render every template of the node.
+
+        Args:
+            variables: Variable values of the session
+
+        Returns:
+            The node text and one text per response, None where the text
+            is static
+        """
+        return (
+            self.text.render(variables) if self.text is not None else None,
+            tuple(template.render(variables) if template is not None else None
+                  for template in self.responses),
+        )
+
+
+class RenderCache:
+    """Bounded LRU of rendered node texts, shared by the sessions of a graph."""
+
+    def __init__(self, max_entries: int = DEFAULT_RENDER_CACHE_SIZE):
+        """
+        Create an empty cache.
+
+        Args:
+            max_entries: Maximum number of rendered nodes kept
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # (node index, variable values, their types) -> rendered texts
+        self._rendered: "OrderedDict[Tuple, RenderedText]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._rendered)
+
+    def render(self, node_index: int, node_text: NodeText,
+               variables: Dict[str, Any]) -> RenderedText:
+        """
+        Render a node's texts, reusing an earlier result for the same values.
+
+        Args:
+            node_index: Index of the dialogue node
+            node_text: Templates of the node
+            variables: Variable values of the session
+
+        Returns:
+            The node text and one text per response, None where the text
+            is static
+        """
+        values = tuple(variables.get(name, _MISSING) for name in node_text.variables)
+        # Types keep e.g. 1, 1.0 and True apart, which compare equal
+        key = (node_index, values, tuple(map(type, values)))
+
+        try:
+            with self._lock:
+                rendered = self._rendered.get(key)
+                if rendered is not None:
+                    self._rendered.move_to_end(key)
+                    self.hits += 1
+                    return rendered
+        except TypeError:
+            # Unhashable values, such as lists, are rendered every time
+            return node_text.render(variables)
+
+        rendered = node_text.render(variables)
+        with self._lock:
+            self.misses += 1
+            self._rendered[key] = rendered
+            while len(self._rendered) > self.max_entries:
+                self._rendered.popitem(last=False)
+        return rendered
+
+    def clear(self) -> None:
+        """Forget every rendered text."""
+        with self._lock:
+            self._rendered.clear()
+
+
+@lru_cache(maxsize=MAX_COMPILED_TEMPLATES)
+def compile_template(source: str) -> Template:
+    """
+    Compile a text template.
+
+    Results are memoized, so repeated texts share one compiled Template.
+
+    Args:
+        source: The text
+
+    Returns:
+        The compiled template
+
+    Raises:
+        ValueError: If a brace is not part of a placeholder or an escape
+    """
+    segments = [""]
+    names: Dict[str, None] = {}
+    position = 0
+    for match in _PART.finditer(source):
+        segments[-1] += source[position:match.start()]
+        position = match.end()
+
+        part = match.group()
+        name = match.group(1)
+        if name is not None:
+            segments.extend((name, ""))
+            names[name] = None
+        elif part in ("{{", "}}"):
+            segments[-1] += part[0]
+        else:
+            raise ValueError(f"Unmatched '{part}' at position {match.start()} of {source!r}")
+    segments[-1] += source[position:]
+
+    return Template(source, tuple(segments), tuple(names))
+
+
+def text_template(text: Any) -> Optional[Template]:
+    """
+    Get the compiled template of a text.
+
+    Args:
+        text: A node or response text
+
+    Returns:
+        The template, or None if the text is static or not a valid template
+    """
+    if type(text) is not str or ("{" not in text and "}" not in text):
+        return None
+
+    try:
+        return compile_template(text)
+    except ValueError:
+        return None
+
+
+def node_text(node: Dict) -> Optional[NodeText]:
+    """
+    Compile the templates of a node and its responses.
+
+    Args:
+        node: The dialogue node
+
+    Returns:
+        The node's templates, or None if all of its texts are static
+    """
+    text = text_template(node.get("text"))
+    responses = tuple(text_template(response.get("text"))
+                      for response in node.get("responses") or ())
+    if text is None and not any(responses):
+        return None
+
+    return NodeText(text, responses)
+
+
+def format_value(value: Any) -> str:
+    """
+    Format a variable value for display.
+
+    Args:
+        value: The value
+
+    Returns:
+        true/false for booleans, an empty string for null, str() otherwise
+    """
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if value is None:
+        return ""
+    return str(value)
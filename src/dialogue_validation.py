@@ -0,0 +1,945 @@
+"""
+Dialogue Validation - Whole-graph checks for dialogue trees.
+
+validate_graph() makes a fixed number of linear passes over a dialogue graph
+(edge collection, a BFS from the start, a reverse BFS from the endings and an
+iterative Tarjan SCC pass), so it runs in O(V + E) even on very large trees.
+
+IncrementalValidator keeps the same results up to date while a document is
+edited, revisiting only the part of the graph an edit can affect.
+
+Problems that break a conversation are errors. Structural oddities that may
+be intentional, such as unreachable nodes or a conversation that loops
+forever, are warnings.
+"""
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from dialogue_conditions import compile_condition
+from dialogue_quests import update_quest
+from dialogue_scripts import default_registry
+from dialogue_templates import compile_template
+
+# Severities
+ERROR = "error"
+WARNING = "warning"
+
+# Issue codes
+MISSING_START = "missing_start"
+DANGLING_REFERENCE = "dangling_reference"
+DUPLICATE_NODE = "duplicate_node"
+DUPLICATE_RESPONSE = "duplicate_response"
+INVALID_CONDITION = "invalid_condition"
+INVALID_TEMPLATE = "invalid_template"
+INVALID_LOCALE_TABLE = "invalid_locale_table"
+MISSING_TRANSLATION = "missing_translation"
+UNUSED_TRANSLATION = "unused_translation"
+UNKNOWN_SCRIPT = "unknown_script"
+UNKNOWN_QUEST = "unknown_quest"
+UNREACHABLE_NODE = "unreachable_node"
+DEAD_END_CYCLE = "dead_end_cycle"
+NO_ENDING = "no_ending"
+
+
+class ValidationIssue(NamedTuple):
+    """A single problem found in a dialogue tree."""
+
+    severity: str
+    code: str
+    message: str
+    dialogue_id: Optional[str] = None
+    response_id: Optional[str] = None
+    # Other dialogue IDs involved, e.g. the members of a cycle
+    related: Tuple[str, ...] = ()
+
+
+def validate_graph(graph) -> List[ValidationIssue]:
+    """
+    Validate a whole dialogue graph.
+
+    A node counts as an ending if it has no responses or has a response
+    without a next_dialogue, which ends the conversation.
+
+    Args:
+        graph: A DialogueGraph, LazyDialogueGraph or BinaryDialogueGraph
+
+    Returns:
+        List of issues, errors first, empty if the tree is clean
+    """
+    errors: List[ValidationIssue] = []
+    warnings: List[ValidationIssue] = []
+
+    node_ids = graph.node_ids
+    node_index = graph.node_index
+    count = len(node_ids)
+
+    if graph.starting_index < 0:
+        errors.append(ValidationIssue(
+            ERROR, MISSING_START,
+            f"Starting dialogue '{graph.starting_dialogue_id}' not found",
+            graph.starting_dialogue_id or None
+        ))
+
+    for dialogue_id in getattr(graph, "duplicate_node_ids", ()):
+        errors.append(ValidationIssue(
+            ERROR, DUPLICATE_NODE,
+            f"Dialogue ID '{dialogue_id}' is used by more than one node; "
+            f"only the last one is kept",
+            dialogue_id
+        ))
+
+    # Collect edges, references and endings in one pass over all responses
+    edges: List[List[int]] = [[] for _ in range(count)]
+    reverse_edges: List[List[int]] = [[] for _ in range(count)]
+    is_ending = bytearray(count)
+
+    registry = getattr(graph, "script_registry", default_registry)
+    quest_stages = _quest_stages(graph.quests.values())
+
+    def add_script_issues(dialogue_id: str, response_id: Optional[str], script) -> None:
+        for issue in _script_issues(registry, quest_stages, dialogue_id, response_id, script):
+            (errors if issue.severity == ERROR else warnings).append(issue)
+
+    for index, dialogue_id in enumerate(node_ids):
+        node = graph.node(index)
+        add_script_issues(dialogue_id, None, node.get("on_entry"))
+        warnings.extend(_template_issues(dialogue_id, node))
+
+        responses = node.get("responses") or []
+        if not responses:
+            is_ending[index] = 1
+
+        seen_responses = set()
+        for response in responses:
+            response_id = response.get("id")
+            if response_id in seen_responses:
+                errors.append(ValidationIssue(
+                    ERROR, DUPLICATE_RESPONSE,
+                    f"Dialogue '{dialogue_id}' has more than one response with ID "
+                    f"'{response_id}'",
+                    dialogue_id, response_id
+                ))
+            seen_responses.add(response_id)
+
+            condition_error = _condition_error(dialogue_id, response)
+            if condition_error:
+                errors.append(condition_error)
+            add_script_issues(dialogue_id, response_id, response.get("script"))
+
+            next_dialogue = response.get("next_dialogue")
+            if not next_dialogue:
+                is_ending[index] = 1
+                continue
+
+            target = node_index.get(next_dialogue)
+            if target is None:
+                errors.append(ValidationIssue(
+                    ERROR, DANGLING_REFERENCE,
+                    f"Dialogue '{dialogue_id}' references non-existent dialogue "
+                    f"'{next_dialogue}'",
+                    dialogue_id, response_id, (next_dialogue,)
+                ))
+                continue
+
+            edges[index].append(target)
+            reverse_edges[target].append(index)
+
+    # Forward reachability from the starting dialogue
+    reachable = _reach([graph.starting_index] if graph.starting_index >= 0 else [], edges, count)
+    for index in range(count):
+        if not reachable[index]:
+            warnings.append(ValidationIssue(
+                WARNING, UNREACHABLE_NODE,
+                f"Dialogue '{node_ids[index]}' can never be reached from the start",
+                node_ids[index]
+            ))
+
+    # Backward reachability from every ending
+    can_end = _reach([i for i in range(count) if is_ending[i]], reverse_edges, count)
+
+    # Cycles that players can enter but never leave
+    in_dead_end_cycle = bytearray(count)
+    for component in strongly_connected_components(edges, count):
+        first = component[0]
+        is_cycle = len(component) > 1 or first in edges[first]
+        if not is_cycle or can_end[first] or not reachable[first]:
+            continue
+
+        members = set(component)
+        if any(target not in members for i in component for target in edges[i]):
+            # The cycle has a way out, which leads to another dead end
+            continue
+
+        ids = tuple(sorted(node_ids[i] for i in component))
+        for i in component:
+            in_dead_end_cycle[i] = 1
+        warnings.append(ValidationIssue(
+            WARNING, DEAD_END_CYCLE,
+            f"Dialogue cycle {', '.join(repr(i) for i in ids)} has no way out "
+            f"and no ending",
+            ids[0], None, ids
+        ))
+
+    for index in range(count):
+        if reachable[index] and not can_end[index] and not in_dead_end_cycle[index]:
+            warnings.append(ValidationIssue(
+                WARNING, NO_ENDING,
+                f"Dialogue '{node_ids[index]}' can never lead to an ending",
+                node_ids[index]
+            ))
+
+    return errors + warnings
+
+
+def validate_locale(graph, table) -> List[ValidationIssue]:
+    """
+    Check a text table against the dialogue structure.
+
+    Every npc_name, text and response text of the structure should have a
+    translation. Translations of dialogues or responses that do not exist
+    are reported as unused, and translated texts are checked as templates.
+
+    Args:
+        graph: A DialogueGraph, LazyDialogueGraph or BinaryDialogueGraph
+        table: A dialogue_locale.LocaleTable
+
+    Returns:
+        List of warnings, empty if the table is complete
+    """
+    locale = table.locale
+    issues: List[ValidationIssue] = []
+
+    for index, dialogue_id in enumerate(graph.node_ids):
+        node = graph.node(index)
+        entry = table.dialogues.get(dialogue_id)
+        if not isinstance(entry, dict):
+            entry = {}
+        translated = entry.get("responses")
+        if not isinstance(translated, dict):
+            translated = {}
+
+        for field in ("npc_name", "text"):
+            if node.get(field) and field not in entry:
+                issues.append(ValidationIssue(
+                    WARNING, MISSING_TRANSLATION,
+                    f"Dialogue '{dialogue_id}' {field} has no '{locale}' translation",
+                    dialogue_id
+                ))
+
+        response_ids = set()
+        for response in node.get("responses") or []:
+            response_id = response.get("id")
+            response_ids.add(response_id)
+            if response.get("text") and response_id not in translated:
+                issues.append(ValidationIssue(
+                    WARNING, MISSING_TRANSLATION,
+                    f"Dialogue '{dialogue_id}' response '{response_id}' has no "
+                    f"'{locale}' translation",
+                    dialogue_id, response_id
+                ))
+
+        for response_id in translated:
+            if response_id not in response_ids:
+                issues.append(ValidationIssue(
+                    WARNING, UNUSED_TRANSLATION,
+                    f"'{locale}' translation of response '{response_id}' of dialogue "
+                    f"'{dialogue_id}' matches no response",
+                    dialogue_id, response_id
+                ))
+
+        if entry:
+            localized = {"text": entry.get("text"), "responses": [
+                {"id": response_id, "text": text} for response_id, text in translated.items()
+            ]}
+            issues.extend(_template_issues(dialogue_id, localized, locale))
+
+    node_index = graph.node_index
+    for dialogue_id in table.dialogues:
+        if dialogue_id not in node_index:
+            issues.append(ValidationIssue(
+                WARNING, UNUSED_TRANSLATION,
+                f"'{locale}' translation of dialogue '{dialogue_id}' matches no dialogue",
+                dialogue_id
+            ))
+
+    return issues
+
+
+def _condition_error(dialogue_id: str, response: Dict) -> Optional[ValidationIssue]:
+    """Report a response condition that does not compile."""
+    condition = response.get("condition")
+    if not condition:
+        return None
+
+    try:
+        compile_condition(condition)
+    except (ValueError, TypeError) as e:
+        return ValidationIssue(
+            ERROR, INVALID_CONDITION,
+            f"Dialogue '{dialogue_id}' response '{response.get('id')}' has an invalid "
+            f"condition: {e}",
+            dialogue_id, response.get("id")
+        )
+    return None
+
+
+def _template_issues(dialogue_id: str, node: Dict,
+                     locale: Optional[str] = None) -> List[ValidationIssue]:
+    """Warn about node and response texts with braces that are not placeholders."""
+    texts = [(None, node.get("text"))]
+    texts.extend((response.get("id"), response.get("text"))
+                 for response in node.get("responses") or [])
+
+    issues = []
+    for response_id, text in texts:
+        if type(text) is not str or ("{" not in text and "}" not in text):
+            continue
+        try:
+            compile_template(text)
+        except ValueError as e:
+            where = f"response '{response_id}'" if response_id is not None else "text"
+            if locale is not None:
+                where = f"'{locale}' {where}"
+            issues.append(ValidationIssue(
+                WARNING, INVALID_TEMPLATE,
+                f"Dialogue '{dialogue_id}' {where} is shown unchanged: {e}",
+                dialogue_id, response_id
+            ))
+    return issues
+
+
+def _script_issues(registry, quest_stages: Dict[str, Set], dialogue_id: str,
+                   response_id: Optional[str], script) -> List[ValidationIssue]:
+    """
+    Report script commands that are unknown or malformed, and warn about
+    quests and quest stages the dialogue does not define.
+    """
+    compiled = registry.compile(script)
+    if compiled is None:
+        return []
+
+    where = f"response '{response_id}'" if response_id is not None else "on_entry"
+    issues = [
+        ValidationIssue(
+            ERROR, UNKNOWN_SCRIPT,
+            f"Dialogue '{dialogue_id}' {where} has an invalid script: {reason}",
+            dialogue_id, response_id
+        )
+        for reason in compiled.unknown
+    ]
+
+    for quest_id in compiled.quests:
+        if quest_id not in quest_stages:
+            issues.append(ValidationIssue(
+                WARNING, UNKNOWN_QUEST,
+                f"Dialogue '{dialogue_id}' {where} uses undefined quest '{quest_id}'",
+                dialogue_id, response_id
+            ))
+
+    for handler, arguments in compiled.effects:
+        if handler is not update_quest:
+            continue
+        quest_id, stage = arguments
+        stages = quest_stages.get(quest_id)
+        if stages and stage not in stages:
+            issues.append(ValidationIssue(
+                WARNING, UNKNOWN_QUEST,
+                f"Dialogue '{dialogue_id}' {where} moves quest '{quest_id}' to "
+                f"undefined stage {stage!r}",
+                dialogue_id, response_id
+            ))
+
+    return issues
+
+
+def _quest_stages(quests: Iterable[Dict]) -> Dict[str, Set]:
+    """Quest ID -> IDs of its defined stages."""
+    return {
+        quest["id"]: {stage.get("id") for stage in quest.get("stages") or []}
+        for quest in quests
+    }
+
+
+def _reach(sources: List[int], edges: List[List[int]], count: int) -> bytearray:
+    """Breadth-first search; returns a flag per node reached from sources."""
+    seen = bytearray(count)
+    queue = deque()
+    for source in sources:
+        if not seen[source]:
+            seen[source] = 1
+            queue.append(source)
+
+    while queue:
+        for target in edges[queue.popleft()]:
+            if not seen[target]:
+                seen[target] = 1
+                queue.append(target)
+
+    return seen
+
+
+def strongly_connected_components(edges: List[List[int]], count: int) -> List[List[int]]:
+    """Iterative Tarjan's algorithm, safe for very deep graphs."""
+    index_of = [-1] * count
+    low = [0] * count
+    on_stack = bytearray(count)
+    stack: List[int] = []
+    components: List[List[int]] = []
+    counter = 0
+
+    for root in range(count):
+        if index_of[root] >= 0:
+            continue
+
+        # Each frame is (node, position of the next edge to follow)
+        work = [(root, 0)]
+        index_of[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = 1
+
+        while work:
+            node, position = work[-1]
+            node_edges = edges[node]
+
+            if position < len(node_edges):
+                work[-1] = (node, position + 1)
+                target = node_edges[position]
+                if index_of[target] < 0:
+                    index_of[target] = low[target] = counter
+                    counter += 1
+                    stack.append(target)
+                    on_stack[target] = 1
+                    work.append((target, 0))
+                elif on_stack[target]:
+                    low[node] = min(low[node], index_of[target])
+                continue
+
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+
+            if low[node] == index_of[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = 0
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+
+    return components
+
+
+class IncrementalValidator:
+    """
+    Validator that keeps its results up to date as a document is edited.
+
+    It works directly on the editable dialogue document (the dict with
+    "starting_dialogue" and a "dialogues" list) and keeps reverse references,
+    reachability from the start and reachability of an ending. Every edit
+    operation only revisits the nodes and edges whose state can change, so
+    small edits stay fast on very large trees.
+
+    Call the matching method after each edit: node_added, node_removed,
+    responses_changed, fields_changed or starting_changed.
+    """
+
+    def __init__(self, data: Optional[Dict] = None):
+        """
+        Build the validation state for a document.
+
+        Args:
+            data: Dialogue document to validate
+        """
+        self.reset(data or {"starting_dialogue": "", "dialogues": []})
+
+    def reset(self, data: Dict) -> None:
+        """
+        Rebuild all state from scratch for a new document.
+
+        Args:
+            data: Dialogue document to validate
+        """
+        self.starting_id: str = data.get("starting_dialogue") or ""
+
+        # Quest ID -> defined stage IDs, for checking quest scripts
+        self.quest_stages: Dict[str, Set] = _quest_stages(data.get("quests") or [])
+
+        # Node ID -> node; later nodes with a duplicate ID win
+        self.nodes: Dict[str, Dict] = {}
+        self.duplicate_nodes: Set[str] = set()
+
+        # Node ID -> targets of its responses (resolved or not)
+        self.out_edges: Dict[str, List[str]] = {}
+
+        # Target ID -> IDs of the nodes with a response pointing at it
+        self.refs: Dict[str, Set[str]] = {}
+
+        # Targets that are referenced but do not exist
+        self.missing_targets: Set[str] = set()
+
+        self.endings: Set[str] = set()
+        self.duplicate_responses: Dict[str, List[str]] = {}
+        # Issues in a node's own fields: invalid conditions and templates,
+        # unknown scripts, undefined quests
+        self.node_errors: Dict[str, List[ValidationIssue]] = {}
+
+        self.reachable: Set[str] = set()
+        self.can_end: Set[str] = set()
+
+        # Witness depths of marked nodes. Every marked node other than a root
+        # has a marked neighbour with a smaller depth, which proves it is
+        # still reachable without a full search.
+        self._start_depth: Dict[str, int] = {}
+        self._end_depth: Dict[str, int] = {}
+
+        # Derived sets kept in step with reachable and can_end
+        self.unreachable: Set[str] = set()
+        self.stuck: Set[str] = set()
+
+        self._cached_issues: Optional[List[ValidationIssue]] = None
+
+        for node in data.get("dialogues", []):
+            if node["id"] in self.nodes:
+                self.duplicate_nodes.add(node["id"])
+            self.nodes[node["id"]] = node
+
+        for node_id in self.nodes:
+            self._index_responses(node_id)
+
+        if self.starting_id in self.nodes:
+            self._grow([self.starting_id], forward=True)
+
+        # Rebuild the derived sets so they start compact; a set that once
+        # held every node stays slow to iterate even when nearly empty
+        self.unreachable = {n for n in self.nodes if n not in self.reachable}
+        self.stuck = {n for n in self.reachable if n not in self.can_end}
+
+    # Edit notifications
+
+    def node_added(self, node: Dict) -> None:
+        """
+        Record a node appended to the document.
+
+        Args:
+            node: The new node
+        """
+        node_id = node["id"]
+        if node_id in self.nodes:
+            self.duplicate_nodes.add(node_id)
+            self.node_removed(node_id, keep_duplicate=True)
+
+        self._cached_issues = None
+        self.nodes[node_id] = node
+        self.unreachable.add(node_id)
+        self.missing_targets.discard(node_id)
+
+        self._index_responses(node_id)
+
+        # Responses that pointed at the missing ID now lead somewhere
+        sources = list(self.refs.get(node_id, ()))
+        if node_id == self.starting_id or any(s in self.reachable for s in sources):
+            self._grow([node_id], forward=True)
+        if node_id in self.can_end:
+            self._grow(sources, forward=False)
+
+    def node_removed(self, node_id: str, keep_duplicate: bool = False) -> None:
+        """
+        Record that a node was deleted from the document.
+
+        Args:
+            node_id: ID of the deleted node
+            keep_duplicate: Internal; keep the duplicate-ID record
+        """
+        if node_id not in self.nodes:
+            return
+
+        self._cached_issues = None
+        if not keep_duplicate:
+            self.duplicate_nodes.discard(node_id)
+
+        # Dropping the node's own responses updates everything it leads to
+        self._set_edges(node_id, [])
+        del self.out_edges[node_id]
+        self.endings.discard(node_id)
+        self.duplicate_responses.pop(node_id, None)
+        self.node_errors.pop(node_id, None)
+
+        could_end = node_id in self.can_end
+
+        self._mark(node_id, True, None)
+        self._mark(node_id, False, None)
+        del self.nodes[node_id]
+        self.unreachable.discard(node_id)
+        if node_id in self.refs:
+            self.missing_targets.add(node_id)
+
+        # Responses leading here are now dangling
+        if could_end:
+            self._shrink(list(self.refs.get(node_id, ())), forward=False)
+
+    def responses_changed(self, node_id: str) -> None:
+        """
+        Record that responses of a node were added, removed or retargeted.
+
+        Args:
+            node_id: ID of the edited node
+        """
+        if node_id not in self.nodes:
+            return
+
+        self._cached_issues = None
+        self._index_responses(node_id)
+
+    def fields_changed(self, node_id: str) -> None:
+        """
+        Record that texts, conditions or scripts of a node or its responses
+        changed, without changing where the responses lead.
+
+        Args:
+            node_id: ID of the edited node
+        """
+        if node_id not in self.nodes:
+            return
+
+        self._cached_issues = None
+        self._set_node_errors(node_id, self._node_errors(node_id))
+
+    def starting_changed(self, starting_id: str) -> None:
+        """
+        Record a new starting dialogue.
+
+        Args:
+            starting_id: ID of the new starting dialogue
+        """
+        old_start = self.starting_id
+        if starting_id == old_start:
+            return
+
+        self._cached_issues = None
+        self.starting_id = starting_id or ""
+
+        if old_start in self.nodes:
+            self._shrink([old_start], forward=True)
+        if self.starting_id in self.nodes:
+            self._grow([self.starting_id], forward=True)
+
+    def referencing_nodes(self, node_id: str) -> List[str]:
+        """
+        Get the nodes that have a response leading to a node.
+
+        Args:
+            node_id: ID of the target node
+
+        Returns:
+            IDs of the referencing nodes
+        """
+        return list(self.refs.get(node_id, ()))
+
+    # Results
+
+    def issues(self) -> List[ValidationIssue]:
+        """
+        Get the current validation issues.
+
+        The result is cached until the next edit, and building it only
+        touches the nodes that actually have problems.
+
+        Returns:
+            List of issues, errors first, in the same form as validate_graph
+        """
+        if self._cached_issues is not None:
+            return self._cached_issues
+
+        errors: List[ValidationIssue] = []
+        warnings: List[ValidationIssue] = []
+
+        if self.starting_id not in self.nodes:
+            errors.append(ValidationIssue(
+                ERROR, MISSING_START,
+                f"Starting dialogue '{self.starting_id}' not found",
+                self.starting_id or None
+            ))
+
+        for node_id in sorted(self.duplicate_nodes):
+            errors.append(ValidationIssue(
+                ERROR, DUPLICATE_NODE,
+                f"Dialogue ID '{node_id}' is used by more than one node; "
+                f"only the last one is kept",
+                node_id
+            ))
+
+        for node_id in sorted(self.duplicate_responses):
+            for response_id in self.duplicate_responses[node_id]:
+                errors.append(ValidationIssue(
+                    ERROR, DUPLICATE_RESPONSE,
+                    f"Dialogue '{node_id}' has more than one response with ID "
+                    f"'{response_id}'",
+                    node_id, response_id
+                ))
+
+        for node_id in sorted(self.node_errors):
+            for issue in self.node_errors[node_id]:
+                (errors if issue.severity == ERROR else warnings).append(issue)
+
+        for target in sorted(self.missing_targets):
+            for source in sorted(self.refs[target]):
+                for response in self.nodes[source].get("responses") or []:
+                    if response.get("next_dialogue") == target:
+                        errors.append(ValidationIssue(
+                            ERROR, DANGLING_REFERENCE,
+                            f"Dialogue '{source}' references non-existent dialogue "
+                            f"'{target}'",
+                            source, response.get("id"), (target,)
+                        ))
+
+        for node_id in sorted(self.unreachable):
+            warnings.append(ValidationIssue(
+                WARNING, UNREACHABLE_NODE,
+                f"Dialogue '{node_id}' can never be reached from the start",
+                node_id
+            ))
+
+        warnings.extend(self._stuck_issues())
+
+        self._cached_issues = errors + warnings
+        return self._cached_issues
+
+    def _stuck_issues(self) -> List[ValidationIssue]:
+        """Group reachable nodes that cannot end into dead-end cycles."""
+        # Successors of a stuck node are stuck too, so the stuck nodes form
+        # a closed subgraph and their SCCs can be found on their own
+        stuck = sorted(self.stuck)
+        position = {node_id: i for i, node_id in enumerate(stuck)}
+        edges = [
+            [position[t] for t in self.out_edges.get(node_id, []) if t in position]
+            for node_id in stuck
+        ]
+
+        issues = []
+        in_cycle = set()
+        for component in strongly_connected_components(edges, len(stuck)):
+            first = component[0]
+            if len(component) == 1 and first not in edges[first]:
+                continue
+
+            members = set(component)
+            if any(target not in members for i in component for target in edges[i]):
+                continue
+
+            ids = tuple(sorted(stuck[i] for i in component))
+            in_cycle.update(ids)
+            issues.append(ValidationIssue(
+                WARNING, DEAD_END_CYCLE,
+                f"Dialogue cycle {', '.join(repr(i) for i in ids)} has no way out "
+                f"and no ending",
+                ids[0], None, ids
+            ))
+
+        for node_id in stuck:
+            if node_id not in in_cycle:
+                issues.append(ValidationIssue(
+                    WARNING, NO_ENDING,
+                    f"Dialogue '{node_id}' can never lead to an ending",
+                    node_id
+                ))
+
+        return issues
+
+    # Internal bookkeeping
+
+    def _index_responses(self, node_id: str) -> None:
+        """Re-read a node's responses and hooks and apply the differences."""
+        responses = self.nodes[node_id].get("responses") or []
+
+        targets = []
+        seen = set()
+        duplicates = []
+        is_ending = not responses
+        for response in responses:
+            response_id = response.get("id")
+            if response_id in seen:
+                duplicates.append(response_id)
+            seen.add(response_id)
+
+            next_dialogue = response.get("next_dialogue")
+            if next_dialogue:
+                targets.append(next_dialogue)
+            else:
+                is_ending = True
+
+        if duplicates:
+            self.duplicate_responses[node_id] = duplicates
+        else:
+            self.duplicate_responses.pop(node_id, None)
+
+        self._set_node_errors(node_id, self._node_errors(node_id))
+        self._set_edges(node_id, targets)
+
+        if is_ending and node_id not in self.endings:
+            self.endings.add(node_id)
+            self._grow([node_id], forward=False)
+        elif not is_ending and node_id in self.endings:
+            self.endings.discard(node_id)
+            self._shrink([node_id], forward=False)
+
+    def _node_errors(self, node_id: str) -> List[ValidationIssue]:
+        """Check the fields of a node and its responses."""
+        node = self.nodes[node_id]
+        node_errors = _script_issues(default_registry, self.quest_stages, node_id, None,
+                                     node.get("on_entry"))
+        node_errors.extend(_template_issues(node_id, node))
+        for response in node.get("responses") or []:
+            condition_error = _condition_error(node_id, response)
+            if condition_error:
+                node_errors.append(condition_error)
+            node_errors.extend(_script_issues(default_registry, self.quest_stages, node_id,
+                                              response.get("id"), response.get("script")))
+        return node_errors
+
+    def _set_node_errors(self, node_id: str, node_errors: List[ValidationIssue]) -> None:
+        """Store the issues found in a node's fields."""
+        if node_errors:
+            self.node_errors[node_id] = node_errors
+        else:
+            self.node_errors.pop(node_id, None)
+
+    def _set_edges(self, node_id: str, targets: List[str]) -> None:
+        """Replace the outgoing edges of a node, updating reachability."""
+        old = set(self.out_edges.get(node_id, ()))
+        new = dict.fromkeys(targets)
+        self.out_edges[node_id] = targets
+
+        removed = [t for t in old if t not in new]
+        added = [t for t in new if t not in old]
+
+        for target in removed:
+            sources = self.refs[target]
+            sources.discard(node_id)
+            if not sources:
+                del self.refs[target]
+                self.missing_targets.discard(target)
+        for target in added:
+            self.refs.setdefault(target, set()).add(node_id)
+            if target not in self.nodes:
+                self.missing_targets.add(target)
+
+        # Edges that appeared can only extend reachability
+        if node_id in self.reachable:
+            self._grow([t for t in added if t in self.nodes], forward=True)
+        if any(t in self.can_end for t in added):
+            self._grow([node_id], forward=False)
+
+        # Edges that disappeared can only reduce it
+        live_removed = [t for t in removed if t in self.nodes]
+        if node_id in self.reachable and live_removed:
+            self._shrink(live_removed, forward=True)
+        if node_id in self.can_end and any(t in self.can_end for t in live_removed):
+            self._shrink([node_id], forward=False)
+
+    def _neighbours(self, node_id: str, forward: bool) -> List[str]:
+        """Existing successors (forward) or predecessors of a node."""
+        if forward:
+            return [t for t in self.out_edges.get(node_id, []) if t in self.nodes]
+        return [s for s in self.refs.get(node_id, ()) if s in self.nodes]
+
+    def _is_root(self, node_id: str, forward: bool) -> bool:
+        """Whether a node is marked regardless of its neighbours."""
+        return node_id == self.starting_id if forward else node_id in self.endings
+
+    def _mark(self, node_id: str, forward: bool, depth: Optional[int]) -> None:
+        """Set or clear (depth None) a reachability flag and the derived sets."""
+        marked = self.reachable if forward else self.can_end
+        depths = self._start_depth if forward else self._end_depth
+        if depth is not None:
+            marked.add(node_id)
+            depths[node_id] = depth
+        else:
+            marked.discard(node_id)
+            depths.pop(node_id, None)
+
+        if node_id in self.reachable:
+            self.unreachable.discard(node_id)
+        else:
+            self.unreachable.add(node_id)
+
+        if node_id in self.reachable and node_id not in self.can_end:
+            self.stuck.add(node_id)
+        else:
+            self.stuck.discard(node_id)
+
+    def _grow(self, seeds: List[str], forward: bool) -> None:
+        """Mark everything newly reachable from seeds."""
+        marked = self.reachable if forward else self.can_end
+        depths = self._start_depth if forward else self._end_depth
+
+        queue = deque()
+        for seed in seeds:
+            if seed in self.nodes and seed not in marked:
+                if self._is_root(seed, forward):
+                    depth = 0
+                else:
+                    depth = 1 + min(
+                        (depths[p] for p in self._neighbours(seed, not forward) if p in marked),
+                        default=0
+                    )
+                self._mark(seed, forward, depth)
+                queue.append(seed)
+
+        while queue:
+            node_id = queue.popleft()
+            depth = depths[node_id] + 1
+            for neighbour in self._neighbours(node_id, forward):
+                if neighbour not in marked:
+                    self._mark(neighbour, forward, depth)
+                    queue.append(neighbour)
+
+    def _shrink(self, starts: List[str], forward: bool) -> None:
+        """
+        Recheck the nodes that may have lost their path through starts.
+
+        A node keeps its mark while it is a root or has a marked neighbour
+        with a smaller witness depth. Nodes without one are collected,
+        following edges to larger depths only, so the work is limited to
+        the nodes whose every witness went through the change. Those are
+        unmarked and re-marked from any that still have a marked neighbour.
+        """
+        marked = self.reachable if forward else self.can_end
+        depths = self._start_depth if forward else self._end_depth
+        orphans: Set[str] = set()
+
+        def supported(node_id: str) -> bool:
+            if self._is_root(node_id, forward):
+                return True
+            depth = depths[node_id]
+            return any(
+                p in marked and p not in orphans and depths[p] < depth
+                for p in self._neighbours(node_id, not forward)
+            )
+
+        queue = deque()
+        for start in starts:
+            if start in marked and start not in orphans and not supported(start):
+                orphans.add(start)
+                queue.append(start)
+
+        while queue:
+            node_id = queue.popleft()
+            depth = depths[node_id]
+            for neighbour in self._neighbours(node_id, forward):
+                if (neighbour in marked and neighbour not in orphans
+                        and depths[neighbour] > depth and not supported(neighbour)):
+                    orphans.add(neighbour)
+                    queue.append(neighbour)
+
+        for node_id in orphans:
+            self._mark(node_id, forward, None)
+
+        seeds = [
+            node_id for node_id in orphans
+            if any(p in marked for p in self._neighbours(node_id, not forward))
+        ]
+        self._grow(seeds, forward)
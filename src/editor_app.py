@@ -7,6 +7,8 @@ import json
 import os
 import uuid
 from dialogue_lib import DialogueManager
+from dialogue_document import DialogueDocument
+from dialogue_validation import ERROR
 
 # Define constants
 DEFAULT_NEW_DIALOGUE = {
@@ -32,6 +34,9 @@ def initialize_session_state():
     if "dialogue_data" not in st.session_state:
         st.session_state.dialogue_data = DEFAULT_NEW_DIALOGUE.copy()
         
+    if "document" not in st.session_state:
+        st.session_state.document = DialogueDocument(st.session_state.dialogue_data)
+        
     if "edit_mode" not in st.session_state:
         st.session_state.edit_mode = "tree"  # Options: "tree", "node", "response"
         
@@ -50,9 +55,11 @@ def load_dialogue_file(file_path):
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
             st.session_state.dialogue_data = json.load(f)
+        st.session_state.document = DialogueDocument(st.session_state.dialogue_data)
             
-        # Also load into the manager for validation
-        success = st.session_state.manager.load_dialogue_file(file_path)
+        # Also load into the manager for validation. It gets its own copy,
+        # since the document edits dialogue_data in place
+        success = st.session_state.manager.load_dialogue_data(st.session_state.dialogue_data)
         
         if success:
             st.session_state.dialogue_loaded = True
@@ -70,7 +77,7 @@ def save_dialogue_file(file_path):
         # Ensure the dialogues are in the correct format
         if not st.session_state.dialogue_data.get("starting_dialogue") and st.session_state.dialogue_data.get("dialogues"):
             # Set first dialogue as starting dialogue if not set
-            st.session_state.dialogue_data["starting_dialogue"] = st.session_state.dialogue_data["dialogues"][0]["id"]
+            st.session_state.document.set_starting_dialogue(st.session_state.dialogue_data["dialogues"][0]["id"])
         
         with open(file_path, 'w', encoding='utf-8') as f:
             json.dump(st.session_state.dialogue_data, f, indent=2)
@@ -84,20 +91,21 @@ def save_dialogue_file(file_path):
 
 def create_new_dialogue():
     """Create a new blank dialogue tree"""
-    st.session_state.dialogue_data = DEFAULT_NEW_DIALOGUE.copy()
+    st.session_state.document = DialogueDocument()
+    st.session_state.dialogue_data = st.session_state.document.data
     st.session_state.dialogue_loaded = True
     st.session_state.modified = True
     st.session_state.selected_node_id = None
     
     # Add the first dialogue node
     first_node_id = generate_id()
-    st.session_state.dialogue_data["dialogues"].append({
+    st.session_state.document.add_node({
         "id": first_node_id,
         "npc_name": "Character",
         "text": "Enter dialogue text here.",
         "responses": []
     })
-    st.session_state.dialogue_data["starting_dialogue"] = first_node_id
+    st.session_state.document.set_starting_dialogue(first_node_id)
     st.session_state.selected_node_id = first_node_id
 
 
@@ -112,28 +120,26 @@ def add_new_dialogue_node():
         "responses": []
     }
     
-    st.session_state.dialogue_data["dialogues"].append(new_node)
+    st.session_state.document.add_node(new_node)
     st.session_state.modified = True
     return new_id
 
 
 def add_response_to_node(node_id):
     """Add a new response to a dialogue node"""
-    for node in st.session_state.dialogue_data["dialogues"]:
-        if node["id"] == node_id:
-            new_response_id = generate_id("resp")
-            
-            # Create a new dialogue node for this response to connect to
-            new_node_id = add_new_dialogue_node()
-            
-            node["responses"].append({
-                "id": new_response_id,
-                "text": "Enter response text",
-                "next_dialogue": new_node_id
-            })
-            
-            st.session_state.modified = True
-            break
+    if st.session_state.document.get_node(node_id):
+        new_response_id = generate_id("resp")
+        
+        # Create a new dialogue node for this response to connect to
+        new_node_id = add_new_dialogue_node()
+        
+        st.session_state.document.add_response(node_id, {
+            "id": new_response_id,
+            "text": "Enter response text",
+            "next_dialogue": new_node_id
+        })
+        
+        st.session_state.modified = True
 
 
 def delete_node(node_id):
@@ -143,18 +149,8 @@ def delete_node(node_id):
         st.error("Cannot delete the starting dialogue node. Set another node as starting first.")
         return False
     
-    # Remove the node
-    st.session_state.dialogue_data["dialogues"] = [
-        node for node in st.session_state.dialogue_data["dialogues"] 
-        if node["id"] != node_id
-    ]
-    
-    # Remove any responses pointing to this node
-    for node in st.session_state.dialogue_data["dialogues"]:
-        node["responses"] = [
-            resp for resp in node["responses"]
-            if resp["next_dialogue"] != node_id
-        ]
+    # Remove the node and any responses pointing to it
+    st.session_state.document.delete_node(node_id)
     
     st.session_state.modified = True
     st.session_state.selected_node_id = None
@@ -163,32 +159,19 @@ def delete_node(node_id):
 
 def delete_response(node_id, response_id):
     """Delete a response from a dialogue node"""
-    for node in st.session_state.dialogue_data["dialogues"]:
-        if node["id"] == node_id:
-            node["responses"] = [
-                resp for resp in node["responses"]
-                if resp["id"] != response_id
-            ]
-            st.session_state.modified = True
-            break
+    if st.session_state.document.get_node(node_id):
+        st.session_state.document.delete_response(node_id, response_id)
+        st.session_state.modified = True
 
 
 def get_node_by_id(node_id):
     """Get a dialogue node by its ID"""
-    for node in st.session_state.dialogue_data["dialogues"]:
-        if node["id"] == node_id:
-            return node
-    return None
+    return st.session_state.document.get_node(node_id)
 
 
 def get_response_by_id(node_id, response_id):
     """Get a response by its ID within a node"""
-    node = get_node_by_id(node_id)
-    if node:
-        for resp in node["responses"]:
-            if resp["id"] == response_id:
-                return resp
-    return None
+    return st.session_state.document.get_response(node_id, response_id)
 
 
 def render_tree_view():
@@ -236,7 +219,7 @@ def render_tree_view():
             # Set as starting node button
             if st.session_state.dialogue_data["starting_dialogue"] != st.session_state.selected_node_id:
                 if st.button("Set as Starting Node", use_container_width=True):
-                    st.session_state.dialogue_data["starting_dialogue"] = st.session_state.selected_node_id
+                    st.session_state.document.set_starting_dialogue(st.session_state.selected_node_id)
                     st.session_state.modified = True
                     st.experimental_rerun()
             
@@ -273,8 +256,7 @@ def render_node_editor():
         # Show any other node properties here for editing
         
         if st.form_submit_button("Save Changes"):
-            node["npc_name"] = new_npc_name
-            node["text"] = new_text
+            st.session_state.document.update_node(node["id"], npc_name=new_npc_name, text=new_text)
             st.session_state.modified = True
             st.success("Node updated successfully")
     
@@ -284,6 +266,8 @@ def render_node_editor():
     if len(node["responses"]) == 0:
         st.info("This node has no responses. Add one below.")
     
+    next_dialogue_options = st.session_state.document.next_dialogue_options()
+    
     # Display existing responses
     for i, response in enumerate(node["responses"]):
         with st.expander(f"Response {i+1}: {response['text'][:30]}...", expanded=True):
@@ -292,17 +276,14 @@ def render_node_editor():
                                                value=response["text"], 
                                                key=f"response_text_{i}")
                 
-                # Dropdown for next dialogue selection
-                next_dialogue_options = [("", "- Select -")] + [
-                    (d["id"], f"{d['id']} ({d['npc_name']}: {d['text'][:20]}...)")
-                    for d in st.session_state.dialogue_data["dialogues"]
-                ]
+                # Dropdown for next dialogue selection, shared by all responses
+                option_ids, option_labels, option_positions = next_dialogue_options
                 
                 next_dialogue = st.selectbox(
                     "Next Dialogue", 
-                    options=[o[0] for o in next_dialogue_options],
-                    format_func=lambda x: next(o[1] for o in next_dialogue_options if o[0] == x),
-                    index=next((idx for idx, o in enumerate(next_dialogue_options) if o[0] == response["next_dialogue"]), 0),
+                    options=option_ids,
+                    format_func=option_labels.get,
+                    index=option_positions.get(response["next_dialogue"], 0),
                     key=f"next_dialogue_{i}"
                 )
                 
@@ -312,9 +293,10 @@ def render_node_editor():
                 delete_clicked = col2.form_submit_button("Delete Response", type="secondary")
                 
                 if save_clicked:
-                    response["text"] = new_response_text
+                    fields = {"text": new_response_text}
                     if next_dialogue:
-                        response["next_dialogue"] = next_dialogue
+                        fields["next_dialogue"] = next_dialogue
+                    st.session_state.document.update_response(node["id"], response["id"], **fields)
                     st.session_state.modified = True
                     st.success("Response updated")
                 
@@ -341,13 +323,10 @@ def render_dialogue_preview():
     # This involves recreating the manager with the current data
     manager = DialogueManager()
     
-    # Use a temporary file to store the dialogue data for testing
-    temp_path = ".temp_dialogue_preview.json"
     try:
-        with open(temp_path, 'w', encoding='utf-8') as f:
-            json.dump(st.session_state.dialogue_data, f)
-        
-        success = manager.load_dialogue_file(temp_path)
+        # The preview only reads the document, so it can share it in memory;
+        # it is compiled again on every render, so edits are never stale
+        success = manager.load_dialogue_data(st.session_state.dialogue_data, copy_data=False)
         if success:
             # Display the current dialogue
             dialogue = manager.get_current_dialogue()
@@ -364,59 +343,73 @@ def render_dialogue_preview():
             st.error("Preview not available - dialogue has errors")
     except Exception as e:
         st.error(f"Error in preview: {str(e)}")
-    finally:
-        # Clean up the temporary file
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
 
 
 def render_dialogue_validator():
     """Render dialogue validation results"""
     st.header("Validation")
     
-    # Create a temporary dialogue manager for validation
-    manager = DialogueManager()
+    # The validator is kept up to date by every edit, so this is cheap
+    issues = st.session_state.document.issues()
+    errors = [issue.message for issue in issues if issue.severity == ERROR]
+    warnings = [issue.message for issue in issues if issue.severity != ERROR]
     
-    # Create a temporary file to load
-    temp_path = ".temp_dialogue_validation.json"
-    try:
-        with open(temp_path, 'w', encoding='utf-8') as f:
-            json.dump(st.session_state.dialogue_data, f)
+    if errors:
+        st.error("Validation failed")
+        for error in errors:
+            st.warning(error)
+    else:
+        st.success("Dialogue tree is valid! No errors found.")
         
-        success = manager.load_dialogue_file(temp_path)
-        if success:
-            errors = manager.validate_dialogue_tree()
-            if errors:
-                st.error("Validation failed")
-                for error in errors:
-                    st.warning(error)
-            else:
-                st.success("Dialogue tree is valid! No errors found.")
-                
-                # Additional statistics
-                st.markdown("### Dialogue Statistics")
-                num_nodes = len(st.session_state.dialogue_data["dialogues"])
-                
-                # Count total responses
-                total_responses = sum(len(node["responses"]) for node in st.session_state.dialogue_data["dialogues"])
-                
-                # Identify terminal nodes (nodes with no responses)
-                terminal_nodes = [node["id"] for node in st.session_state.dialogue_data["dialogues"] 
-                                if len(node["responses"]) == 0]
-                
-                st.markdown(f"- **Total nodes:** {num_nodes}")
-                st.markdown(f"- **Total responses:** {total_responses}")
-                st.markdown(f"- **Terminal nodes:** {len(terminal_nodes)}")
-                if terminal_nodes:
-                    st.markdown("  Terminal node IDs:")
-                    for node_id in terminal_nodes:
-                        st.markdown(f"  - {node_id}")
-        else:
-            st.error("Validation failed - Unable to load dialogue data into manager")
-    finally:
-        # Clean up the temporary file
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+        if warnings:
+            st.markdown("### Warnings")
+            for warning in warnings:
+                st.info(warning)
+        
+        # Additional statistics
+        st.markdown("### Dialogue Statistics")
+        num_nodes = len(st.session_state.dialogue_data["dialogues"])
+        
+        # Count total responses
+        total_responses = sum(len(node["responses"]) for node in st.session_state.dialogue_data["dialogues"])
+        
+        # Identify terminal nodes (nodes with no responses)
+        terminal_nodes = [node["id"] for node in st.session_state.dialogue_data["dialogues"] 
+                        if len(node["responses"]) == 0]
+        
+        st.markdown(f"- **Total nodes:** {num_nodes}")
+        st.markdown(f"- **Total responses:** {total_responses}")
+        st.markdown(f"- **Terminal nodes:** {len(terminal_nodes)}")
+        if terminal_nodes:
+            st.markdown("  Terminal node IDs:")
+            for node_id in terminal_nodes:
+                st.markdown(f"  - {node_id}")
+        
+        # Path analytics are cached by the document until the tree changes
+        paths = st.session_state.document.path_analytics()
+        depths = [depth for depth in paths.depth if depth >= 0]
+        if depths:
+            st.markdown(f"- **Maximum depth:** {max(depths)} choices")
+        
+        required = paths.required_nodes()
+        if required:
+            st.markdown("- **Nodes on every playthrough:** " + ", ".join(required))
+        
+        endings = paths.ending_summary()
+        if endings:
+            st.markdown("### Paths to Endings")
+            st.markdown("Loops are counted once; endings marked with + can also be "
+                        "reached by going round a loop, so they have unlimited paths.")
+            st.table([
+                {
+                    "Ending": ending["id"],
+                    "Paths": f"{ending['paths']}{'+' if ending['unbounded'] else ''}",
+                    "Shortest": ending["shortest"] if ending["shortest"] >= 0 else "-",
+                    "Longest": ("unlimited" if ending["unbounded"]
+                                else ending["longest"] if ending["longest"] >= 0 else "-"),
+                }
+                for ending in endings
+            ])
 
 
 def main():
@@ -7,39 +7,34 @@ import json
 import os
 from dialogue_lib import DialogueManager
 
+# Number of past dialogues shown above the current one
+HISTORY_SIZE = 50
+
 
 def initialize_session_state():
     """Initialize Streamlit session state variables"""
     if "manager" not in st.session_state:
-        st.session_state.manager = DialogueManager()
+        # The manager keeps a bounded history of visited dialogues
+        st.session_state.manager = DialogueManager(history_size=HISTORY_SIZE + 1)
     
     if "dialogue_loaded" not in st.session_state:
         st.session_state.dialogue_loaded = False
     
     if "current_dialogue" not in st.session_state:
         st.session_state.current_dialogue = None
-    
-    if "dialogue_history" not in st.session_state:
-        st.session_state.dialogue_history = []
 
 
 def load_dialogue_file(file_path):
     """Load dialogue from file path"""
-    success = st.session_state.manager.load_dialogue_file(file_path)
+    # The compiled graph is cached per process and shared by all sessions
+    # until the file changes on disk
+    if not st.session_state.manager.load_dialogue_file(file_path):
+        return False
     
-    if success:
-        st.session_state.dialogue_loaded = True
-        st.session_state.current_dialogue = st.session_state.manager.get_current_dialogue()
-        st.session_state.dialogue_history = []
-        
-        # Add first dialogue to history
-        if st.session_state.current_dialogue:
-            st.session_state.dialogue_history.append({
-                "npc_name": st.session_state.current_dialogue["npc_name"],
-                "text": st.session_state.current_dialogue["text"]
-            })
+    st.session_state.dialogue_loaded = True
+    st.session_state.current_dialogue = st.session_state.manager.get_current_dialogue()
     
-    return success
+    return True
 
 
 def handle_response(response_id):
@@ -47,29 +42,13 @@ def handle_response(response_id):
     success = st.session_state.manager.choose_response(response_id)
     
     if success:
-        new_dialogue = st.session_state.manager.get_current_dialogue()
-        st.session_state.current_dialogue = new_dialogue
-        
-        if new_dialogue:
-            # Add to dialogue history
-            st.session_state.dialogue_history.append({
-                "npc_name": new_dialogue["npc_name"],
-                "text": new_dialogue["text"]
-            })
+        st.session_state.current_dialogue = st.session_state.manager.get_current_dialogue()
 
 
 def reset_dialogue():
     """Reset to the starting dialogue"""
     st.session_state.manager.reset_dialogue()
     st.session_state.current_dialogue = st.session_state.manager.get_current_dialogue()
-    st.session_state.dialogue_history = []
-    
-    # Add first dialogue to history
-    if st.session_state.current_dialogue:
-        st.session_state.dialogue_history.append({
-            "npc_name": st.session_state.current_dialogue["npc_name"],
-            "text": st.session_state.current_dialogue["text"]
-        })
 
 
 def main():
@@ -152,8 +131,11 @@ def main():
     else:
         # Display dialogue interface
         
+        manager = st.session_state.manager
+        
         # Display dialogue history
-        for i, entry in enumerate(st.session_state.dialogue_history[:-1]):
+        for dialogue_id in manager.get_history()[:-1]:
+            entry = manager.dialogues[dialogue_id]
             st.markdown(
                 f'<div class="history-box">'
                 f'<span class="npc-name">[{entry["npc_name"]}]</span><br>'
@@ -164,7 +146,7 @@ def main():
         
         # Display current dialogue
         if st.session_state.current_dialogue:
-            current = st.session_state.dialogue_history[-1]
+            current = st.session_state.current_dialogue
             st.markdown(
                 f'<div class="dialogue-box">'
                 f'<span class="npc-name">[{current["npc_name"]}]</span><br>'
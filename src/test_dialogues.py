@@ -2,6 +2,7 @@
 Test script for dialogue files.
 """
 from dialogue_lib import DialogueManager
+from dialogue_validation import ERROR, WARNING
 
 
 def test_dialogue_file(file_path):
@@ -17,14 +18,21 @@ def test_dialogue_file(file_path):
     print("Dialogue loaded successfully!")
     
     # Validate the dialogue tree
-    errors = manager.validate_dialogue_tree()
+    issues = manager.get_validation_issues()
+    errors = [issue for issue in issues if issue.severity == ERROR]
+    warnings = [issue for issue in issues if issue.severity == WARNING]
     if errors:
         print("Validation errors:")
         for error in errors:
-            print(f"- {error}")
+            print(f"- {error.message}")
     else:
         print("Dialogue tree is valid. No errors found.")
     
+    if warnings:
+        print("Validation warnings:")
+        for warning in warnings:
+            print(f"- {warning.message}")
+    
     # Display the first dialogue
     dialogue = manager.get_current_dialogue()
     if dialogue:
@@ -0,0 +1,5 @@
+"""Make the modules in src/ importable from the tests."""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
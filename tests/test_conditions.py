@@ -0,0 +1,122 @@
+"""Tests for the condition parser and evaluator."""
+import pytest
+
+from dialogue_conditions import DialogueState, compile_condition, response_condition
+
+
+def holds(source, variables=None, quests=None):
+    return compile_condition(source)(DialogueState(variables, quests))
+
+
+@pytest.mark.parametrize("source, variables, expected", [
+    ("gold >= 10", {"gold": 10}, True),
+    ("gold >= 10", {"gold": 9}, False),
+    ("gold > 1.5", {"gold": 2}, True),
+    ("gold < -1", {"gold": -2}, True),
+    ("name == 'Pixel'", {"name": "Pixel"}, True),
+    ('name != "Pixel"', {"name": "Pixel"}, False),
+    ("met_pixel == true", {"met_pixel": True}, True),
+    ("met_pixel == null", {}, True),
+    ("not met_pixel", {}, True),
+    ("a and b", {"a": True, "b": False}, False),
+    ("a or b", {"a": False, "b": True}, True),
+    ("not a or b and c", {"a": True, "b": True, "c": True}, True),
+    ("not (a or b)", {"a": False, "b": True}, False),
+    ("a AND NOT b", {"a": True, "b": False}, True),
+])
+def test_expressions(source, variables, expected):
+    assert holds(source, variables) is expected
+
+
+@pytest.mark.parametrize("source, variables", [
+    ("name > 3", {"name": "Pixel"}),
+    ("3 <= name", {"name": "Pixel"}),
+    ("gold >= 10", {}),
+    ("gold < 10", {"gold": None}),
+    ("items > 0", {"items": [1]}),
+])
+def test_unorderable_comparisons_are_false(source, variables):
+    assert holds(source, variables) is False
+
+
+def test_quest_functions():
+    quests = {"tutorial": {"current_stage": 2, "completed": False},
+              "escape": {"current_stage": 3, "completed": True}}
+
+    assert holds("quest_active(tutorial)", quests=quests)
+    assert not holds("quest_active(escape)", quests=quests)
+    assert not holds("quest_active(missing)", quests=quests)
+    assert holds("quest_complete('escape')", quests=quests)
+    assert holds("quest_stage(tutorial) > 1", quests=quests)
+    assert holds("quest_stage(missing) == 0", quests=quests)
+
+
+@pytest.mark.parametrize("source, variables, expected", [
+    ("QuestActive_tutorial", {}, False),
+    ("VariableEquals_likes_typewriter_true", {"likes_typewriter": True}, True),
+    ("VariableEquals_mood_happy", {"mood": "happy"}, True),
+    ("VariableNotEquals_gold_5", {"gold": 5}, False),
+])
+def test_legacy_conditions(source, variables, expected):
+    assert holds(source, variables) is expected
+
+
+def test_dependencies():
+    condition = compile_condition("gold >= 10 and quest_active(tutorial) or 'x' == name")
+    assert condition.dependencies == {"gold", "name", "quest:tutorial"}
+
+
+@pytest.mark.parametrize("source", [
+    "gold >=",
+    "(gold > 1",
+    "gold > 1)",
+    "gold $ 1",
+    "unknown_function(x)",
+    "quest_active()",
+    "VariableEquals_x",
+])
+def test_invalid_conditions(source):
+    with pytest.raises(ValueError):
+        compile_condition(source)
+
+
+def test_invalid_response_condition_never_holds():
+    condition = response_condition({"id": "r", "condition": "gold >="})
+    assert condition is not None
+    assert condition(DialogueState({"gold": 100})) is False
+    assert response_condition({"id": "r"}) is None
+
+
+def test_cached_results_follow_dependencies():
+    condition = compile_condition("gold >= 10")
+    state = DialogueState({"gold": 5})
+    assert state.check(condition) is False
+
+    state.set_variable("other", 1)
+    assert state.check(condition) is False
+
+    state.set_variable("gold", 10)
+    assert state.check(condition) is True
+    assert state.check(None) is True
+
+
+def test_mixed_types_do_not_escape_the_manager():
+    from dialogue_lib import DialogueManager
+
+    manager = DialogueManager()
+    assert manager.load_dialogue_data({
+        "starting_dialogue": "start",
+        "variables": {"name": "Pixel"},
+        "dialogues": [{
+            "id": "start", "npc_name": "N", "text": "Hi",
+            "responses": [
+                {"id": "greater", "text": "A", "condition": "name > 3", "next_dialogue": "start"},
+                {"id": "plain", "text": "B", "next_dialogue": "start"},
+            ],
+        }],
+    })
+
+    responses = manager.get_current_dialogue()["responses"]
+    assert [response["id"] for response in responses] == ["plain"]
+    assert not manager.choose_response("greater")
+    assert manager.choose_response("plain")
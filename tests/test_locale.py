@@ -0,0 +1,126 @@
+"""Tests for per-locale text tables."""
+import json
+
+import pytest
+
+from dialogue_lib import DialogueManager
+from dialogue_validation import INVALID_LOCALE_TABLE
+
+STRUCTURE = {
+    "starting_dialogue": "start",
+    "dialogues": [{
+        "id": "start", "npc_name": "Guide", "text": "Welcome",
+        "responses": [
+            {"id": "ask", "text": "What is this?", "next_dialogue": None},
+            {"id": "leave", "text": "Bye", "next_dialogue": None},
+        ],
+    }],
+}
+TABLES = {
+    "en": {"start": {"text": "Welcome, traveller",
+                     "responses": {"ask": "What is this place?"}}},
+    "fr": {"start": {"npc_name": "Guide FR", "text": "Bienvenue"}},
+}
+
+
+@pytest.fixture
+def tree(tmp_path):
+    path = tmp_path / "t.json"
+    path.write_text(json.dumps(STRUCTURE), encoding="utf-8")
+    for locale, dialogues in TABLES.items():
+        (tmp_path / f"t.{locale}.json").write_text(
+            json.dumps({"locale": locale, "dialogues": dialogues}), encoding="utf-8")
+    return path
+
+
+def manager_for(path):
+    manager = DialogueManager()
+    assert manager.load_dialogue_file(str(path), use_cache=False)
+    return manager
+
+
+def texts(manager):
+    dialogue = manager.get_current_dialogue()
+    return dialogue["npc_name"], dialogue["text"], [r["text"] for r in dialogue["responses"]]
+
+
+def test_tables_are_discovered_and_loaded_lazily(tree):
+    manager = manager_for(tree)
+    catalog = manager.graph.locales
+    assert catalog.locales == ("en", "fr")
+    assert catalog.loaded_locales == ()
+
+    assert texts(manager) == ("Guide", "Welcome", ["What is this?", "Bye"])
+    assert catalog.loaded_locales == ()
+
+
+def test_fallback_order(tree):
+    manager = manager_for(tree)
+    assert manager.set_locale("fr")
+    # fr table, then the en table, then the structure file
+    assert texts(manager) == ("Guide FR", "Bienvenue", ["What is this place?", "Bye"])
+
+    assert manager.set_locale(None)
+    assert texts(manager) == ("Guide", "Welcome", ["What is this?", "Bye"])
+
+
+def test_unknown_locale_is_refused(tree, capsys):
+    manager = manager_for(tree)
+    assert not manager.set_locale("de")
+    assert "No text table" in capsys.readouterr().out
+    assert manager.locale is None
+
+
+def test_set_locale_checks_the_default_table(tree, capsys):
+    (tree.parent / "t.en.json").write_text("{broken", encoding="utf-8")
+    manager = manager_for(tree)
+    assert not manager.set_locale("fr")
+    assert "locale 'en'" in capsys.readouterr().out
+
+
+def test_table_broken_after_eviction_falls_back(tree, capsys):
+    manager = manager_for(tree)
+    assert manager.set_locale("fr")
+    assert texts(manager)[1] == "Bienvenue"
+
+    catalog = manager.graph.locales
+    catalog.evict()
+    (tree.parent / "t.en.json").write_text("{broken", encoding="utf-8")
+    manager.state.set_variable("seen", True)
+
+    assert texts(manager) == ("Guide FR", "Bienvenue", ["What is this?", "Bye"])
+    assert "locale 'en'" in capsys.readouterr().out
+
+    # Reported once, not on every read
+    manager.state.set_variable("seen", False)
+    texts(manager)
+    assert capsys.readouterr().out == ""
+
+    # Fixed and evicted, the table is used again
+    (tree.parent / "t.en.json").write_text(
+        json.dumps({"locale": "en", "dialogues": TABLES["en"]}), encoding="utf-8")
+    catalog.evict("en")
+    manager.state.set_variable("seen", True)
+    assert texts(manager)[2] == ["What is this place?", "Bye"]
+
+
+def test_removed_table_falls_back_to_the_structure(tree, capsys):
+    manager = manager_for(tree)
+    assert manager.set_locale("fr")
+    manager.graph.locales.evict()
+    (tree.parent / "t.fr.json").unlink()
+    manager.state.set_variable("seen", True)
+
+    assert texts(manager) == ("Guide", "Welcome, traveller", ["What is this place?", "Bye"])
+    assert "locale 'fr'" in capsys.readouterr().out
+
+
+def test_locale_issues(tree):
+    manager = manager_for(tree)
+    issues = manager.get_locale_issues("fr")
+    assert {issue.code for issue in issues} == {"missing_translation"}
+
+    (tree.parent / "t.fr.json").write_text("[]", encoding="utf-8")
+    manager.graph.locales.evict()
+    issues = manager.get_locale_issues("fr")
+    assert [issue.code for issue in issues] == [INVALID_LOCALE_TABLE]
@@ -0,0 +1,64 @@
+"""Tests for the pre-fork dialogue server."""
+import os
+import signal
+import time
+
+import pytest
+
+from dialogue_graph import DialogueGraph
+from dialogue_prefork import PreforkServer
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork()")
+
+DATA = {
+    "starting_dialogue": "start",
+    "dialogues": [
+        {"id": "start", "npc_name": "N", "text": "Hi", "responses": [
+            {"id": "end", "text": "Bye", "next_dialogue": None},
+        ]},
+    ],
+}
+
+
+def is_running(pid):
+    """Whether a process exists and has not yet exited."""
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            # The state follows the parenthesised command name
+            return stat.read().rsplit(")", 1)[1].split()[0] not in ("Z", "X")
+    except FileNotFoundError:
+        return False
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="needs /proc")
+def test_workers_exit_when_the_parent_dies():
+    read_end, write_end = os.pipe()
+    parent = os.fork()
+    if parent == 0:
+        # Stand-in for the pre-fork parent: start the workers, report their
+        # PIDs and wait to be killed
+        os.close(read_end)
+        server = PreforkServer(DialogueGraph.from_data(DATA), workers=2, port=0)
+        server.start()
+        pids = " ".join(str(process.pid) for process in server._processes)
+        os.write(write_end, pids.encode("ascii") + b"\n")
+        while True:
+            time.sleep(1)
+
+    os.close(write_end)
+    with os.fdopen(read_end, "rb") as report:
+        workers = [int(pid) for pid in report.readline().split()]
+    assert len(workers) == 2
+
+    os.kill(parent, signal.SIGKILL)
+    os.waitpid(parent, 0)
+
+    try:
+        deadline = time.monotonic() + 10
+        while any(is_running(pid) for pid in workers) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert not any(is_running(pid) for pid in workers)
+    finally:
+        for pid in workers:
+            if is_running(pid):
+                os.kill(pid, signal.SIGKILL)
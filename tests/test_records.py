@@ -0,0 +1,111 @@
+"""Tests for compact node records and the plain dicts handed out for them."""
+import copy
+import json
+import pickle
+
+import pytest
+
+from dialogue_graph import DialogueGraph
+from dialogue_lib import DialogueManager
+from dialogue_records import NodeRecord, StringPool, compact_node, plain_node
+
+NODE = {
+    "id": "start",
+    "npc_name": "Pixel",
+    "text": "Hello",
+    "responses": [
+        {"id": "a", "text": "Hi", "next_dialogue": "end", "mood": "happy"},
+        {"id": "b", "text": "Bye", "next_dialogue": None},
+    ],
+    "portrait": "pixel.png",
+}
+
+DATA = {
+    "starting_dialogue": "start",
+    "dialogues": [NODE, {"id": "end", "npc_name": "Pixel", "text": "The end", "responses": []}],
+}
+
+
+def test_record_reads_like_the_dict():
+    record = compact_node(NODE)
+    assert record["text"] == "Hello"
+    assert record.get("on_entry") is None
+    assert "portrait" in record and "on_entry" not in record
+    assert list(record) == ["id", "npc_name", "text", "responses", "portrait"]
+    assert record["responses"][0]["mood"] == "happy"
+    with pytest.raises(KeyError):
+        record["on_entry"]
+    with pytest.raises(TypeError):
+        record["text"] = "changed"
+
+
+def test_record_compares_like_the_dict():
+    record = compact_node(NODE)
+    assert record == NODE
+    assert NODE == record
+    assert record == compact_node(copy.deepcopy(NODE))
+    assert record["responses"][1] == NODE["responses"][1]
+    assert record != {**NODE, "text": "Other"}
+    assert record != "start"
+
+
+def test_plain_node_is_json_ready():
+    plain = plain_node(compact_node(NODE))
+    assert type(plain) is dict
+    assert type(plain["responses"]) is list
+    assert all(type(response) is dict for response in plain["responses"])
+    assert json.loads(json.dumps(plain)) == NODE
+
+
+def test_strings_are_shared():
+    pool = StringPool()
+    first = compact_node(copy.deepcopy(NODE), pool)
+    second = compact_node(copy.deepcopy(NODE), pool)
+    assert first["npc_name"] is second["npc_name"]
+    assert len(pool) > 0
+
+
+def test_records_pickle():
+    record = compact_node(NODE)
+    assert pickle.loads(pickle.dumps(record)) == NODE
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_manager_hands_out_plain_dicts(compact):
+    graph = DialogueGraph.from_data(copy.deepcopy(DATA), compact=compact)
+    assert isinstance(graph.node(0), NodeRecord) is compact
+
+    manager = DialogueManager(graph)
+    dialogue = manager.get_current_dialogue()
+    assert dialogue == NODE
+    assert json.loads(json.dumps(dialogue)) == NODE
+    assert json.dumps(manager.get_available_responses())
+    assert type(manager.get_response("a")) is dict
+
+    assert manager.choose_response("a")
+    assert manager.get_current_dialogue() == DATA["dialogues"][1]
+
+
+def test_conditional_and_templated_nodes_are_plain():
+    graph = DialogueGraph.from_data({
+        "starting_dialogue": "start",
+        "variables": {"name": "Ada", "gold": 5},
+        "dialogues": [{
+            "id": "start", "npc_name": "Pixel", "text": "Hello {name}",
+            "responses": [
+                {"id": "buy", "text": "Buy ({gold} gold)", "condition": "gold >= 5"},
+                {"id": "leave", "text": "Leave"},
+            ],
+        }],
+    }, compact=True)
+    manager = DialogueManager(graph)
+
+    dialogue = manager.get_current_dialogue()
+    assert json.loads(json.dumps(dialogue)) == {
+        "id": "start", "npc_name": "Pixel", "text": "Hello Ada",
+        "responses": [
+            {"id": "buy", "text": "Buy (5 gold)", "condition": "gold >= 5"},
+            {"id": "leave", "text": "Leave"},
+        ],
+    }
+    assert all(type(response) is dict for response in manager.get_available_responses())
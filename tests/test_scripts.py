@@ -0,0 +1,39 @@
+"""Tests for script compilation."""
+import pytest
+
+from dialogue_lib import DialogueManager
+from dialogue_scripts import default_registry
+from dialogue_validation import UNKNOWN_SCRIPT
+
+
+@pytest.mark.parametrize("script, error", [
+    ("UpdateQuest_q_x", "'UpdateQuest_q_x' has an invalid argument"),
+    ({"type": "update_quest", "quest_id": "q", "stage": "x"}, "'update_quest' has an invalid argument"),
+    ({"type": "update_quest", "quest_id": "q"}, "'update_quest' is missing 'stage'"),
+    ({"type": ["update_quest"]}, "is not a registered command"),
+    ("Teleport_home", "'Teleport_home' is not a registered command"),
+])
+def test_bad_commands_are_reported_not_raised(script, error):
+    compiled = default_registry.compile(script)
+    assert compiled.effects == ()
+    assert len(compiled.unknown) == 1 and error in compiled.unknown[0]
+
+
+def test_dict_and_string_commands_compile_alike():
+    from_string = default_registry.compile("UpdateQuest_q_2")
+    from_dict = default_registry.compile({"type": "update_quest", "quest_id": "q", "stage": "2"})
+    assert from_string.effects == from_dict.effects
+    assert from_string.quests == from_dict.quests == ("q",)
+
+
+def test_invalid_dict_argument_is_a_validation_issue():
+    manager = DialogueManager()
+    assert manager.load_dialogue_data({
+        "starting_dialogue": "start",
+        "dialogues": [{"id": "start", "npc_name": "N", "text": "Hi", "responses": [
+            {"id": "r", "text": "Ok", "next_dialogue": None,
+             "script": {"type": "update_quest", "quest_id": "q", "stage": "x"}},
+        ]}],
+    })
+    issues = [issue for issue in manager.get_validation_issues() if issue.code == UNKNOWN_SCRIPT]
+    assert len(issues) == 1 and "invalid argument" in issues[0].message
@@ -0,0 +1,79 @@
+"""Tests for the asyncio dialogue server."""
+import asyncio
+import json
+
+from dialogue_graph import DialogueGraph
+from dialogue_lib import DialogueManager
+from dialogue_server import DialogueServer
+from dialogue_store import MemorySessionStore
+
+DATA = {
+    "starting_dialogue": "start",
+    "dialogues": [
+        {"id": "start", "npc_name": "N", "text": "Hi", "responses": [
+            {"id": "next", "text": "Go on", "next_dialogue": "middle"},
+        ]},
+        {"id": "middle", "npc_name": "N", "text": "And?", "responses": [
+            {"id": "end", "text": "Bye", "next_dialogue": None},
+        ]},
+    ],
+}
+
+
+def converse(server, requests):
+    """Send requests on one connection and return the decoded replies."""
+    async def run():
+        listener = await server.start(port=0)
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        replies = []
+        for request in requests:
+            writer.write(json.dumps(request).encode("utf-8") + b"\n")
+            await writer.drain()
+            replies.append(json.loads(await reader.readline()))
+        writer.close()
+        await writer.wait_closed()
+        # Let the server notice the disconnect and save the session
+        await asyncio.sleep(0.05)
+        await server.close()
+        return replies
+
+    return asyncio.run(run())
+
+
+def test_hello_restores_and_saves_a_session():
+    graph = DialogueGraph.from_data(DATA)
+    store = MemorySessionStore()
+
+    first = converse(DialogueServer(graph, store), [
+        {"op": "hello", "session": "p1"},
+        {"op": "choose", "response": "next"},
+    ])
+    assert first[1]["dialogue"]["id"] == "middle"
+
+    second = converse(DialogueServer(graph, store), [{"op": "hello", "session": "p1", "seq": 1}])
+    assert second == [{"ok": True, "seq": 1, "dialogue": second[0]["dialogue"]}]
+    assert second[0]["dialogue"]["id"] == "middle"
+
+
+def test_hello_with_unrestorable_snapshot_keeps_the_stored_one():
+    graph = DialogueGraph.from_data(DATA)
+    other = DialogueGraph.from_data({**DATA, "dialogues": DATA["dialogues"][:1]})
+    store = MemorySessionStore()
+
+    foreign = DialogueManager(other)
+    store.save("p1", foreign.snapshot())
+    store.save("p2", b"DSNP corrupt")
+
+    for session_id in ("p1", "p2"):
+        stored = store.load(session_id)
+        replies = converse(DialogueServer(graph, store), [
+            {"op": "hello", "session": session_id, "seq": 7},
+            {"op": "choose", "response": "next"},
+        ])
+        assert replies[0]["ok"] is False
+        assert replies[0]["seq"] == 7
+        assert "cannot be restored" in replies[0]["error"]
+        # The connection stays usable, but nothing is saved over the snapshot
+        assert replies[1]["ok"] is True
+        assert store.load(session_id) == stored
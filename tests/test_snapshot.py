@@ -0,0 +1,131 @@
+"""Tests for session snapshots."""
+import pytest
+
+from dialogue_graph import DialogueGraph
+from dialogue_lib import DialogueManager
+from dialogue_snapshot import _HEADER, _write_uint, read_snapshot
+
+DATA = {
+    "starting_dialogue": "start",
+    "variables": {"gold": 10, "name": "Pixel"},
+    "quests": [{"id": "tutorial", "stages": [{"id": 1}, {"id": 2}]}],
+    "dialogues": [
+        {"id": "start", "npc_name": "N", "text": "Hi", "responses": [
+            {"id": "next", "text": "Go on", "next_dialogue": "middle"},
+        ]},
+        {"id": "middle", "npc_name": "N", "text": "And?", "responses": [
+            {"id": "end", "text": "Bye", "next_dialogue": "end"},
+        ]},
+        {"id": "end", "npc_name": "N", "text": "Bye", "responses": []},
+    ],
+}
+
+
+@pytest.fixture
+def graph():
+    return DialogueGraph.from_data(DATA)
+
+
+def session(graph, history_size=4):
+    manager = DialogueManager(graph, history_size=history_size)
+    manager.choose_response("next")
+    manager.state.set_variable("gold", -3)
+    manager.state.set_variable("ratio", 0.5)
+    manager.state.set_variable("inventory", ["key", {"coins": 2}])
+    manager.state.set_variable("met_pixel", True)
+    manager.state.set_variable("mood", None)
+    manager.state.set_quest("tutorial", {"current_stage": 2, "completed": False})
+    manager.state.set_quest("side", {"current_stage": "found", "completed": True})
+    return manager
+
+
+@pytest.mark.parametrize("history_size", [0, 4])
+def test_round_trip(graph, history_size):
+    manager = session(graph, history_size)
+    snapshot = manager.snapshot()
+
+    restored = DialogueManager(graph, history_size=history_size)
+    assert restored.restore(snapshot)
+    assert restored.get_current_dialogue()["id"] == "middle"
+    assert restored.state.variables == manager.state.variables
+    assert restored.state.quests == manager.state.quests
+    assert restored.get_history() == manager.get_history()
+    assert restored.snapshot() == snapshot
+
+
+def test_default_values_take_one_byte(graph):
+    fresh = DialogueManager(graph).snapshot()
+    changed = DialogueManager(graph)
+    changed.state.set_variable("gold", 11)
+    assert len(changed.snapshot()) > len(fresh)
+
+
+def test_ended_session_round_trips(graph):
+    manager = DialogueManager(graph)
+    manager.choose_response("next")
+    manager.choose_response("end")
+    restored = DialogueManager(graph)
+    assert restored.restore(manager.snapshot())
+    assert restored.get_current_dialogue()["id"] == "end"
+
+
+def test_other_graph_is_rejected(graph):
+    other = DialogueGraph.from_data({**DATA, "starting_dialogue": "start",
+                                     "dialogues": DATA["dialogues"][:2]})
+    with pytest.raises(ValueError, match="different"):
+        read_snapshot(other, DialogueManager(graph).snapshot())
+
+
+@pytest.mark.parametrize("corrupt", [
+    lambda data: data[:3],
+    lambda data: b"XXXX" + data[4:],
+    lambda data: data[:4] + b"\x09" + data[5:],
+    lambda data: data[:-1],
+    lambda data: data + b"\x00",
+])
+def test_corrupt_snapshots_are_rejected(graph, corrupt):
+    snapshot = session(graph).snapshot()
+    with pytest.raises(ValueError):
+        read_snapshot(graph, corrupt(snapshot))
+
+    manager = DialogueManager(graph)
+    assert not manager.restore(corrupt(snapshot))
+    assert manager.get_current_dialogue()["id"] == "start"
+
+
+def test_history_indexes_are_checked(graph):
+    manager = DialogueManager(graph, history_size=4)
+    snapshot = manager.snapshot()
+    # The history is the last part: capacity, length, index + 1 each
+    assert snapshot.endswith(b"\x04\x01\x01")
+
+    out = bytearray(snapshot[:-1])
+    _write_uint(out, len(graph.node_ids) + 1)
+    with pytest.raises(ValueError, match="out of range"):
+        read_snapshot(graph, bytes(out))
+
+    with pytest.raises(ValueError, match="capacity"):
+        read_snapshot(graph, snapshot[:-3] + b"\x01\x02\x01\x02")
+
+    restored = DialogueManager(graph, history_size=4)
+    assert not restored.restore(bytes(out))
+    assert restored.get_history() == ["start"]
+
+
+def test_cursor_is_checked(graph):
+    snapshot = DialogueManager(graph).snapshot()
+    header = _HEADER.size
+    with pytest.raises(ValueError, match="out of range"):
+        read_snapshot(graph, snapshot[:header] + b"\x7f" + snapshot[header + 1:])
+
+
+def test_unserializable_value_fails_clearly(graph, capsys):
+    manager = DialogueManager(graph)
+    manager.state.set_variable("handle", object())
+    assert manager.snapshot() is None
+    assert "Cannot save variable 'handle'" in capsys.readouterr().out
+
+    manager.state.set_variable("handle", 1)
+    manager.state.set_quest("tutorial", {"current_stage": {1, 2}})
+    assert manager.snapshot() is None
+    assert "stage of quest 'tutorial'" in capsys.readouterr().out